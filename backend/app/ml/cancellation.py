@@ -0,0 +1,196 @@
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from app.ml.periodicity import PERIOD_DAYS
+from app.ml.preprocess import extract_features
+
+# Model inputs built by build_features, in column order. An artifact may use
+# a subset (see TIME_SINCE_FEATURES); one using other columns is not loaded.
+FEATURE_COLUMNS = [
+    "usage_score",
+    "days_since_last",
+    "overdue_cycles",
+    "log_amount",
+    "amount_cv",
+    "transaction_count",
+    "days_between",
+    "tenure_days",
+]
+
+# Measured against `now`, so they keep growing after a subscription stops.
+# Stored subscriptions are labelled cancelled by exactly that (the rescan's
+# lapse rule), so a model trained on them with these would learn the rule.
+TIME_SINCE_FEATURES = ["days_since_last", "overdue_cycles", "tenure_days"]
+
+def build_features(
+    df: pd.DataFrame,
+    subscriptions: List[Dict],
+    merchants: List[str],
+    usage_scores: np.ndarray,
+    days_since_last: np.ndarray,
+    now: datetime,
+) -> np.ndarray:
+    """
+    Feature matrix (len(subscriptions) x FEATURE_COLUMNS) from a normalized
+    transaction frame; per-merchant history comes from extract_features.
+    `merchants` are the subscriptions' merchant keys, in the same order.
+    """
+    n = len(subscriptions)
+    history = pd.DataFrame(index=merchants, columns=['avg_amount', 'std_amount', 'transaction_count',
+                                                     'first_seen', 'days_between'])
+    if not df.empty and n:
+        stats = extract_features(df).set_index('merchant')
+        history = stats.reindex(merchants)
+
+    amounts = np.array([sub['amount'] for sub in subscriptions], dtype=float)
+    avg_amount = history['avg_amount'].to_numpy(dtype=float)
+    std_amount = np.nan_to_num(history['std_amount'].to_numpy(dtype=float))
+    amount_cv = np.divide(std_amount, avg_amount, out=np.zeros(n), where=avg_amount > 0)
+    days_between = np.nan_to_num(history['days_between'].to_numpy(dtype=float))
+
+    first_seen = pd.to_datetime(history['first_seen'])
+    tenure_days = np.nan_to_num((pd.Timestamp(now) - first_seen).dt.days.to_numpy(dtype=float))
+
+    # Expected days between charges, for overdue_cycles
+    period = np.array([
+        sub.get('period_days') or PERIOD_DAYS.get(sub.get('frequency'), 0) for sub in subscriptions
+    ], dtype=float)
+    period = np.where(period > 0, period, np.where(days_between > 0, days_between, 30.0))
+
+    return np.column_stack([
+        usage_scores,
+        days_since_last,
+        days_since_last / period,
+        np.log1p(np.abs(amounts)),
+        amount_cv,
+        np.nan_to_num(history['transaction_count'].to_numpy(dtype=float)),
+        days_between,
+        tenure_days,
+    ])
+
+
+class CancellationModel:
+    """Fitted cancellation classifier plus the metadata saved with it."""
+
+    def __init__(self, pipeline, feature_columns: List[str] = None, trained_at: str = None, samples: int = 0):
+        self.pipeline = pipeline
+        self.feature_columns = feature_columns or list(FEATURE_COLUMNS)
+        self.trained_at = trained_at or datetime.now().isoformat()
+        self.samples = samples
+
+    def select(self, features: np.ndarray) -> np.ndarray:
+        """The model's columns of a full build_features matrix."""
+        return features[:, [FEATURE_COLUMNS.index(column) for column in self.feature_columns]]
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """Cancellation probability for each row of a build_features matrix."""
+        if len(features) == 0:
+            return np.zeros(0)
+        return self.pipeline.predict_proba(self.select(features))[:, 1]
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        joblib.dump({
+            "pipeline": self.pipeline,
+            "feature_columns": self.feature_columns,
+            "trained_at": self.trained_at,
+            "samples": self.samples,
+        }, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CancellationModel":
+        artifact = joblib.load(path)
+        return cls(artifact["pipeline"], artifact["feature_columns"], artifact["trained_at"], artifact["samples"])
+
+
+def train_cancellation_model(
+    features: np.ndarray, labels: np.ndarray, feature_columns: Optional[List[str]] = None
+) -> CancellationModel:
+    """
+    Fit a scaled logistic regression on `feature_columns` (default: all) of a
+    build_features matrix; labels are 1 for cancelled subscriptions.
+    """
+    model = CancellationModel(None, feature_columns, samples=len(labels))
+    model.pipeline = make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000, class_weight="balanced"))
+    model.pipeline.fit(model.select(features), labels)
+    return model
+
+
+# Loaded once per process (see load_cancellation_model), never per request
+_model: Optional[CancellationModel] = None
+
+
+def load_cancellation_model(path: str) -> Optional[CancellationModel]:
+    """
+    Load the artifact at `path` into memory for get_cancellation_model.
+    A missing, unreadable or incompatible artifact leaves the heuristic in place.
+    """
+    global _model
+    if not path or not os.path.exists(path):
+        print(f"No cancellation model at {path}; using the heuristic")
+        _model = None
+        return None
+    try:
+        model = CancellationModel.load(path)
+    except Exception as e:
+        # Corrupt file, or pickled by an incompatible scikit-learn version
+        print(f"Could not load cancellation model at {path} ({e}); using the heuristic")
+        _model = None
+        return None
+    if not model.feature_columns or not set(model.feature_columns) <= set(FEATURE_COLUMNS):
+        print(f"Cancellation model at {path} was trained on other features; using the heuristic")
+        _model = None
+        return None
+    _model = model
+    print(f"Loaded cancellation model trained {model.trained_at} on {model.samples} subscriptions")
+    return model
+
+
+def get_cancellation_model() -> Optional[CancellationModel]:
+    return _model
+
+
+def synthetic_training_data(
+    count: int, seed: int = 42, now: datetime = datetime(2025, 1, 1)
+) -> Tuple[List[Dict], List[Dict], np.ndarray]:
+    """
+    Synthetic subscriptions with their charge history and a cancelled label
+    for offline training and benchmarks. Subscriptions that stop being
+    charged, see little usage or cost more are likelier to be cancelled.
+    Returns (transactions, subscriptions, labels).
+    """
+    rng = random.Random(seed)
+    transactions, subscriptions, labels = [], [], []
+    for i in range(count):
+        merchant = f"merchant {i}"
+        yearly = rng.random() < 0.15
+        period = 365 if yearly else 30
+        amount = round(rng.lognormvariate(5.5 if yearly else 5.0, 0.8), 2)
+        cycles = rng.randint(2, 6 if yearly else 36)
+        # Extra charges per cycle at the same merchant stand in for usage
+        usage = rng.choice([0, 0, 1, 2, 4])
+        stalled_cycles = rng.choice([0, 0, 0, 1, 2, 3])
+
+        risk = -1.5 + 1.2 * stalled_cycles - 0.6 * usage + 0.4 * np.log1p(amount / 100) + rng.gauss(0, 0.8)
+        cancelled = int(rng.random() < 1 / (1 + np.exp(-risk)))
+
+        last_seen = now - timedelta(days=period * stalled_cycles + rng.randrange(period))
+        for cycle in range(cycles):
+            date = last_seen - timedelta(days=period * cycle)
+            transactions.append({"date": date, "amount": -amount, "description": merchant,
+                                 "bank_account": "HDFC", "merchant_key": merchant})
+            for _ in range(usage if cycle < 12 else 0):
+                transactions.append({"date": date - timedelta(days=rng.randrange(1, period)),
+                                     "amount": -round(rng.uniform(10, 200), 2), "description": merchant,
+                                     "bank_account": "HDFC", "merchant_key": merchant})
+        subscriptions.append({"id": i, "name": merchant.title(), "merchant_key": merchant, "amount": amount,
+                              "frequency": "yearly" if yearly else "monthly", "last_seen": last_seen})
+        labels.append(cancelled)
+    return transactions, subscriptions, np.array(labels)
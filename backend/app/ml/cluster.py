@@ -0,0 +1,138 @@
+import numpy as np
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from sklearn.feature_extraction.text import HashingVectorizer
+
+# Two cleaned merchant names are linked when their char-trigram vectors have
+# at least this cosine similarity...
+MIN_SIMILARITY = 0.55
+# ...and their typical (median absolute) amounts differ by at most this share,
+# so e.g. "amazon prime" is not merged with "amazon pay" purchases
+AMOUNT_TOLERANCE = 0.15
+
+# Names are only compared within a block: same first characters (spaces removed)
+BLOCK_KEY_LENGTH = 4
+# Larger blocks are split again on a longer prefix
+MAX_BLOCK_SIZE = 1000
+
+# Stateless, so vectors don't depend on which names share a block
+_vectorizer = HashingVectorizer(
+    analyzer="char", ngram_range=(3, 3), alternate_sign=False, norm="l2", n_features=2 ** 18
+)
+
+
+def _compact(name: str) -> str:
+    return name.replace(" ", "")
+
+
+def blocking_key(name: str) -> str:
+    """Block a cleaned merchant name is compared in (see MAX_BLOCK_SIZE for splits)."""
+    return _compact(name)[:BLOCK_KEY_LENGTH]
+
+
+def _split_blocks(names: List[str], indices: List[int], length: int) -> List[List[int]]:
+    """Group name indices by prefix, re-splitting oversized groups on a longer prefix."""
+    groups = defaultdict(list)
+    for index in indices:
+        groups[_compact(names[index])[:length]].append(index)
+
+    blocks = []
+    for key, members in groups.items():
+        if len(members) > MAX_BLOCK_SIZE and len(key) == length:
+            blocks.extend(_split_blocks(names, members, length + 2))
+        else:
+            blocks.append(members)
+    return blocks
+
+
+def _linked_pairs(vectors, amounts: np.ndarray, blocks: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Every (row, col) index pair, row before col, that shares a block and is
+    similar enough in name and amount. Similarities come from one sparse
+    product per block, so memory follows the block size, not the number of
+    pairs across all blocks.
+    """
+    rows, cols = [np.empty(0, dtype=int)], [np.empty(0, dtype=int)]
+    for block in blocks:
+        block = np.asarray(block)
+        block_vectors = vectors[block]
+        similarity = (block_vectors @ block_vectors.T).tocoo()
+        keep = (similarity.row < similarity.col) & (similarity.data >= MIN_SIMILARITY)
+        block_rows, block_cols = block[similarity.row[keep]], block[similarity.col[keep]]
+        larger = np.maximum(amounts[block_rows], amounts[block_cols])
+        amount_gap = np.abs(amounts[block_rows] - amounts[block_cols]) / np.where(larger > 0, larger, 1.0)
+        close = amount_gap <= AMOUNT_TOLERANCE
+        rows.append(block_rows[close])
+        cols.append(block_cols[close])
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+def cluster_merchants(
+    names: Sequence[str],
+    amounts: Sequence[float],
+    known: Optional[Dict[str, Tuple[str, float]]] = None,
+) -> Dict[str, str]:
+    """
+    Assign cleaned merchant names to clusters of description variants
+    (e.g. "netflixcom mumbai" and "netflix com bill").
+
+    `amounts` are the names' typical absolute amounts. `known` maps already
+    clustered names to (cluster label, typical amount); their assignments are
+    never changed. Names are linked within their block and clustered as
+    connected components of those links. A new name joins the cluster of its
+    most similar known name in the same component, otherwise its component
+    gets a new label: the shortest member name.
+    Returns {name: cluster label} for the new names.
+    """
+    known = known or {}
+    new_names = [name for name in dict.fromkeys(names) if name not in known]
+    if not new_names:
+        return {}
+
+    new_amounts = dict(zip(names, amounts))
+    all_names = list(known) + new_names
+    all_amounts = np.array(
+        [known[name][1] for name in known] + [new_amounts[name] for name in new_names], dtype=float
+    )
+    is_known = np.arange(len(all_names)) < len(known)
+
+    # Only blocks holding a new name and more than one name can link anything
+    blocks = [
+        block
+        for block in _split_blocks(all_names, list(range(len(all_names))), BLOCK_KEY_LENGTH)
+        if len(block) > 1 and not is_known[block].all()
+    ]
+    # Names outside those blocks are never compared, so they aren't vectorized
+    in_blocks = np.zeros(len(all_names), dtype=bool)
+    for block in blocks:
+        in_blocks[block] = True
+    vectors = _vectorizer.transform([
+        _compact(name) if compared else "" for name, compared in zip(all_names, in_blocks)
+    ])
+    rows, cols = _linked_pairs(vectors, all_amounts, blocks)
+    graph = csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(all_names), len(all_names)))
+    _, labels = connected_components(graph, directed=False)
+
+    assignments = {}
+    components = defaultdict(list)
+    for index in np.flatnonzero(~is_known):
+        components[labels[index]].append(index)
+    known_by_component = defaultdict(list)
+    for index in np.flatnonzero(is_known):
+        if labels[index] in components:
+            known_by_component[labels[index]].append(index)
+
+    for component, new_members in components.items():
+        known_members = known_by_component.get(component)
+        if known_members:
+            similarity = (vectors[new_members] @ vectors[known_members].T).toarray()
+            for member, best in zip(new_members, np.argmax(similarity, axis=1)):
+                assignments[all_names[member]] = known[all_names[known_members[best]]][0]
+        else:
+            member_names = [all_names[member] for member in new_members]
+            label = min(member_names, key=lambda name: (len(name), name))
+            assignments.update((name, label) for name in member_names)
+
+    return assignments
@@ -1,12 +1,97 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
-from sklearn.cluster import DBSCAN
-from sklearn.preprocessing import StandardScaler
 from app.ml.preprocess import normalize_transactions, extract_features, clean_merchant_name
+from app.ml.cancellation import build_features, get_cancellation_model
+from app.ml.periodicity import classify_period, estimate_periods
 
-def detect_recurring_subscriptions(transactions: List[Dict], user_id: int) -> List[Dict]:
+def subscription_merchant(subscription: Dict) -> str:
+    """Merchant a subscription's charges are grouped under."""
+    return subscription.get('merchant_key') or clean_merchant_name(subscription['name'])
+
+def merchant_statistics(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-merchant statistics from a normalized, date-sorted frame, computed with
+    whole-frame groupby/diff instead of a Python loop over groups.
+    Interval columns only count positive whole-day gaps between consecutive
+    transactions of a merchant (same-day repeats are ignored); the billing
+    period columns come from estimate_periods.
+    """
+    df = df[df['merchant'].notna()]
+    # Hash merchant names once; every groupby below runs on the integer codes
+    codes, merchants = pd.factorize(df['merchant'], sort=True)
+    df = df.assign(amount_abs=df['amount'].abs().values, position=np.arange(len(df)))
+    gaps = df['date'].groupby(codes).diff().dt.days
+    df['interval'] = gaps.where(gaps > 0)
+
+    grouped = df.groupby(codes)
+    stats = pd.DataFrame({
+        'txn_count': grouped.size(),
+        'amount_mean': grouped['amount_abs'].mean(),
+        'amount_std': grouped['amount_abs'].std(ddof=0),
+        'first_date': grouped['date'].min(),
+        'last_date': grouped['date'].max(),
+        'interval_count': grouped['interval'].count(),
+        'interval_mean': grouped['interval'].mean(),
+        'interval_median': grouped['interval'].median(),
+    })
+    periods = estimate_periods(codes, df['interval'].to_numpy(dtype=float), len(merchants))
+    stats = stats.join(periods)
+
+    # Latest row of each merchant (the frame is date-sorted)
+    latest = grouped['position'].max().values
+    if 'bank_account' in df.columns:
+        stats['bank_account'] = df['bank_account'].values[latest]
+    else:
+        stats['bank_account'] = 'Unknown'
+    stats.index = pd.Index(merchants, name='merchant')
+    return stats
+
+def detect_from_frame(df: pd.DataFrame, user_id: int) -> List[Dict]:
+    """Detect recurring subscriptions from a normalized, date-sorted frame."""
+    stats = merchant_statistics(df)
+
+    # Need at least 2 transactions, amounts within 10% variance and a positive gap
+    recurring = stats[
+        (stats['txn_count'] >= 2)
+        & ~(stats['amount_std'] / stats['amount_mean'] > 0.1)
+        & (stats['interval_count'] > 0)
+    ]
+    if recurring.empty:
+        return []
+
+    next_renewal = recurring['last_date'] + pd.to_timedelta(recurring['period_days'], unit='D')
+
+    return [
+        {
+            'user_id': user_id,
+            'name': merchant.title(),
+            'merchant_key': merchant,
+            'amount': float(amount),
+            'frequency': str(freq),
+            'period_days': int(period_days),
+            'period_confidence': round(float(confidence), 3),
+            'first_seen': first_seen,
+            'last_seen': last_seen,
+            'next_renewal': renewal,
+            'bank_account': bank_account,
+            'status': 'active'
+        }
+        for merchant, amount, freq, period_days, confidence, first_seen, last_seen, renewal, bank_account in zip(
+            recurring.index,
+            recurring['amount_mean'],
+            recurring['frequency'],
+            recurring['period_days'],
+            recurring['period_confidence'],
+            recurring['first_date'],
+            recurring['last_date'],
+            next_renewal,
+            recurring['bank_account'],
+        )
+    ]
+
+def detect_recurring_subscriptions(transactions: List[Dict], user_id: int, merchant_clusters: Optional[Dict[str, str]] = None) -> List[Dict]:
     """
     Detect recurring subscriptions from transaction data.
     Returns list of subscription dictionaries.
@@ -15,92 +100,90 @@ def detect_recurring_subscriptions(transactions: List[Dict], user_id: int) -> Li
         return []
     
     # Normalize transactions
-    df = normalize_transactions(transactions)
+    df = normalize_transactions(transactions, merchant_clusters)
     
     if df.empty:
         return []
     
-    # Group by merchant
-    merchant_groups = df.groupby('merchant')
-    
+    return detect_from_frame(df, user_id)
+
+def detect_subscriptions_from_aggregates(aggregates: List[Dict], user_id: int) -> List[Dict]:
+    """
+    Same checks as detect_recurring_subscriptions, but from per-merchant running
+    totals (see MerchantAggregate) instead of the raw transactions, so only the
+    merchants an upload touched need to be looked at. Running totals only give
+    the mean and spread of the gaps (see classify_period); the upload job
+    re-estimates the period of these candidates from their full history.
+    """
     subscriptions = []
     
-    for merchant, group in merchant_groups:
-        if len(group) < 2:  # Need at least 2 transactions to be recurring
+    for agg in aggregates:
+        count = agg['txn_count']
+        if count < 2:  # Need at least 2 transactions to be recurring
             continue
         
-        # Calculate statistics
-        amounts = group['amount'].abs().values
-        dates = group['date'].values
-        
-        # Check if amounts are similar (within 10% variance)
-        amount_std = np.std(amounts)
-        amount_mean = np.mean(amounts)
-        if amount_std / amount_mean > 0.1:
-            continue  # Too much variance in amounts
-        
-        # Calculate frequency using pandas Timedelta (handles numpy timedelta64)
-        sorted_dates = pd.Series(dates).sort_values()
-        date_diffs = sorted_dates.diff().dropna()
-        positive_diffs = date_diffs[date_diffs.dt.days > 0]
-        if positive_diffs.empty:
+        # Amounts must be similar (within 10% variance)
+        amount_mean = agg['amount_sum'] / count
+        amount_var = max(agg['amount_sum_sq'] / count - amount_mean ** 2, 0.0)
+        if amount_mean <= 0 or np.sqrt(amount_var) / amount_mean > 0.1:
             continue
-        avg_days = positive_diffs.dt.days.mean()
         
-        if avg_days is None or avg_days <= 0:
+        if not agg['interval_count']:
             continue
+        interval_count = agg['interval_count']
+        avg_days = agg['interval_sum'] / interval_count
+        std_days = np.sqrt(max(agg['interval_sum_sq'] / interval_count - avg_days ** 2, 0.0))
         
-        # Determine frequency
-        if 25 <= avg_days <= 35:
-            frequency = "monthly"
-        elif 360 <= avg_days <= 375:
-            frequency = "yearly"
-        else:
-            frequency = "other"
-        
-        # Get latest transaction
-        latest = group.iloc[-1]
-        first = group.iloc[0]
+        frequency, period_days, confidence = classify_period(avg_days, std_days, interval_count)
+        last_seen = pd.Timestamp(agg['last_date'])
         
-        # Calculate next renewal
-        if frequency == "monthly":
-            next_renewal = latest['date'] + timedelta(days=30)
-        elif frequency == "yearly":
-            next_renewal = latest['date'] + timedelta(days=365)
-        else:
-            next_renewal = latest['date'] + timedelta(days=int(avg_days))
-        
-        subscription = {
+        subscriptions.append({
             'user_id': user_id,
-            'name': merchant.title(),
+            'name': agg['merchant'].title(),
+            'merchant_key': agg['merchant'],
             'amount': float(amount_mean),
             'frequency': frequency,
-            'first_seen': first['date'],
-            'last_seen': latest['date'],
-            'next_renewal': next_renewal,
-            'bank_account': latest.get('bank_account', 'Unknown'),
+            'period_days': period_days,
+            'period_confidence': round(confidence, 3),
+            'first_seen': pd.Timestamp(agg['first_date']),
+            'last_seen': last_seen,
+            'next_renewal': last_seen + timedelta(days=period_days),
+            'bank_account': agg.get('last_bank_account') or 'Unknown',
             'status': 'active'
-        }
-        
-        subscriptions.append(subscription)
+        })
     
     return subscriptions
 
-def detect_price_anomalies(subscriptions: List[Dict], transactions: List[Dict]) -> List[Dict]:
+def detect_price_anomalies(subscriptions: List[Dict], transactions: List[Dict], merchant_clusters: Optional[Dict[str, str]] = None) -> List[Dict]:
     """Detect price increases in subscriptions."""
+    if not transactions:
+        return []
+    
+    df = normalize_transactions(transactions, merchant_clusters)
+    return price_anomalies_from_frame(df, subscriptions)
+
+def price_anomalies_from_frame(df: pd.DataFrame, subscriptions: List[Dict], merchant_rows: Optional[Dict] = None) -> List[Dict]:
+    """
+    detect_price_anomalies on a normalized, date-sorted frame. `merchant_rows`
+    ({merchant: row positions}) can be passed in when already grouped.
+    """
     anomalies = []
+    if df.empty:
+        return anomalies
     
-    df = normalize_transactions(transactions)
+    # Row positions per merchant, grouped once rather than filtered per subscription
+    if merchant_rows is None:
+        merchant_rows = df.groupby('merchant').indices
+    all_amounts = df['amount'].abs().values
     
     for sub in subscriptions:
-        merchant = clean_merchant_name(sub['name'])
-        merchant_transactions = df[df['merchant'] == merchant]
+        merchant = subscription_merchant(sub)
+        rows = merchant_rows.get(merchant)
         
-        if len(merchant_transactions) < 2:
+        if rows is None or len(rows) < 2:
             continue
         
-        amounts = merchant_transactions['amount'].abs().values
-        dates = merchant_transactions['date'].values
+        amounts = all_amounts[rows]
         
         # Check for price increase (more than 10%)
         if len(amounts) >= 2:
@@ -117,10 +200,10 @@ def detect_price_anomalies(subscriptions: List[Dict], transactions: List[Dict])
     
     return anomalies
 
-def calculate_usage_frequency(transactions: List[Dict], subscription: Dict) -> float:
+def calculate_usage_frequency(transactions: List[Dict], subscription: Dict, merchant_clusters: Optional[Dict[str, str]] = None) -> float:
     """Calculate usage frequency score (0-1, higher = more active)."""
-    df = normalize_transactions(transactions)
-    merchant = clean_merchant_name(subscription['name'])
+    df = normalize_transactions(transactions, merchant_clusters)
+    merchant = subscription_merchant(subscription)
     merchant_transactions = df[df['merchant'] == merchant]
     
     if len(merchant_transactions) < 2:
@@ -166,3 +249,72 @@ def predict_cancellation_probability(subscription: Dict, usage_score: float, day
     
     return min(1.0, prob)
 
+def predict_cancellation_probabilities(amounts: np.ndarray, usage_scores: np.ndarray, days_since_last: np.ndarray) -> np.ndarray:
+    """predict_cancellation_probability for arrays of subscriptions."""
+    prob = np.select([usage_scores < 0.3, usage_scores < 0.5], [0.4, 0.2], default=0.0)
+    prob = prob + np.select([days_since_last > 60, days_since_last > 30], [0.3, 0.15], default=0.0)
+    prob = prob + np.where((amounts > 10) & (usage_scores < 0.4), 0.2, 0.0)
+    return np.minimum(1.0, prob)
+
+def score_subscriptions(
+    transactions: List[Dict],
+    subscriptions: List[Dict],
+    merchant_clusters: Optional[Dict[str, str]] = None,
+    now: Optional[datetime] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    calculate_usage_frequency and a cancellation probability for every
+    subscription at once: transactions are normalized and grouped by merchant
+    a single time. The probability comes from the loaded cancellation model
+    (see app/ml/cancellation.py), or predict_cancellation_probabilities when
+    none is loaded. Subscriptions need 'name', 'amount' and 'last_seen'.
+    Returns arrays aligned with `subscriptions`: usage_score, days_since_last,
+    cancellation_probability.
+    """
+    df = pd.DataFrame()
+    if transactions and subscriptions:
+        df = normalize_transactions(transactions, merchant_clusters)
+    return score_from_frame(df, subscriptions, now)
+
+def score_from_frame(
+    df: pd.DataFrame,
+    subscriptions: List[Dict],
+    now: Optional[datetime] = None,
+    stats: Optional[pd.DataFrame] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    score_subscriptions on a normalized, date-sorted frame (may be empty).
+    `stats` is merchant_statistics(df), when the caller already has it.
+    """
+    now = now or datetime.now()
+    merchants = [subscription_merchant(sub) for sub in subscriptions]
+    counts = np.zeros(len(subscriptions))
+    spans = np.zeros(len(subscriptions))
+    if not df.empty and subscriptions:
+        if stats is None:
+            stats = merchant_statistics(df)
+        stats = stats.reindex(merchants)
+        counts = stats['txn_count'].fillna(0).to_numpy(dtype=float)
+        spans = (stats['last_date'] - stats['first_date']).dt.days.fillna(0).to_numpy(dtype=float)
+    
+    # Same scale as calculate_usage_frequency: 4 transactions/month scores 1.0,
+    # too little history scores a moderate 0.5
+    scored = (counts >= 2) & (spans > 0)
+    per_month = np.divide(counts * 30.0, spans, out=np.zeros_like(counts), where=scored)
+    usage_scores = np.where(scored, np.minimum(1.0, per_month / 4.0), 0.5)
+    
+    days_since_last = np.array([(now - sub['last_seen']).days for sub in subscriptions], dtype=int)
+    amounts = np.array([sub['amount'] for sub in subscriptions], dtype=float)
+    
+    model = get_cancellation_model()
+    if model is not None:
+        features = build_features(df, subscriptions, merchants, usage_scores, days_since_last, now)
+        probabilities = model.predict_proba(features)
+    else:
+        probabilities = predict_cancellation_probabilities(amounts, usage_scores, days_since_last)
+    
+    return {
+        'usage_score': usage_scores,
+        'days_since_last': days_since_last,
+        'cancellation_probability': probabilities,
+    }
@@ -0,0 +1,103 @@
+from typing import Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# Billing cycles: (nominal days, allowed deviation in days of one interval, cycles per year)
+PERIODS = {
+    "weekly": (7, 1, 52),
+    "biweekly": (14, 2, 26),
+    "monthly": (30, 5, 12),
+    "quarterly": (91, 7, 4),
+    "semiannual": (182, 10, 2),
+    "yearly": (365, 10, 1),
+}
+PERIOD_DAYS = {name: days for name, (days, _, _) in PERIODS.items()}
+
+# Irregular cycles ("other") allow this share of the period as deviation
+OTHER_TOLERANCE = 0.15
+
+# Gaps longer than this many cycles are not counted as missed charges
+MAX_MISSED_CYCLES = 3
+
+
+def _cycle_scores(gaps: np.ndarray, period: np.ndarray, tolerance: np.ndarray) -> np.ndarray:
+    """
+    How well each gap fits its period: 1 for one cycle, 1/k for k cycles
+    (k-1 missed charges), 0 when it is off-cycle.
+    """
+    cycles = np.maximum(1.0, np.round(gaps / period))
+    on_cycle = (np.abs(gaps - cycles * period) <= tolerance) & (cycles <= MAX_MISSED_CYCLES)
+    return np.where(on_cycle, 1.0 / cycles, 0.0)
+
+
+def estimate_periods(groups: np.ndarray, intervals: np.ndarray, group_count: int) -> pd.DataFrame:
+    """
+    Dominant billing period of every group (merchant) at once.
+    `groups` are integer codes 0..group_count-1 and `intervals` the day gaps
+    to the group's previous charge (NaN for none), row-aligned.
+
+    Each named period, plus the group's median gap as an irregular "other"
+    period, is scored by the share of gaps that are whole cycles of it,
+    discounting gaps with missed charges; the best-scoring one wins. A single
+    missed month therefore keeps a monthly plan monthly, while a plan that is
+    really charged every 60 days scores higher as "other" than as monthly.
+    Returns frequency, period_days and period_confidence (0-1, the score
+    shrunk towards 0 for groups with few gaps), indexed by group code.
+    """
+    valid = ~np.isnan(intervals)
+    codes = groups[valid]
+    gaps = intervals[valid]
+    counts = np.bincount(codes, minlength=group_count).astype(float)
+
+    median = pd.Series(gaps).groupby(codes).median().reindex(range(group_count)).to_numpy()
+    other_period = np.maximum(1.0, np.round(np.nan_to_num(median)))
+
+    names = list(PERIODS) + ["other"]
+    candidate_days = np.empty((group_count, len(names)))
+    scores = np.empty((group_count, len(names)))
+    for column, name in enumerate(names):
+        if name == "other":
+            period = other_period
+            tolerance = np.maximum(1.0, period * OTHER_TOLERANCE)
+        else:
+            days, allowed, _ = PERIODS[name]
+            period = np.full(group_count, float(days))
+            tolerance = np.full(group_count, float(allowed))
+        candidate_days[:, column] = period
+        gap_scores = _cycle_scores(gaps, period[codes], tolerance[codes])
+        scores[:, column] = np.bincount(codes, weights=gap_scores, minlength=group_count)
+
+    scores = np.divide(scores, counts[:, None], out=np.zeros_like(scores), where=counts[:, None] > 0)
+    # Groups whose gaps fit no cycle at all stay "other" at their median gap
+    best = scores.argmax(axis=1)
+    best = np.where(scores[np.arange(group_count), best] > 0, best, len(names) - 1)
+    rows = np.arange(group_count)
+    return pd.DataFrame({
+        'frequency': np.array(names, dtype=object)[best],
+        'period_days': candidate_days[rows, best].astype(int),
+        'period_confidence': scores[rows, best] * counts / (counts + 1),
+    })
+
+
+def classify_period(mean_days: float, std_days: float = 0.0, count: int = 1) -> Tuple[str, int, float]:
+    """
+    (frequency, period_days, confidence) from interval running totals alone,
+    for when the individual gaps are not at hand: the mean is matched against
+    the period windows and the confidence falls with the gaps' spread.
+    """
+    frequency, period = "other", max(1, int(round(mean_days)))
+    for name, (days, allowed, _) in PERIODS.items():
+        if abs(mean_days - days) <= allowed:
+            frequency, period = name, days
+            break
+    spread = std_days / mean_days if mean_days > 0 else 1.0
+    return frequency, period, max(0.0, 1.0 - spread) * count / (count + 1)
+
+
+def monthly_cost(amount: float, frequency: str, period_days: Optional[int] = None) -> float:
+    """Average cost per month of one charge of `amount` every cycle."""
+    if frequency in PERIODS:
+        return amount * PERIODS[frequency][2] / 12
+    if period_days:
+        return amount * 365 / period_days / 12
+    return amount  # Unknown cycle: assume monthly
@@ -1,37 +1,63 @@
 import pandas as pd
 import re
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, Optional
 from datetime import datetime
 
+# Distinct raw descriptions kept by the clean_merchant_name cache
+MERCHANT_CACHE_SIZE = 50_000
+
+# Common prefixes/suffixes, each optional and in the order they used to be
+# stripped one re.sub at a time
+MERCHANT_PREFIX_PATTERN = re.compile(r'^(?:payment\s+)?(?:transfer\s+)?(?:debit\s+)?(?:credit\s+)?', re.IGNORECASE)
+MERCHANT_SUFFIX_PATTERN = re.compile(r'(?:\s+subscription)?(?:\s+payment)?$', re.IGNORECASE)
+# Trailing numbers (card numbers, etc.)
+MERCHANT_NUMBER_PATTERN = re.compile(r'\d{4}.*$', re.IGNORECASE)
+SPECIAL_CHARS_PATTERN = re.compile(r'[^\w\s]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+@lru_cache(maxsize=MERCHANT_CACHE_SIZE)
 def clean_merchant_name(description: str) -> str:
     """Clean and normalize merchant names from transaction descriptions."""
     # Remove common prefixes/suffixes
     description = description.lower()
-    
-    # Remove common patterns
-    patterns_to_remove = [
-        r'^payment\s+',
-        r'^transfer\s+',
-        r'^debit\s+',
-        r'^credit\s+',
-        r'\s+payment$',
-        r'\s+subscription$',
-        r'\d{4}.*$',  # Remove trailing numbers (card numbers, etc.)
-    ]
-    
-    for pattern in patterns_to_remove:
-        description = re.sub(pattern, '', description, flags=re.IGNORECASE)
+    description = MERCHANT_PREFIX_PATTERN.sub('', description, count=1)
+    description = MERCHANT_SUFFIX_PATTERN.sub('', description, count=1)
+    description = MERCHANT_NUMBER_PATTERN.sub('', description)
     
     # Remove special characters but keep spaces
-    description = re.sub(r'[^\w\s]', '', description)
+    description = SPECIAL_CHARS_PATTERN.sub('', description)
     
     # Remove extra whitespace
-    description = ' '.join(description.split())
-    
-    return description.strip()
+    return ' '.join(description.split())
+
+def clean_merchant_names(descriptions: pd.Series) -> pd.Series:
+    """
+    clean_merchant_name for a whole column. Statements repeat the same
+    descriptions every month, so only the distinct values are cleaned (with
+    Series.str operations) and the results are mapped back.
+    """
+    codes, uniques = pd.factorize(descriptions)
+    cleaned = (
+        pd.Series(uniques, dtype=object).str.lower()
+        .str.replace(MERCHANT_PREFIX_PATTERN, '', n=1, regex=True)
+        .str.replace(MERCHANT_SUFFIX_PATTERN, '', n=1, regex=True)
+        .str.replace(MERCHANT_NUMBER_PATTERN, '', regex=True)
+        .str.replace(SPECIAL_CHARS_PATTERN, '', regex=True)
+        .str.replace(WHITESPACE_PATTERN, ' ', regex=True)
+        .str.strip()
+    )
+    # factorize marks missing descriptions with -1
+    values = cleaned.to_numpy()[codes]
+    values[codes == -1] = None
+    return pd.Series(values, index=descriptions.index, dtype=object)
 
-def normalize_transactions(transactions: List[Dict]) -> pd.DataFrame:
-    """Normalize transaction data into a pandas DataFrame."""
+def normalize_transactions(transactions: List[Dict], merchant_clusters: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    Normalize transaction data into a pandas DataFrame.
+    merchant_clusters ({cleaned name: cluster label}) merges description variants.
+    Rows carrying a stored merchant_key use it as is instead.
+    """
     df = pd.DataFrame(transactions)
     
     # Ensure date is datetime
@@ -39,15 +65,25 @@ def normalize_transactions(transactions: List[Dict]) -> pd.DataFrame:
         df['date'] = pd.to_datetime(df['date'])
     
     # Clean merchant names
+    if 'merchant_key' in df.columns:
+        df['merchant'] = df['merchant_key']
     if 'description' in df.columns:
-        df['merchant'] = df['description'].apply(clean_merchant_name)
+        if 'merchant' not in df.columns:
+            df['merchant'] = None
+        unkeyed = df['merchant'].isna()
+        if unkeyed.any():
+            merchants = clean_merchant_names(df.loc[unkeyed, 'description'])
+            if merchant_clusters:
+                merchants = merchants.map(merchant_clusters).fillna(merchants)
+            df.loc[unkeyed, 'merchant'] = merchants
     
     # Ensure amount is numeric
     if 'amount' in df.columns:
         df['amount'] = pd.to_numeric(df['amount'], errors='coerce')
     
-    # Sort by date
-    df = df.sort_values('date')
+    # Sort by date; stable, so same-day rows keep their input order whatever
+    # other merchants' rows are in the frame
+    df = df.sort_values('date', kind='stable')
     
     return df
 
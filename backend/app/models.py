@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Enum as SQLEnum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, Text, UniqueConstraint, Enum as SQLEnum
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from datetime import datetime
 import enum
+import uuid
 from app.database import Base
 
 class SubscriptionStatus(str, enum.Enum):
@@ -18,10 +19,26 @@ class User(Base):
     phone = Column(String, nullable=False)
     password_hash = Column(String, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
+    # Bumped whenever transactions or subscriptions change; keys the Harvey cache
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Random per account, also in the cache key: a new account that reuses a
+    # deleted one's id (and starts at data_version 0) never matches its entries
+    cache_token = Column(String(32), nullable=False, default=lambda: uuid.uuid4().hex)
+    # data_version the stored ai_recommendations were generated from
+    recommendations_version = Column(Integer, nullable=True)
+    # Oldest data change not yet in harvey_insights; NULL when they are current
+    insights_stale_since = Column(DateTime, nullable=True, index=True)
+    # Set while some process's scheduler is refreshing them (see harvey_insights.claim_refresh)
+    insights_claimed_at = Column(DateTime, nullable=True)
     
     transactions = relationship("Transaction", back_populates="user")
     subscriptions = relationship("Subscription", back_populates="user")
     ai_recommendations = relationship("AIRecommendation", back_populates="user")
+    statement_uploads = relationship("StatementUpload", back_populates="user")
+    upload_jobs = relationship("UploadJob", back_populates="user")
+    merchant_aggregates = relationship("MerchantAggregate", back_populates="user")
+    merchant_clusters = relationship("MerchantCluster", back_populates="user")
+    harvey_insight = relationship("HarveyInsight", back_populates="user", uselist=False)
 
 class Transaction(Base):
     __tablename__ = "transactions"
@@ -32,9 +49,18 @@ class Transaction(Base):
     amount = Column(Float, nullable=False)
     description = Column(String, nullable=False)
     bank_account = Column(String, nullable=False)
-    raw_text = Column(Text)
+    # Source row as one CSV line; column names live on the upload's header.
+    # Deferred so analysis queries never load it.
+    raw_text = deferred(Column(Text))
+    upload_id = Column(Integer, ForeignKey("statement_uploads.id"), nullable=True)
+    # sha256 of user, account, date, amount and normalized description
+    fingerprint = Column(String(64), unique=True, index=True, nullable=True)
+    # Cleaned, clustered merchant name (see merchant_clusters), set at ingest
+    merchant_key = Column(String, nullable=True)
     
     user = relationship("User", back_populates="transactions")
+    
+    __table_args__ = (Index("idx_transactions_user_merchant_key", "user_id", "merchant_key"),)
 
 class Subscription(Base):
     __tablename__ = "subscriptions"
@@ -43,15 +69,21 @@ class Subscription(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     name = Column(String, nullable=False)
     amount = Column(Float, nullable=False)
-    frequency = Column(String, nullable=False)  # monthly, yearly, other
+    frequency = Column(String, nullable=False)  # weekly ... yearly (see ml/periodicity.py), other
+    period_days = Column(Integer, nullable=True)
+    period_confidence = Column(Float, nullable=True)  # 0-1, how regular the charges are
     first_seen = Column(DateTime, nullable=False)
     last_seen = Column(DateTime, nullable=False)
     next_renewal = Column(DateTime, nullable=False)
     bank_account = Column(String, nullable=False)
     status = Column(SQLEnum(SubscriptionStatus), default=SubscriptionStatus.ACTIVE)
+    # Transaction.merchant_key of the charges this subscription was detected from
+    merchant_key = Column(String, nullable=True)
     
     user = relationship("User", back_populates="subscriptions")
     ai_recommendations = relationship("AIRecommendation", back_populates="subscription")
+    
+    __table_args__ = (Index("idx_subscriptions_user_merchant_key", "user_id", "merchant_key"),)
 
 class AIRecommendation(Base):
     __tablename__ = "ai_recommendations"
@@ -59,10 +91,113 @@ class AIRecommendation(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     subscription_id = Column(Integer, ForeignKey("subscriptions.id"), nullable=True)
+    # cancellation_risk, low_usage, low_value or price_increase; one row per
+    # (user, subscription, kind), kept current by app/services/recommendations.py
+    kind = Column(String, nullable=True)
     recommendation_text = Column(Text, nullable=False)
     risk_score = Column(Float, default=0.0)
     created_at = Column(DateTime, server_default=func.now())
     
     user = relationship("User", back_populates="ai_recommendations")
     subscription = relationship("Subscription", back_populates="ai_recommendations")
+    
+    __table_args__ = (UniqueConstraint("user_id", "subscription_id", "kind"),)
+
+
+class StatementUpload(Base):
+    __tablename__ = "statement_uploads"
+    __table_args__ = (UniqueConstraint("user_id", "content_hash"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    filename = Column(String, nullable=False)
+    # Set once the import has finished, so a failed import is not treated as uploaded
+    content_hash = Column(String(64), nullable=True)
+    # CSV-encoded column names that the transactions' raw_text lines follow
+    header = Column(Text)
+    transactions_added = Column(Integer, default=0)
+    duplicates_skipped = Column(Integer, default=0)
+    created_at = Column(DateTime, server_default=func.now())
+    
+    user = relationship("User", back_populates="statement_uploads")
+
+class UploadJob(Base):
+    __tablename__ = "upload_jobs"
+    
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    kind = Column(String, nullable=False, default="single")  # single, batch
+    filename = Column(String, nullable=False)
+    file_path = Column(String, nullable=False)  # file, or directory for batch jobs
+    content_hash = Column(String(64), nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued, running, completed, failed
+    stage = Column(String, nullable=False, default="queued")  # queued, importing, detecting, notifying, done
+    progress = Column(Float, default=0.0)
+    rows_processed = Column(Integer, default=0)
+    transactions_added = Column(Integer, default=0)
+    duplicates_skipped = Column(Integer, default=0)
+    insert_batches = Column(Integer, default=0)
+    subscriptions_detected = Column(Integer, default=0)
+    new_subscriptions = Column(Integer, default=0)
+    message = Column(String)
+    error = Column(Text)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now())
+    
+    user = relationship("User", back_populates="upload_jobs")
 
+class MerchantAggregate(Base):
+    """Running per-merchant totals so uploads only re-check the merchants they touch."""
+    __tablename__ = "merchant_aggregates"
+    __table_args__ = (UniqueConstraint("user_id", "merchant"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    merchant = Column(String, nullable=False)  # merchant cluster label (see MerchantCluster)
+    txn_count = Column(Integer, default=0)
+    amount_sum = Column(Float, default=0.0)  # of absolute amounts
+    amount_sum_sq = Column(Float, default=0.0)
+    first_date = Column(DateTime, nullable=False)
+    last_date = Column(DateTime, nullable=False)
+    last_amount = Column(Float)
+    last_bank_account = Column(String)
+    # Positive gaps (whole days) between consecutive transactions
+    interval_count = Column(Integer, default=0)
+    interval_sum = Column(Float, default=0.0)
+    interval_sum_sq = Column(Float, default=0.0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    user = relationship("User", back_populates="merchant_aggregates")
+
+class MerchantCluster(Base):
+    """Cached fuzzy-clustering result: which cluster a user's cleaned merchant name belongs to."""
+    __tablename__ = "merchant_clusters"
+    __table_args__ = (UniqueConstraint("user_id", "merchant"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    merchant = Column(String, nullable=False)  # clean_merchant_name(description)
+    cluster = Column(String, nullable=False)  # label shared by the cluster's variants
+    block = Column(String, nullable=False)  # blocking key, so placement only loads neighbours
+    typical_amount = Column(Float)  # median absolute amount when first seen
+    created_at = Column(DateTime, server_default=func.now())
+    
+    user = relationship("User", back_populates="merchant_clusters")
+
+class HarveyInsight(Base):
+    """Harvey's results for a user, precomputed in the background (see app/services/harvey_insights.py)."""
+    __tablename__ = "harvey_insights"
+    __table_args__ = (UniqueConstraint("user_id"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    data_version = Column(Integer, nullable=False)  # User.data_version the row was computed from
+    total_monthly_cost = Column(Float, default=0.0)
+    avoidable_spend = Column(Float, default=0.0)
+    potential_savings = Column(Float, default=0.0)
+    subscription_scores = Column(Text, nullable=False)  # JSON: usage score, cancellation probability per subscription
+    anomalies = Column(Text, nullable=False)  # JSON: price anomalies
+    computed_at = Column(DateTime, nullable=False, index=True)
+    compute_seconds = Column(Float)
+    
+    user = relationship("User", back_populates="harvey_insight")
@@ -38,6 +38,13 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         raise credentials_exception
     return user
 
+def get_admin_user(current_user: User = Depends(get_current_user)):
+    """The current user, if their email is listed in ADMIN_EMAILS (for operational endpoints)."""
+    admin_emails = {email.strip().lower() for email in settings.ADMIN_EMAILS.split(",") if email.strip()}
+    if current_user.email.lower() not in admin_emails:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
 @router.post("/signup", response_model=Token)
 def signup(user_data: UserSignup, db: Session = Depends(get_db)):
     # Check if user exists
@@ -1,43 +1,40 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import User, AIRecommendation
-from app.routes.auth import get_current_user
-from app.schemas import HarveyRecommendation, HarveySavings, HarveyAnomaly
-from app.services.harvey import HarveyService
-from datetime import datetime
+from app.models import User
+from app.routes.auth import get_admin_user, get_current_user
+from app.schemas import HarveyRecommendation, HarveySavings, HarveyAnomaly, HarveySubscriptionScore, HarveySummary
+from app.services.harvey import HarveyService, HarveySnapshot
+from app.services.harvey_cache import harvey_cache
+from app.services.harvey_insights import harvey_refresh_scheduler, read_insights
+from app.services.recommendations import get_user_recommendations
 
 router = APIRouter(prefix="/harvey", tags=["harvey"])
 
+def _precomputed(db: Session, user: User, part: str, compute):
+    """One part of the user's precomputed insights; computed (and cached) on demand until they exist."""
+    insights = read_insights(db, user)
+    if insights is not None:
+        return insights[part]
+    return harvey_cache.get_or_compute(user, part, compute)
+
+def _recommendation_response(rec) -> HarveyRecommendation:
+    return HarveyRecommendation(
+        subscription_id=rec.subscription_id,
+        recommendation_text=rec.recommendation_text,
+        risk_score=rec.risk_score,
+        created_at=rec.created_at
+    )
+
 @router.get("/recommendations", response_model=list[HarveyRecommendation])
 def get_recommendations(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get Harvey AI recommendations."""
-    harvey = HarveyService()
-    recommendations = harvey.generate_recommendations(db, current_user.id)
-    
-    # Save recommendations to database
-    for rec in recommendations:
-        ai_rec = AIRecommendation(
-            user_id=current_user.id,
-            subscription_id=rec.get('subscription_id'),
-            recommendation_text=rec['recommendation_text'],
-            risk_score=rec['risk_score']
-        )
-        db.add(ai_rec)
-    db.commit()
-    
-    return [
-        HarveyRecommendation(
-            subscription_id=rec.get('subscription_id'),
-            recommendation_text=rec['recommendation_text'],
-            risk_score=rec['risk_score'],
-            created_at=datetime.now()
-        )
-        for rec in recommendations
-    ]
+    # Stored per data version; only regenerated after the user's data changed
+    recommendations = get_user_recommendations(db, current_user)
+    return [_recommendation_response(rec) for rec in recommendations]
 
 @router.get("/savings", response_model=HarveySavings)
 def get_savings(
@@ -45,8 +42,7 @@ def get_savings(
     db: Session = Depends(get_db)
 ):
     """Get savings calculations from Harvey."""
-    harvey = HarveyService()
-    savings = harvey.calculate_savings(db, current_user.id)
+    savings = _precomputed(db, current_user, "savings", lambda: HarveyService.calculate_savings(db, current_user.id))
     return HarveySavings(**savings)
 
 @router.get("/anomalies", response_model=list[HarveyAnomaly])
@@ -55,7 +51,48 @@ def get_anomalies(
     db: Session = Depends(get_db)
 ):
     """Get detected anomalies."""
-    harvey = HarveyService()
-    anomalies = harvey.get_anomalies(db, current_user.id)
+    anomalies = _precomputed(db, current_user, "anomalies", lambda: HarveyService.get_anomalies(db, current_user.id))
     return [HarveyAnomaly(**anom) for anom in anomalies]
 
+@router.get("/summary", response_model=HarveySummary)
+def get_summary(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Recommendations, savings and anomalies together, from one pass over the user's data."""
+    # Lazy: nothing is loaded if every part is already precomputed, stored or cached
+    snapshot = HarveySnapshot(db, current_user.id)
+    recommendations = get_user_recommendations(db, current_user, snapshot)
+    insights = read_insights(db, current_user)
+    if insights is not None:
+        savings, anomalies = insights['savings'], insights['anomalies']
+    else:
+        savings = harvey_cache.get_or_compute(current_user, "savings", snapshot.savings)
+        anomalies = harvey_cache.get_or_compute(current_user, "anomalies", snapshot.anomalies)
+    return HarveySummary(
+        recommendations=[_recommendation_response(rec) for rec in recommendations],
+        savings=HarveySavings(**savings),
+        anomalies=[HarveyAnomaly(**anom) for anom in anomalies]
+    )
+
+@router.get("/scores", response_model=list[HarveySubscriptionScore])
+def get_scores(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Usage score and cancellation probability of each subscription."""
+    scores = _precomputed(db, current_user, "scores", lambda: HarveySnapshot(db, current_user.id).subscription_scores())
+    return [HarveySubscriptionScore(**score) for score in scores]
+
+@router.get("/cache-stats")
+def get_cache_stats(admin: User = Depends(get_admin_user)):
+    """Hit/miss counters of this worker's Harvey result cache (admins only)."""
+    return harvey_cache.stats()
+
+@router.get("/refresh-stats")
+def get_refresh_stats(
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Background precompute across all users: claims, stale users and refresh lag (admins only)."""
+    return harvey_refresh_scheduler.stats(db)
@@ -1,9 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import User, Transaction
+from app.models import (
+    User, Transaction, Subscription, AIRecommendation, StatementUpload, UploadJob,
+    MerchantAggregate, MerchantCluster, HarveyInsight
+)
 from app.routes.auth import get_current_user
 from app.schemas import ProfileResponse, ProfileUpdate
+from app.services.harvey_cache import harvey_cache
 
 router = APIRouter(prefix="/profile", tags=["profile"])
 
@@ -50,8 +54,21 @@ def delete_account(
 ):
     """Delete user account."""
     # In production, you might want to soft delete
+    user_id = current_user.id
+    # Bulk-delete the account's rows first: the relationships don't cascade, and
+    # deleting the user alone would try to null their NOT NULL user_id. Children
+    # go before the rows they reference (recommendations -> subscriptions,
+    # transactions -> statement uploads).
+    for model in (
+        AIRecommendation, Subscription, Transaction, StatementUpload, UploadJob,
+        MerchantAggregate, MerchantCluster, HarveyInsight
+    ):
+        db.query(model).filter(model.user_id == user_id).delete(synchronize_session=False)
     db.delete(current_user)
     db.commit()
+    # Only frees memory early: a new account reusing the id gets a new cache_token,
+    # so no worker's entries for this one can match it
+    harvey_cache.invalidate_user(user_id)
     return {"message": "Account deleted successfully"}
 
 @router.get("/csv-history")
@@ -1,22 +1,47 @@
+import uuid
+import zipfile
+from datetime import datetime
+from typing import List
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import User, Transaction, Subscription
-from app.routes.auth import get_current_user
-from app.services.csv_parser import parse_csv, parse_excel
-from app.ml.detect import detect_recurring_subscriptions
-from app.services.notifications import notification_service
-from datetime import datetime
+from app.models import User, StatementUpload, UploadJob
+from app.routes.auth import get_admin_user, get_current_user
+from app.schemas import UploadJobResponse
+from app.services.bank_profiles import bank_profiles
+from app.services.fingerprint import file_content_hash
+from app.services.upload_jobs import create_upload_job, create_batch_upload_job, upload_job_runner
 
 router = APIRouter(prefix="/upload", tags=["upload"])
 
-@router.post("/csv")
+def _job_response(job: UploadJob) -> UploadJobResponse:
+    return UploadJobResponse(
+        job_id=job.id,
+        kind=job.kind,
+        filename=job.filename,
+        status=job.status,
+        stage=job.stage,
+        progress=job.progress,
+        rows_processed=job.rows_processed,
+        transactions_added=job.transactions_added,
+        duplicates_skipped=job.duplicates_skipped,
+        insert_batches=job.insert_batches,
+        subscriptions_detected=job.subscriptions_detected,
+        new_subscriptions=job.new_subscriptions,
+        message=job.message,
+        error=job.error,
+        retryable=job.status == "failed" and job.stage == "detecting",
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
+
+@router.post("/csv", response_model=UploadJobResponse, status_code=202)
 def upload_csv(
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Upload and process CSV or Excel bank statement."""
+    """Store a CSV or Excel bank statement and queue it for processing."""
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     
@@ -27,84 +52,99 @@ def upload_csv(
     
     print(f"Processing file: {file.filename}, extension: {file_ext}, content_type: {file.content_type}")
     
-    # Read file content
-    try:
-        if file_ext == 'csv':
-            content = file.file.read().decode('utf-8')
-            print(f"CSV content length: {len(content)}")
-            transactions_data = parse_csv(content)
-        else:
-            # Handle Excel files
-            import pandas as pd
-            from io import BytesIO
-            file_content = file.file.read()
-            print(f"Excel file size: {len(file_content)} bytes")
-            df = pd.read_excel(BytesIO(file_content))
-            print(f"Excel columns: {df.columns.tolist()}")
-            transactions_data = parse_excel(df)
-        print(f"Parsed {len(transactions_data)} transactions")
-    except HTTPException:
-        raise
-    except Exception as e:
-        import traceback
-        error_detail = str(e)
-        print(f"Upload error: {error_detail}")
-        traceback.print_exc()
-        # Provide more helpful error message
-        if "columns" in error_detail.lower():
-            raise HTTPException(status_code=400, detail=error_detail)
-        else:
-            raise HTTPException(status_code=400, detail=f"Error parsing file: {error_detail}. Please check that your file has columns: date, amount, and description (or raw_descr)")
-    
-    # Save transactions to database
-    new_transactions = []
-    for txn_data in transactions_data:
-        transaction = Transaction(
+    # Skip whole-file re-uploads before doing any parsing
+    content_hash = file_content_hash(file.file)
+    previous_upload = db.query(StatementUpload).filter(
+        StatementUpload.user_id == current_user.id,
+        StatementUpload.content_hash == content_hash
+    ).first()
+    if previous_upload:
+        job = UploadJob(
+            id=uuid.uuid4().hex,
             user_id=current_user.id,
-            date=txn_data['date'],
-            amount=txn_data['amount'],
-            description=txn_data['description'],
-            bank_account=txn_data['bank_account'],
-            raw_text=txn_data.get('raw_text')
+            kind="single",
+            filename=file.filename,
+            file_path="",
+            content_hash=content_hash,
+            status="completed",
+            stage="done",
+            progress=1.0,
+            duplicates_skipped=previous_upload.transactions_added + previous_upload.duplicates_skipped,
+            message="Statement already uploaded"
         )
-        db.add(transaction)
-        new_transactions.append(transaction)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return _job_response(job)
     
-    db.commit()
+    job = create_upload_job(db, current_user, file.filename, file_ext, file.file, content_hash)
+    upload_job_runner.submit(job.id)
+    return _job_response(job)
+
+@router.post("/batch", response_model=UploadJobResponse, status_code=202)
+def upload_batch(
+    files: List[UploadFile] = File(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Store several statements (or a zip of them) and queue them as one job."""
+    if not files or not all(file.filename for file in files):
+        raise HTTPException(status_code=400, detail="No file provided")
     
-    # Detect recurring subscriptions
-    subscriptions = detect_recurring_subscriptions(transactions_data, current_user.id)
+    print(f"Processing batch: {', '.join(file.filename for file in files)}")
     
-    # Check for new subscriptions and save them
-    new_subscriptions = []
-    for sub_data in subscriptions:
-        # Check if subscription already exists
-        existing = db.query(Subscription).filter(
-            Subscription.user_id == current_user.id,
-            Subscription.name == sub_data['name'],
-            Subscription.status == "active"
-        ).first()
-        
-        if not existing:
-            subscription = Subscription(**sub_data)
-            db.add(subscription)
-            db.commit()
-            db.refresh(subscription)
-            new_subscriptions.append(subscription)
-            
-            # Send notification for new subscription
-            notification_service.send_new_subscription_alert(current_user, subscription)
-        else:
-            # Update existing subscription
-            existing.last_seen = sub_data['last_seen']
-            existing.next_renewal = sub_data['next_renewal']
-            existing.amount = sub_data['amount']
-            db.commit()
+    try:
+        job = create_batch_upload_job(db, current_user, [(file.filename, file.file) for file in files])
+    except (ValueError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return {
-        "message": "CSV processed successfully",
-        "transactions_added": len(new_transactions),
-        "subscriptions_detected": len(subscriptions),
-        "new_subscriptions": len(new_subscriptions)
-    }
+    if job.status == "queued":
+        upload_job_runner.submit(job.id)
+    return _job_response(job)
+
+@router.get("/jobs/{job_id}", response_model=UploadJobResponse)
+def get_upload_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the current stage, progress and result counts of an upload job."""
+    job = db.query(UploadJob).filter(
+        UploadJob.id == job_id,
+        UploadJob.user_id == current_user.id
+    ).first()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    
+    return _job_response(job)
+
+@router.post("/jobs/{job_id}/retry", response_model=UploadJobResponse, status_code=202)
+def retry_upload_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Re-run subscription detection for a job that failed after its transactions were imported."""
+    job = db.query(UploadJob).filter(
+        UploadJob.id == job_id,
+        UploadJob.user_id == current_user.id
+    ).first()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    if not (job.status == "failed" and job.stage == "detecting"):
+        raise HTTPException(status_code=409, detail="Only jobs that failed during subscription detection can be retried")
+    
+    # Resumes at detection: the imported rows are already committed
+    job.status = "queued"
+    job.updated_at = datetime.now()
+    db.commit()
+    db.refresh(job)
+    upload_job_runner.submit(job.id)
+    return _job_response(job)
 
+@router.get("/profile-stats")
+def get_profile_stats(admin: User = Depends(get_admin_user)):
+    """Hit/miss counters of this worker's bank profile lookups by statement header (admins only)."""
+    return bank_profiles.stats()
@@ -35,12 +35,34 @@ class TransactionResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Upload Schemas
+class UploadJobResponse(BaseModel):
+    job_id: str
+    kind: str
+    filename: str
+    status: str
+    stage: str
+    progress: float
+    rows_processed: int
+    transactions_added: int
+    duplicates_skipped: int
+    insert_batches: int
+    subscriptions_detected: int
+    new_subscriptions: int
+    message: Optional[str] = None
+    error: Optional[str] = None
+    retryable: bool = False  # failed after its rows were imported; see POST /upload/jobs/{id}/retry
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
 # Subscription Schemas
 class SubscriptionResponse(BaseModel):
     id: int
     name: str
     amount: float
     frequency: str
+    period_days: Optional[int] = None
+    period_confidence: Optional[float] = None
     first_seen: datetime
     last_seen: datetime
     next_renewal: datetime
@@ -73,6 +95,17 @@ class HarveyAnomaly(BaseModel):
     description: str
     risk_score: float
 
+class HarveySubscriptionScore(BaseModel):
+    subscription_id: int
+    usage_score: float
+    days_since_last: int
+    cancellation_probability: float
+
+class HarveySummary(BaseModel):
+    recommendations: List[HarveyRecommendation]
+    savings: HarveySavings
+    anomalies: List[HarveyAnomaly]
+
 # Profile Schemas
 class ProfileResponse(BaseModel):
     id: int
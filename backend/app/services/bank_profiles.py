@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+try:
+    from config import settings
+except ImportError:
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+    from config import settings
+
+# How amounts are signed in a statement:
+#   signed         - one amount column, debits negative (a type column can fix the sign)
+#   debit_positive - one amount column, debits positive (credit card exports)
+#   split          - separate debit and credit columns, both positive
+SIGN_CONVENTIONS = ("signed", "debit_positive", "split")
+
+# Column roles a profile can map; date, description and either amount or
+# debit + credit are required
+COLUMN_ROLES = ("date", "amount", "debit", "credit", "description", "bank", "type")
+
+# Export formats we know about. Headers are matched after normalization,
+# so spacing and case in the real exports don't matter.
+BUILTIN_PROFILES = [
+    {
+        "name": "Arko template",
+        "header": ["date", "amount", "description", "bank_account"],
+        "columns": {"date": "date", "amount": "amount", "description": "description", "bank": "bank_account"},
+        # The template is filled in by hand, so the date format is inferred per file
+        "date_format": None,
+        "sign_convention": "signed",
+    },
+    {
+        "name": "HDFC Bank account statement",
+        "header": ["Date", "Narration", "Chq./Ref.No.", "Value Dt", "Withdrawal Amt.", "Deposit Amt.", "Closing Balance"],
+        "columns": {"date": "Date", "description": "Narration", "debit": "Withdrawal Amt.", "credit": "Deposit Amt."},
+        "date_format": "%d/%m/%y",
+        "sign_convention": "split",
+    },
+    {
+        "name": "ICICI Bank account statement",
+        "header": [
+            "S No.", "Value Date", "Transaction Date", "Cheque Number", "Transaction Remarks",
+            "Withdrawal Amount (INR )", "Deposit Amount (INR )", "Balance (INR )",
+        ],
+        "columns": {
+            "date": "Transaction Date",
+            "description": "Transaction Remarks",
+            "debit": "Withdrawal Amount (INR )",
+            "credit": "Deposit Amount (INR )",
+        },
+        "date_format": "%d/%m/%Y",
+        "sign_convention": "split",
+    },
+    {
+        "name": "SBI account statement",
+        "header": ["Txn Date", "Value Date", "Description", "Ref No./Cheque No.", "Debit", "Credit", "Balance"],
+        "columns": {"date": "Txn Date", "description": "Description", "debit": "Debit", "credit": "Credit"},
+        "date_format": "%d %b %Y",
+        "sign_convention": "split",
+    },
+]
+
+
+def normalize_header(names: Iterable) -> List[str]:
+    """Lowercase and strip column names so we can match them easily."""
+    return [
+        str(name).lower().strip().replace(" ", "_").replace("__", "_")
+        for name in names
+    ]
+
+
+def header_signature(names: Iterable) -> str:
+    """Stable hash of a header's normalized column names, in order."""
+    return hashlib.sha256("\x1f".join(normalize_header(names)).encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class BankProfile:
+    """How to read one bank's export: column roles (normalized names), date format, signs, encoding."""
+    name: str
+    columns: Dict[str, str]
+    date_format: Optional[str] = None
+    sign_convention: str = "signed"
+    encoding: str = "utf-8"
+    # True for profiles inferred from an unknown header rather than registered
+    inferred: bool = field(default=False, compare=False)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BankProfile":
+        columns = {role: normalize_header([name])[0] for role, name in data["columns"].items() if name}
+        profile = cls(
+            name=data["name"],
+            columns=columns,
+            date_format=data.get("date_format"),
+            sign_convention=data.get("sign_convention", "signed"),
+            encoding=data.get("encoding", "utf-8"),
+        )
+        profile.validate(normalize_header(data["header"]))
+        return profile
+
+    def validate(self, header: List[str]) -> None:
+        unknown_roles = set(self.columns) - set(COLUMN_ROLES)
+        if unknown_roles:
+            raise ValueError(f"Bank profile '{self.name}': unknown column roles {sorted(unknown_roles)}")
+        if self.sign_convention not in SIGN_CONVENTIONS:
+            raise ValueError(f"Bank profile '{self.name}': unknown sign convention '{self.sign_convention}'")
+        amount_roles = ("debit", "credit") if self.sign_convention == "split" else ("amount",)
+        missing = [role for role in ("date", "description") + amount_roles if role not in self.columns]
+        if missing:
+            raise ValueError(f"Bank profile '{self.name}': missing column roles {missing}")
+        not_in_header = [name for name in self.columns.values() if name not in header]
+        if not_in_header:
+            raise ValueError(f"Bank profile '{self.name}': columns {not_in_header} are not in its header")
+
+
+class BankProfileRegistry:
+    """
+    Bank export profiles keyed by header signature. Registered profiles come
+    from BUILTIN_PROFILES and an optional JSON file (same shape) and are kept
+    for good; profiles for unknown headers are inferred by the parser once and
+    cached here, in an LRU of at most max_inferred entries, since every new
+    header an upload brings adds one.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_inferred: int = 1000):
+        self._profiles: Dict[str, BankProfile] = {}
+        self._inferred: "OrderedDict[str, BankProfile]" = OrderedDict()
+        self.max_inferred = max_inferred
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        for data in BUILTIN_PROFILES:
+            self.register(data["header"], BankProfile.from_dict(data))
+        if path:
+            self.load(path)
+
+    def load(self, path: str) -> int:
+        """Register every profile in a JSON file (a list of profile objects)."""
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+        for data in entries:
+            self.register(data["header"], BankProfile.from_dict(data))
+        print(f"Loaded {len(entries)} bank profiles from {path}")
+        return len(entries)
+
+    def register(self, header: Iterable, profile: BankProfile) -> BankProfile:
+        signature = header_signature(header)
+        with self._lock:
+            if not profile.inferred:
+                self._profiles[signature] = profile
+                return profile
+            self._inferred[signature] = profile
+            self._inferred.move_to_end(signature)
+            while len(self._inferred) > self.max_inferred:
+                self._inferred.popitem(last=False)
+                self.evictions += 1
+        return profile
+
+    def get(self, header: Iterable) -> Optional[BankProfile]:
+        signature = header_signature(header)
+        with self._lock:
+            profile = self._profiles.get(signature)
+            if profile is None:
+                profile = self._inferred.get(signature)
+                if profile is not None:
+                    self._inferred.move_to_end(signature)
+            if profile is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return profile
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'registered': len(self._profiles),
+            'inferred': len(self._inferred),
+            'max_inferred': self.max_inferred,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+        }
+
+    def __len__(self) -> int:
+        return len(self._profiles) + len(self._inferred)
+
+
+_profiles_file = settings.BANK_PROFILES_FILE
+if _profiles_file and not os.path.exists(_profiles_file):
+    print(f"Bank profiles file not found: {_profiles_file}")
+    _profiles_file = None
+
+bank_profiles = BankProfileRegistry(_profiles_file, max_inferred=settings.BANK_PROFILES_INFERRED_MAX)
@@ -0,0 +1,126 @@
+import csv
+import time
+from io import StringIO
+from typing import List, Dict, Tuple
+from sqlalchemy import Table, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models import Transaction
+
+# Dialects with INSERT ... ON CONFLICT DO NOTHING
+_CONFLICT_DIALECTS = {"postgresql": postgresql, "sqlite": sqlite}
+
+TRANSACTION_COLUMNS = ["user_id", "date", "amount", "description", "bank_account", "raw_text", "upload_id", "fingerprint", "merchant_key"]
+
+
+# Per-transaction staging table for COPY, which has no conflict handling of its own
+COPY_STAGING_TABLE = "transactions_copy_staging"
+
+
+def _copy_batch(db: Session, rows: List[Dict]) -> List[str]:
+    """
+    Write a batch with PostgreSQL COPY FROM STDIN (psycopg2), staged in a
+    temporary table and moved over with INSERT ... ON CONFLICT DO NOTHING.
+    Returns the fingerprints of the rows inserted.
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # Unquoted empty fields are read back as NULL by COPY ... CSV
+        writer.writerow(["" if row[col] is None else row[col] for col in TRANSACTION_COLUMNS])
+    buffer.seek(0)
+
+    columns = ", ".join(TRANSACTION_COLUMNS)
+    # Run on the session's own connection so the batch joins the current transaction
+    dbapi_connection = db.connection().connection.driver_connection
+    with dbapi_connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {COPY_STAGING_TABLE} ON COMMIT DROP AS "
+            f"SELECT {columns} FROM {Transaction.__tablename__} WITH NO DATA"
+        )
+        cursor.copy_expert(f"COPY {COPY_STAGING_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.execute(
+            f"INSERT INTO {Transaction.__tablename__} ({columns}) SELECT {columns} FROM {COPY_STAGING_TABLE} "
+            "ON CONFLICT (fingerprint) DO NOTHING RETURNING fingerprint"
+        )
+        inserted = [fingerprint for (fingerprint,) in cursor.fetchall()]
+        cursor.execute(f"TRUNCATE {COPY_STAGING_TABLE}")
+    return inserted
+
+
+def _supports_copy(db: Session) -> bool:
+    bind = db.get_bind()
+    return bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg2"
+
+
+def bulk_insert_transactions(
+    db: Session, user_id: int, transactions: List[Dict], batch_size: int = 1000
+) -> Dict:
+    """
+    Insert parsed transactions in batches, bypassing the ORM unit of work.
+    Uses COPY on PostgreSQL and a Core executemany INSERT elsewhere. A row
+    whose fingerprint was stored meanwhile (an overlapping upload running
+    at the same time) is skipped rather than failing the batch.
+    Does not commit; returns the inserted transaction dicts ('inserted'),
+    the skipped count and per-batch row counts and timings.
+    """
+    method = "copy" if _supports_copy(db) else "executemany"
+    batches = []
+    inserted = []
+
+    for start in range(0, len(transactions), batch_size):
+        batch = transactions[start:start + batch_size]
+        rows = [
+            {
+                "user_id": user_id,
+                "date": txn["date"],
+                "amount": txn["amount"],
+                "description": txn["description"],
+                "bank_account": txn["bank_account"],
+                "raw_text": txn.get("raw_text"),
+                "upload_id": txn.get("upload_id"),
+                "fingerprint": txn.get("fingerprint"),
+                "merchant_key": txn.get("merchant_key"),
+            }
+            for txn in batch
+        ]
+
+        started = time.perf_counter()
+        if method == "copy":
+            fingerprints = set(_copy_batch(db, rows))
+        else:
+            fingerprints = {fingerprint for (fingerprint,) in insert_missing(db, Transaction.__table__, rows, ["fingerprint"])}
+        elapsed = time.perf_counter() - started
+
+        # Rows without a fingerprint can't conflict
+        batch_inserted = [txn for txn in batch if txn.get("fingerprint") is None or txn["fingerprint"] in fingerprints]
+        inserted.extend(batch_inserted)
+        batches.append({"rows": len(batch_inserted), "seconds": round(elapsed, 4)})
+        print(f"Inserted batch {len(batches)}: {len(batch_inserted)} of {len(rows)} rows in {elapsed:.3f}s ({method})")
+
+    return {
+        "method": method,
+        "rows": len(inserted),
+        "skipped": len(transactions) - len(inserted),
+        "inserted": inserted,
+        "seconds": round(sum(batch["seconds"] for batch in batches), 4),
+        "batches": batches,
+    }
+
+
+def insert_missing(db: Session, table: Table, rows: List[Dict], key_columns: List[str]) -> List[Tuple]:
+    """
+    Insert rows whose unique key (`key_columns`) isn't taken yet and skip the
+    rest, for rows looked up as missing that a concurrent transaction may
+    have inserted since. Elsewhere than PostgreSQL and SQLite a taken key
+    still raises IntegrityError. Does not commit; returns the keys inserted.
+    """
+    if not rows:
+        return []
+    dialect = _CONFLICT_DIALECTS.get(db.get_bind().dialect.name)
+    if dialect is None:
+        statement = insert(table)
+    else:
+        statement = dialect.insert(table).on_conflict_do_nothing(index_elements=key_columns)
+    statement = statement.returning(*(table.c[column] for column in key_columns))
+    return [tuple(row) for row in db.execute(statement, rows)]
@@ -1,7 +1,15 @@
+import csv
 import pandas as pd
-from typing import List, Dict, Optional
-from datetime import datetime
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
 from io import StringIO
+from openpyxl import load_workbook
+from app.services.bank_profiles import BankProfile, bank_profiles, normalize_header
+
+# Optional faster Excel engine
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
 
 SUPPORTED_DATE_FORMATS = [
     "%d-%m-%Y",
@@ -13,152 +21,304 @@ SUPPORTED_DATE_FORMATS = [
     "%m/%d/%y",
 ]
 
+# Non-empty date values sampled when inferring a column's date format
+DATE_SAMPLE_SIZE = 200
+
+# Rows searched for the header in Excel statements (banks put logos/metadata above it)
+HEADER_SCAN_ROWS = 30
+
+# Transaction type columns are matched by exact name so that e.g. card_type is not used
+TYPE_COLUMNS = ("type", "txn_type", "transaction_type", "dr/cr", "cr/dr", "dr_cr")
+
 
 def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
     """Lowercase and strip column names so we can match them easily."""
-    df.columns = (
-        df.columns.str.lower().str.strip().str.replace(" ", "_").str.replace("__", "_")
-    )
+    df.columns = normalize_header(df.columns)
     return df
 
 
-def _find_column(df: pd.DataFrame, keywords: List[str]) -> Optional[str]:
-    """Return the first column whose name contains any of the keywords."""
-    for col in df.columns:
-        for keyword in keywords:
-            if keyword in col:
+def _find_column(columns: List[str], keywords: List[str], exclude: Tuple[str, ...] = ()) -> Optional[str]:
+    """
+    Return the first column whose name contains a keyword, trying keywords in
+    order; columns containing any `exclude` word are never picked.
+    """
+    for keyword in keywords:
+        for col in columns:
+            if keyword in col and not any(word in col for word in exclude):
                 return col
     return None
 
 
-def _parse_amount(value: str) -> float:
-    """Convert messy currency strings to float."""
-    raw = str(value).strip()
-    if not raw:
-        raise ValueError("amount is empty")
+def _parse_amounts(values: pd.Series) -> pd.Series:
+    """Convert a column of messy currency strings to floats (NaN when invalid)."""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+
+    raw = values.astype(str).str.strip()
 
     # Handle parentheses for negative values e.g. (1200)
-    negative = False
-    if raw.startswith("(") and raw.endswith(")"):
-        negative = True
-        raw = raw[1:-1]
+    negative = raw.str.startswith("(") & raw.str.endswith(")")
+    raw = raw.where(~negative, raw.str[1:-1])
 
     # Remove common currency symbols / text
-    cleaned = (
-        raw.replace(",", "")
-        .replace("₹", "")
-        .replace("$", "")
-        .replace("rs", "")
-        .replace("RS", "")
-        .replace("inr", "")
-        .strip()
-    )
+    cleaned = raw
+    for token in (",", "₹", "$", "rs", "RS", "inr"):
+        cleaned = cleaned.str.replace(token, "", regex=False)
+    cleaned = cleaned.str.strip()
 
     # Remove trailing credit/debit markers if present
-    cleaned = cleaned.replace("CR", "").replace("DR", "").strip()
+    cleaned = cleaned.str.replace("CR", "", regex=False).str.replace("DR", "", regex=False).str.strip()
 
-    amount = float(cleaned)
-    if negative:
-        amount *= -1
-    return amount
+    amounts = pd.to_numeric(cleaned, errors="coerce").astype(float)
+    return amounts.where(~negative, -amounts)
 
 
-def _apply_transaction_type(amount: float, txn_type: Optional[str]) -> float:
+def _apply_transaction_types(amounts: pd.Series, txn_types: pd.Series) -> pd.Series:
     """Use the 'type' column to fix the sign if the data doesn't use +/-."""
-    if not txn_type:
-        return amount
-
-    txn_type_lower = str(txn_type).strip().lower()
-    if not txn_type_lower:
-        return amount
-
-    if "debit" in txn_type_lower and amount > 0:
-        return -abs(amount)
-    if "credit" in txn_type_lower and amount < 0:
-        return abs(amount)
-    return amount
-
-
-def _parse_dataframe(df: pd.DataFrame) -> List[Dict]:
-    df = _normalize_columns(df.copy())
+    txn_types = txn_types.fillna("").astype(str).str.strip().str.lower()
+    debit = txn_types.str.contains("debit", regex=False) & (amounts > 0)
+    credit = txn_types.str.contains("credit", regex=False) & (amounts < 0)
+    amounts = amounts.mask(debit, -amounts.abs())
+    return amounts.mask(credit, amounts.abs())
+
+
+def _infer_date_format(values: pd.Series) -> Optional[str]:
+    """
+    Pick the one SUPPORTED_DATE_FORMATS entry that parses a sample of the column.
+    When day-first and month-first both parse every sampled value (no day > 12),
+    prefer the reading whose dates run in order, as statements are chronological;
+    on a full tie the earlier (day-first) format wins.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return None
+
+    sample = values.dropna()
+    if len(sample) > DATE_SAMPLE_SIZE:
+        sample = sample.iloc[::len(sample) // DATE_SAMPLE_SIZE]
+    sample = sample.astype(str).str.strip()
+    sample = sample[sample != ""]
+    if sample.empty:
+        return None
+
+    best_format, best_score = None, (0.0, 0.0)
+    for fmt in SUPPORTED_DATE_FORMATS:
+        parsed = pd.to_datetime(sample, format=fmt, errors="coerce")
+        parsed_share = parsed.notna().mean()
+        if parsed_share == 0:
+            continue
+        diffs = parsed.dropna().diff().dropna()
+        ordered_share = max((diffs >= pd.Timedelta(0)).mean(), (diffs <= pd.Timedelta(0)).mean()) if len(diffs) else 1.0
+        score = (parsed_share, ordered_share)
+        if score > best_score:
+            best_format, best_score = fmt, score
+
+    return best_format
+
+
+def _parse_dates(values: pd.Series, date_format: Optional[str] = None) -> pd.Series:
+    """
+    Parse a date column in one vectorized call using `date_format` (inferred
+    from the column when not given, or when it misses most values); only
+    rows that don't match it go through the slower per-format fallbacks.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+
+    if date_format is None:
+        date_format = _infer_date_format(values)
+
+    if date_format:
+        dates = pd.to_datetime(values, format=date_format, errors="coerce")
+        # A bank profile's format that misses most of the column doesn't fit
+        # this export (e.g. 4-digit years); infer one rather than leave the
+        # rows to the month-first "mixed" fallback
+        if dates.notna().sum() * 2 < values.notna().sum():
+            inferred_format = _infer_date_format(values)
+            if inferred_format and inferred_format != date_format:
+                dates = pd.to_datetime(values, format=inferred_format, errors="coerce")
+    else:
+        dates = pd.to_datetime(values, errors="coerce")
+
+    # Rows that don't follow the column's format (mixed exports)
+    remaining = dates.isna() & values.notna()
+    if remaining.any():
+        dates[remaining] = pd.to_datetime(values[remaining], format="mixed", errors="coerce")
+
+    for fmt in SUPPORTED_DATE_FORMATS:
+        remaining = dates.isna() & values.notna()
+        if not remaining.any():
+            break
+        dates[remaining] = pd.to_datetime(
+            values[remaining].astype(str), format=fmt, errors="coerce"
+        )
 
-    date_col = _find_column(df, ["date"])
-    amount_col = _find_column(df, ["amount", "amt"])
-    desc_col = _find_column(
-        df,
-        [
-            "raw_description",
-            "raw_desc",
-            "raw_descr",
-            "description",
-            "desc",
-            "merchant",
-            "narration",
-        ],
-    )
-    bank_col = _find_column(df, ["account", "bank", "card"])
-    type_col = _find_column(df, ["type", "txn_type"])
-
-    if not all([date_col, amount_col, desc_col]):
-        available_cols = ", ".join(df.columns.tolist())
+    return dates
+
+
+def _resolve_columns(columns: List[str]) -> Dict[str, str]:
+    """Infer column roles from normalized column names."""
+    debit_credit_words = ("withdrawal", "deposit", "debit", "credit")
+    found = {
+        "date": _find_column(columns, ["transaction_date", "txn_date", "date"]),
+        "amount": _find_column(columns, ["amount", "amt"], exclude=debit_credit_words),
+        "debit": _find_column(columns, ["withdrawal", "debit"], exclude=("card",)),
+        "credit": _find_column(columns, ["deposit", "credit"], exclude=("card",)),
+        "description": _find_column(
+            columns,
+            [
+                "raw_description",
+                "raw_desc",
+                "raw_descr",
+                "description",
+                "desc",
+                "merchant",
+                "narration",
+                "remarks",
+                "particulars",
+            ],
+        ),
+        "bank": _find_column(columns, ["account", "bank", "card"], exclude=("type",)),
+        "type": next((col for col in columns if col in TYPE_COLUMNS), None),
+    }
+
+    # A single amount column wins over separate withdrawal/deposit columns
+    if found["amount"]:
+        found["debit"] = found["credit"] = None
+    elif not (found["debit"] and found["credit"]):
+        found["debit"] = found["credit"] = None
+
+    has_amounts = found["amount"] or found["debit"]
+    if not (found["date"] and has_amounts and found["description"]):
+        available_cols = ", ".join(columns)
         raise ValueError(
-            "File must contain date, amount, and description columns. "
+            "File must contain date, amount (or withdrawal and deposit), and description columns. "
             f"Found columns: {available_cols}"
         )
 
-    transactions: List[Dict] = []
-
-    for _, row in df.iterrows():
-        try:
-            date_value = row[date_col]
-            if pd.isna(date_value):
-                continue
-
-            parsed_date = None
-            try:
-                parsed_date = pd.to_datetime(date_value)
-            except Exception:
-                for fmt in SUPPORTED_DATE_FORMATS:
-                    try:
-                        parsed_date = datetime.strptime(str(date_value), fmt)
-                        break
-                    except Exception:
-                        continue
-            if not parsed_date:
-                continue
-
-            amount_value = row[amount_col]
-            if pd.isna(amount_value):
-                continue
-            amount = _parse_amount(amount_value)
+    return {role: col for role, col in found.items() if col}
+
+
+def _resolve_profile(columns: List[str]) -> BankProfile:
+    """
+    Look the normalized header up in the bank profile registry. Unknown
+    headers have their column roles inferred once and cached; their date
+    format is still inferred per file since it isn't part of the header.
+    """
+    profile = bank_profiles.get(columns)
+    if profile is None:
+        roles = _resolve_columns(columns)
+        profile = bank_profiles.register(columns, BankProfile(
+            name="inferred",
+            columns=roles,
+            sign_convention="split" if "debit" in roles else "signed",
+            inferred=True,
+        ))
+    return profile
+
+
+def _peek_csv_header(stream: BinaryIO) -> List[str]:
+    """Read the normalized header of a CSV stream without consuming it."""
+    position = stream.tell()
+    first_line = stream.readline()
+    stream.seek(position)
+    names = next(csv.reader([first_line.decode("utf-8-sig", errors="replace")]), [])
+    return normalize_header(names)
+
+
+def encode_raw_row(values) -> str:
+    """Encode one row's cell values as a single CSV line (no column names)."""
+    buffer = StringIO()
+    csv.writer(buffer, lineterminator="").writerow(["" if value is None else value for value in values])
+    return buffer.getvalue()
+
+
+def _raw_lines(df: pd.DataFrame) -> List[str]:
+    """
+    Keep each source row as a compact CSV line. Column names are stored once
+    per upload (StatementUpload.header) instead of on every transaction.
+    """
+    values = df.astype(object).where(df.notna(), None)
+    buffer = StringIO()
+    writer = csv.writer(buffer, lineterminator="")
+    lines = []
+    for row in values.itertuples(index=False, name=None):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(["" if value is None else value for value in row])
+        lines.append(buffer.getvalue())
+    return lines
+
+
+def _parse_frame(
+    df: pd.DataFrame, profile: BankProfile, date_format: Optional[str] = None
+) -> List[Dict]:
+    """
+    Parse a normalized DataFrame with a bank profile; returns an empty list if
+    no row is valid. date_format overrides the profile's (None means infer).
+    """
+    columns = profile.columns
+    desc_col = columns["description"]
+    bank_col = columns.get("bank")
+    type_col = columns.get("type")
+
+    # Parse whole columns at once and drop invalid rows with a single mask
+    dates = _parse_dates(df[columns["date"]], date_format or profile.date_format)
+
+    if profile.sign_convention == "split":
+        debits = _parse_amounts(df[columns["debit"]])
+        credits = _parse_amounts(df[columns["credit"]])
+        amounts = credits.abs().fillna(0) - debits.abs().fillna(0)
+        amounts = amounts.where(debits.notna() | credits.notna())
+    else:
+        amounts = _parse_amounts(df[columns["amount"]])
+        if profile.sign_convention == "debit_positive":
+            amounts = -amounts
+    if type_col:
+        amounts = _apply_transaction_types(amounts, df[type_col])
+
+    descriptions = df[desc_col]
+    valid_description = descriptions.notna()
+    descriptions = descriptions.astype(str).str.strip()
+    valid_description &= descriptions != ""
+
+    if bank_col:
+        bank_accounts = df[bank_col].astype(str).str.strip()
+        bank_accounts = bank_accounts.where(
+            df[bank_col].notna() & (bank_accounts != ""), "Primary Account"
+        )
+    else:
+        bank_accounts = pd.Series("Primary Account", index=df.index)
+
+    valid = dates.notna() & amounts.notna() & valid_description
+    skipped = int((~valid).sum())
+    if skipped:
+        print(f"Skipped {skipped} invalid rows")
+
+    raw_rows = _raw_lines(df[valid])
+
+    transactions: List[Dict] = [
+        {
+            "date": date,
+            "amount": amount,
+            "description": description,
+            "bank_account": bank_account,
+            "raw_text": raw_row,
+        }
+        for date, amount, description, bank_account, raw_row in zip(
+            dates[valid],
+            amounts[valid].tolist(),
+            descriptions[valid].tolist(),
+            bank_accounts[valid].tolist(),
+            raw_rows,
+        )
+    ]
 
-            txn_type = row[type_col] if type_col and type_col in row else None
-            amount = _apply_transaction_type(amount, txn_type)
+    return transactions
 
-            description_value = row[desc_col]
-            if pd.isna(description_value):
-                continue
-            description = str(description_value).strip()
-            if not description:
-                continue
 
-            bank_value = (
-                row[bank_col] if bank_col and bank_col in row and not pd.isna(row[bank_col]) else None
-            )
-            bank_account = str(bank_value).strip() if bank_value else "Primary Account"
-
-            transactions.append(
-                {
-                    "date": parsed_date,
-                    "amount": amount,
-                    "description": description,
-                    "bank_account": bank_account,
-                    "raw_text": str(row.to_dict()),
-                }
-            )
-        except Exception as exc:
-            print(f"Error parsing row: {exc}")
-            continue
+def _parse_dataframe(df: pd.DataFrame) -> List[Dict]:
+    df = _normalize_columns(df.copy())
+    transactions = _parse_frame(df, _resolve_profile(df.columns.tolist()))
 
     if not transactions:
         raise ValueError("No valid transactions found in the file")
@@ -175,6 +335,153 @@ def parse_csv(file_content: str) -> List[Dict]:
         raise ValueError(f"Error parsing CSV: {exc}")
 
 
+def iter_csv_chunks(
+    stream: BinaryIO,
+    chunksize: int = 5000,
+    on_header: Optional[Callable[[List[str]], None]] = None,
+) -> Iterator[List[Dict]]:
+    """
+    Parse a CSV bank statement from a binary stream, one chunk at a time.
+    Only one chunk of rows is held in memory; callers should persist each
+    chunk before asking for the next one. on_header, if given, is called once
+    with the column names that each transaction's raw_text line follows.
+    """
+    date_format = None
+    found_any = False
+    try:
+        # Known bank formats come with their encoding, columns and date format
+        profile = _resolve_profile(_peek_csv_header(stream))
+        reader = pd.read_csv(stream, encoding=profile.encoding, chunksize=chunksize)
+        for index, chunk in enumerate(reader):
+            chunk = _normalize_columns(chunk)
+            if index == 0:
+                missing = [col for col in profile.columns.values() if col not in chunk.columns]
+                if missing:
+                    raise ValueError(f"Columns {missing} of bank profile '{profile.name}' not found")
+                # Infer the date format once, from the first chunk, if the profile has none
+                date_format = profile.date_format or _infer_date_format(chunk[profile.columns["date"]])
+                if on_header:
+                    on_header(chunk.columns.tolist())
+            transactions = _parse_frame(chunk, profile, date_format)
+            if transactions:
+                found_any = True
+                yield transactions
+    except Exception as exc:
+        raise ValueError(f"Error parsing CSV: {exc}")
+
+    if not found_any:
+        raise ValueError("Error parsing CSV: No valid transactions found in the file")
+
+
+def _iter_excel_rows(stream: BinaryIO, file_ext: str) -> Iterator[tuple]:
+    """
+    Yield the first sheet's rows as tuples of cell values without building a DataFrame.
+    Uses python-calamine when installed, otherwise openpyxl in read-only
+    (streaming) mode; legacy .xls without calamine goes through pandas.
+    """
+    if CalamineWorkbook is not None:
+        workbook = CalamineWorkbook.from_filelike(stream)
+        for row in workbook.get_sheet_by_index(0).to_python(skip_empty_area=False):
+            yield tuple(None if value == "" else value for value in row)
+    elif file_ext == "xlsx":
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+        try:
+            for row in workbook.worksheets[0].iter_rows(values_only=True):
+                yield row
+        finally:
+            workbook.close()
+    else:
+        df = pd.read_excel(stream, header=None)
+        for row in df.itertuples(index=False, name=None):
+            yield tuple(None if pd.isna(value) else value for value in row)
+
+
+def _find_header(row: tuple) -> Optional[Tuple[List[str], BankProfile]]:
+    """Return (column names, bank profile) if the row looks like the statement header."""
+    names = normalize_header("" if value is None else value for value in row)
+    try:
+        return names, _resolve_profile(names)
+    except ValueError:
+        return None
+
+
+def iter_excel_chunks(
+    stream: BinaryIO,
+    file_ext: str = "xlsx",
+    chunksize: int = 5000,
+    on_header: Optional[Callable[[List[str]], None]] = None,
+) -> Iterator[List[Dict]]:
+    """
+    Parse an Excel bank statement from a binary stream, one chunk at a time.
+    The header row is located automatically within the first HEADER_SCAN_ROWS
+    rows, so logo/metadata rows that banks put above it are skipped.
+    on_header is called once with the header's column names.
+    """
+    names = profile = None
+    date_format = None
+    found_any = False
+    batch = []
+
+    def parse_batch():
+        nonlocal date_format
+        df = pd.DataFrame(batch, columns=names)
+        if date_format is None:
+            date_format = profile.date_format or _infer_date_format(df[profile.columns["date"]])
+        return _parse_frame(df, profile, date_format)
+
+    try:
+        for index, row in enumerate(_iter_excel_rows(stream, file_ext)):
+            if profile is None:
+                header = _find_header(row)
+                if header:
+                    names, profile = header
+                    if on_header:
+                        on_header(names)
+                elif index >= HEADER_SCAN_ROWS:
+                    raise ValueError(
+                        "File must contain date, amount, and description columns. "
+                        f"No header row found in the first {HEADER_SCAN_ROWS} rows"
+                    )
+                continue
+
+            if all(value is None for value in row):
+                continue
+            batch.append(row[:len(names)])
+            if len(batch) >= chunksize:
+                transactions = parse_batch()
+                batch = []
+                if transactions:
+                    found_any = True
+                    yield transactions
+
+        if batch:
+            transactions = parse_batch()
+            if transactions:
+                found_any = True
+                yield transactions
+    except Exception as exc:
+        raise ValueError(f"Error parsing Excel file: {exc}")
+
+    if not found_any:
+        raise ValueError("Error parsing Excel file: No valid transactions found in the file")
+
+
+def parse_statement_file(path: str, chunksize: int = 5000) -> Tuple[List[str], List[Dict]]:
+    """
+    Parse a stored CSV/Excel statement into (header, transactions).
+    Module-level so batch uploads can run it in worker processes.
+    """
+    file_ext = path.rsplit(".", 1)[-1].lower()
+    header: List[str] = []
+    with open(path, "rb") as stream:
+        if file_ext == "csv":
+            chunks = iter_csv_chunks(stream, chunksize=chunksize, on_header=header.extend)
+        else:
+            chunks = iter_excel_chunks(stream, file_ext, chunksize=chunksize, on_header=header.extend)
+        transactions = [txn for chunk in chunks for txn in chunk]
+    return header, transactions
+
+
 def parse_excel(df: pd.DataFrame) -> List[Dict]:
     """Parse Excel bank statement DataFrame."""
     try:
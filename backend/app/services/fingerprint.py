@@ -0,0 +1,62 @@
+import hashlib
+from collections import Counter
+from typing import BinaryIO, Dict, List, Tuple
+from sqlalchemy.orm import Session
+from app.models import Transaction
+
+# Keep IN (...) lists well under SQLite's bound-parameter limit
+LOOKUP_BATCH_SIZE = 500
+
+
+def file_content_hash(stream: BinaryIO, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of an uploaded file, read in blocks; rewinds the stream afterwards."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for block in iter(lambda: stream.read(block_size), b""):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def normalize_description(description: str) -> str:
+    """Case- and whitespace-insensitive form of a description."""
+    return " ".join(str(description).lower().split())
+
+
+def assign_fingerprints(user_id: int, transactions: List[Dict], occurrences: Counter) -> None:
+    """
+    Add a deterministic 'fingerprint' to each transaction dict.
+    Identical rows in one statement (two equal payments on the same day) are
+    told apart by their occurrence number, which `occurrences` carries across
+    chunks of the same upload.
+    """
+    for txn in transactions:
+        key = (
+            str(txn["bank_account"]),
+            txn["date"].isoformat(),
+            f"{txn['amount']:.2f}",
+            normalize_description(txn["description"]),
+        )
+        occurrences[key] += 1
+        payload = "|".join([str(user_id), *key, str(occurrences[key])])
+        txn["fingerprint"] = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def filter_new_transactions(db: Session, transactions: List[Dict]) -> Tuple[List[Dict], int]:
+    """
+    Drop transactions whose fingerprint is already stored. Returns (new, skipped_count).
+    Fingerprints include the user id and are unique across users, so this
+    looks them up on their own: filtering on user_id as well lets SQLite
+    pick a user_id index and scan all of the user's rows for every batch.
+    """
+    fingerprints = list({txn["fingerprint"] for txn in transactions})
+    existing = set()
+    for start in range(0, len(fingerprints), LOOKUP_BATCH_SIZE):
+        batch = fingerprints[start:start + LOOKUP_BATCH_SIZE]
+        existing.update(
+            fingerprint
+            for (fingerprint,) in db.query(Transaction.fingerprint).filter(Transaction.fingerprint.in_(batch))
+        )
+
+    new_transactions = [txn for txn in transactions if txn["fingerprint"] not in existing]
+    return new_transactions, len(transactions) - len(new_transactions)
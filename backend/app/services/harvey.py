@@ -1,145 +1,200 @@
-from typing import List, Dict
+from functools import cached_property
+from typing import List, Dict, Optional
+import pandas as pd
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-from app.models import Subscription, Transaction, AIRecommendation
-from app.ml.detect import detect_price_anomalies, calculate_usage_frequency, predict_cancellation_probability
+from datetime import datetime
+from app.models import Subscription, SubscriptionStatus
+from app.ml.detect import merchant_statistics, price_anomalies_from_frame, score_from_frame, subscription_merchant
+from app.ml.periodicity import monthly_cost as monthly_cost_for
 from app.ml.preprocess import normalize_transactions
+from app.services.merchant_aggregates import get_merchant_transactions
 
 class HarveyService:
     """AI Agent Harvey - Provides insights and recommendations."""
     
     @staticmethod
-    def generate_recommendations(db: Session, user_id: int) -> List[Dict]:
-        """Generate AI recommendations for user."""
-        subscriptions = db.query(Subscription).filter(
-            Subscription.user_id == user_id,
-            Subscription.status == "active"
-        ).all()
-        
-        transactions = db.query(Transaction).filter(
-            Transaction.user_id == user_id
-        ).all()
-        
-        if not subscriptions:
-            return []
-        
-        # Convert to dicts for ML functions
-        transactions_data = [
-            {
-                'date': t.date,
-                'amount': t.amount,
-                'description': t.description,
-                'bank_account': t.bank_account
-            }
-            for t in transactions
-        ]
-        
-        recommendations = []
-        
+    def _subscription_data(subscriptions: List[Subscription]) -> List[Dict]:
+        """Subscriptions as dicts for the ML functions, keyed by merchant."""
+        subscriptions_data = []
         for sub in subscriptions:
             sub_dict = {
                 'id': sub.id,
                 'name': sub.name,
                 'amount': sub.amount,
-                'frequency': sub.frequency
+                'frequency': sub.frequency,
+                'period_days': sub.period_days,
+                'last_seen': sub.last_seen,
+                'merchant_key': sub.merchant_key,
+                'status': sub.status
             }
-            
-            # Calculate usage frequency
-            usage_score = calculate_usage_frequency(transactions_data, sub_dict)
-            
-            # Calculate days since last seen
-            days_since_last = (datetime.now() - sub.last_seen).days
-            
-            # Predict cancellation probability
-            cancel_prob = predict_cancellation_probability(sub_dict, usage_score, days_since_last)
-            
+            sub_dict['merchant_key'] = subscription_merchant(sub_dict)
+            subscriptions_data.append(sub_dict)
+        return subscriptions_data
+    
+    @staticmethod
+    def _merchant_transactions(db: Session, user_id: int, subscriptions_data: List[Dict]) -> List[Dict]:
+        """Only the subscriptions' own transactions, via the merchant_key index."""
+        return get_merchant_transactions(db, user_id, [sub['merchant_key'] for sub in subscriptions_data])
+    
+    @staticmethod
+    def _recommendations_for(subscriptions_data: List[Dict], scores: Dict, anomalies: List[Dict]) -> List[Dict]:
+        """Recommendation rules over scored subscriptions and their price anomalies."""
+        recommendations = []
+        
+        for sub, usage_score, cancel_prob in zip(
+            subscriptions_data, scores['usage_score'], scores['cancellation_probability']
+        ):
             # Generate recommendation text
             recommendation_text = ""
             risk_score = 0.0
             
             if cancel_prob > 0.7:
-                recommendation_text = f"⚠️ High cancellation risk for {sub.name}. Consider reviewing usage."
-                risk_score = cancel_prob
+                kind = "cancellation_risk"
+                recommendation_text = f"⚠️ High cancellation risk for {sub['name']}. Consider reviewing usage."
+                risk_score = float(cancel_prob)
             elif usage_score < 0.3:
-                recommendation_text = f"💡 Low usage detected for {sub.name}. You may want to cancel to save ₹{sub.amount:.2f}/{sub.frequency}."
+                kind = "low_usage"
+                recommendation_text = f"💡 Low usage detected for {sub['name']}. You may want to cancel to save ₹{sub['amount']:.2f}/{sub['frequency']}."
                 risk_score = 0.6
-            elif sub.amount > 20 and usage_score < 0.5:
-                recommendation_text = f"💰 {sub.name} costs ₹{sub.amount:.2f} but shows low usage. Potential savings: ₹{sub.amount:.2f}/{sub.frequency}."
+            elif sub['amount'] > 20 and usage_score < 0.5:
+                kind = "low_value"
+                recommendation_text = f"💰 {sub['name']} costs ₹{sub['amount']:.2f} but shows low usage. Potential savings: ₹{sub['amount']:.2f}/{sub['frequency']}."
                 risk_score = 0.5
             
             if recommendation_text:
                 recommendations.append({
-                    'subscription_id': sub.id,
+                    'subscription_id': sub['id'],
+                    'kind': kind,
                     'recommendation_text': recommendation_text,
                     'risk_score': risk_score
                 })
         
         # Check for price anomalies
-        subscriptions_data = [
-            {
-                'id': sub.id,
-                'name': sub.name,
-                'amount': sub.amount,
-                'frequency': sub.frequency
-            }
-            for sub in subscriptions
-        ]
-        
-        anomalies = detect_price_anomalies(subscriptions_data, transactions_data)
         for anomaly in anomalies:
             recommendations.append({
                 'subscription_id': anomaly['subscription_id'],
+                'kind': anomaly['anomaly_type'],
                 'recommendation_text': f"📈 {anomaly['description']}",
                 'risk_score': anomaly['risk_score']
             })
         
         return recommendations
     
+    @staticmethod
+    def generate_recommendations(db: Session, user_id: int) -> List[Dict]:
+        """Generate AI recommendations for user."""
+        return HarveySnapshot(db, user_id).recommendations()
+    
+    @staticmethod
+    def get_subscription_insights(db: Session, subscription: Subscription) -> Dict:
+        """
+        Harvey's view of one subscription for its detail page: only that
+        subscription's merchant transactions are loaded and scored, so the
+        cost doesn't grow with the user's other subscriptions.
+        """
+        snapshot = HarveySnapshot(db, subscription.user_id, subscriptions=[subscription])
+        scores = snapshot.scores
+        return {
+            'usage_score': float(scores['usage_score'][0]),
+            'days_since_last': int(scores['days_since_last'][0]),
+            'cancellation_probability': float(scores['cancellation_probability'][0]),
+            'recommendations': snapshot.recommendations(),
+            'transactions': snapshot.transactions
+        }
+    
     @staticmethod
     def calculate_savings(db: Session, user_id: int) -> Dict:
         """Calculate potential savings."""
-        subscriptions = db.query(Subscription).filter(
-            Subscription.user_id == user_id,
-            Subscription.status == "active"
-        ).all()
-        
+        return HarveySnapshot(db, user_id).savings()
+    
+    @staticmethod
+    def get_anomalies(db: Session, user_id: int) -> List[Dict]:
+        """Get detected anomalies."""
+        return HarveySnapshot(db, user_id).anomalies()
+
+
+class HarveySnapshot:
+    """
+    Everything Harvey reports for a user, from one pass over their data:
+    column-only queries for the subscriptions and their merchants'
+    transactions, one normalization and one set of per-merchant statistics,
+    shared by recommendations(), savings() and anomalies(). Each part is
+    computed on first use, so a snapshot only pays for what is asked of it.
+    Everything is held as plain values, so commits in between don't reload.
+    """
+    
+    def __init__(self, db: Session, user_id: int, subscriptions: Optional[List[Subscription]] = None,
+                 now: Optional[datetime] = None):
+        self.db = db
+        self.user_id = user_id
+        self._subscriptions = subscriptions
+        self.now = now
+    
+    @cached_property
+    def subscriptions_data(self) -> List[Dict]:
+        """All of the user's subscriptions (anomalies cover cancelled ones too)."""
+        if self._subscriptions is not None:
+            return HarveyService._subscription_data(self._subscriptions)
+        rows = self.db.query(
+            Subscription.id, Subscription.name, Subscription.amount, Subscription.frequency,
+            Subscription.period_days, Subscription.last_seen, Subscription.merchant_key, Subscription.status
+        ).filter(Subscription.user_id == self.user_id)
+        return HarveyService._subscription_data(rows)
+    
+    @cached_property
+    def transactions(self) -> List[Dict]:
+        if not self.subscriptions_data:
+            return []
+        return HarveyService._merchant_transactions(self.db, self.user_id, self.subscriptions_data)
+    
+    @cached_property
+    def frame(self) -> pd.DataFrame:
+        return normalize_transactions(self.transactions) if self.transactions else pd.DataFrame()
+    
+    @cached_property
+    def scores(self) -> Dict:
+        """score_subscriptions for every subscription, in subscriptions_data order."""
+        stats = merchant_statistics(self.frame) if not self.frame.empty else None
+        return score_from_frame(self.frame, self.subscriptions_data, self.now, stats)
+    
+    @cached_property
+    def price_anomalies(self) -> List[Dict]:
+        return price_anomalies_from_frame(self.frame, self.subscriptions_data)
+    
+    @cached_property
+    def _active(self) -> List[int]:
+        """Positions of the active subscriptions."""
+        return [
+            position for position, sub in enumerate(self.subscriptions_data)
+            if sub['status'] == SubscriptionStatus.ACTIVE
+        ]
+    
+    def _active_scores(self) -> Dict:
+        return {name: values[self._active] for name, values in self.scores.items()}
+    
+    def recommendations(self) -> List[Dict]:
+        """Recommendations for the active subscriptions."""
+        if not self._active:
+            return []
+        active = [self.subscriptions_data[position] for position in self._active]
+        active_ids = {sub['id'] for sub in active}
+        anomalies = [anomaly for anomaly in self.price_anomalies if anomaly['subscription_id'] in active_ids]
+        return HarveyService._recommendations_for(active, self._active_scores(), anomalies)
+    
+    def savings(self) -> Dict:
+        """Monthly cost of the active subscriptions and the share going to low-usage ones."""
         total_monthly = 0.0
         avoidable_spend = 0.0
         
-        transactions = db.query(Transaction).filter(
-            Transaction.user_id == user_id
-        ).all()
-        
-        transactions_data = [
-            {
-                'date': t.date,
-                'amount': t.amount,
-                'description': t.description,
-                'bank_account': t.bank_account
-            }
-            for t in transactions
-        ]
-        
-        for sub in subscriptions:
+        usage_scores = self._active_scores()['usage_score'] if self._active else []
+        for position, usage_score in zip(self._active, usage_scores):
+            sub = self.subscriptions_data[position]
             # Convert to monthly cost
-            if sub.frequency == "monthly":
-                monthly_cost = sub.amount
-            elif sub.frequency == "yearly":
-                monthly_cost = sub.amount / 12
-            else:
-                monthly_cost = sub.amount  # Assume monthly
+            monthly_cost = monthly_cost_for(sub['amount'], sub['frequency'], sub['period_days'])
             
             total_monthly += monthly_cost
             
             # Check if low usage (potential waste)
-            sub_dict = {
-                'id': sub.id,
-                'name': sub.name,
-                'amount': sub.amount,
-                'frequency': sub.frequency
-            }
-            usage_score = calculate_usage_frequency(transactions_data, sub_dict)
-            
             if usage_score < 0.3:
                 avoidable_spend += monthly_cost
         
@@ -149,36 +204,28 @@ class HarveyService:
             'potential_savings': avoidable_spend
         }
     
-    @staticmethod
-    def get_anomalies(db: Session, user_id: int) -> List[Dict]:
-        """Get detected anomalies."""
-        subscriptions = db.query(Subscription).filter(
-            Subscription.user_id == user_id
-        ).all()
-        
-        transactions = db.query(Transaction).filter(
-            Transaction.user_id == user_id
-        ).all()
-        
-        subscriptions_data = [
-            {
-                'id': sub.id,
-                'name': sub.name,
-                'amount': sub.amount,
-                'frequency': sub.frequency
-            }
-            for sub in subscriptions
-        ]
-        
-        transactions_data = [
+    def anomalies(self) -> List[Dict]:
+        """Price increases across all of the user's subscriptions."""
+        return self.price_anomalies
+    
+    def subscription_scores(self) -> List[Dict]:
+        """Usage score and cancellation probability of every subscription, as plain values."""
+        return [
             {
-                'date': t.date,
-                'amount': t.amount,
-                'description': t.description,
-                'bank_account': t.bank_account
+                'subscription_id': sub['id'],
+                'usage_score': float(usage_score),
+                'days_since_last': int(days_since_last),
+                'cancellation_probability': float(cancel_prob)
             }
-            for t in transactions
+            for sub, usage_score, days_since_last, cancel_prob in zip(
+                self.subscriptions_data, self.scores['usage_score'],
+                self.scores['days_since_last'], self.scores['cancellation_probability']
+            )
         ]
-        
-        return detect_price_anomalies(subscriptions_data, transactions_data)
-
+    
+    def summary(self) -> Dict:
+        return {
+            'recommendations': self.recommendations(),
+            'savings': self.savings(),
+            'anomalies': self.anomalies()
+        }
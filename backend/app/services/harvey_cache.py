@@ -0,0 +1,176 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models import User
+try:
+    from config import settings
+except ImportError:
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+    from config import settings
+
+# Optional shared backend for multi-worker deployments
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+def bump_data_version(db: Session, *user_ids: int) -> None:
+    """
+    Mark users' subscriptions/transactions as changed, so cached Harvey
+    results for their previous version are no longer served, and their
+    precomputed insights are refreshed (app/services/harvey_insights.py).
+    Does not commit.
+    """
+    db.query(User).filter(User.id.in_(user_ids)).update({
+        User.data_version: User.data_version + 1,
+        # Kept at the first unrefreshed change, so refresh lag counts from there
+        User.insights_stale_since: func.coalesce(User.insights_stale_since, datetime.now())
+    }, synchronize_session=False)
+
+
+class MemoryCacheBackend:
+    """Bounded in-process LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete_prefix(self, prefix: str) -> None:
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                del self.entries[key]
+
+    def stats(self) -> Dict:
+        return {'entries': len(self.entries), 'evictions': self.evictions, 'expirations': self.expirations}
+
+
+class RedisCacheBackend:
+    """Shared across workers; values are stored as JSON with a Redis TTL."""
+
+    def __init__(self, url: str, ttl_seconds: float):
+        if redis is None:
+            raise RuntimeError("HARVEY_CACHE_BACKEND=redis needs the redis package (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.client.get(key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        self.client.set(key, json.dumps(value, default=str), ex=int(self.ttl_seconds))
+
+    def delete_prefix(self, prefix: str) -> None:
+        keys = list(self.client.scan_iter(match=f"{prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self) -> Dict:
+        return {}
+
+
+class HarveyCache:
+    """
+    Harvey results keyed by (user_id, cache_token, data_version, kind). A
+    bumped version simply stops matching, so stale entries are never served
+    and age out of the backend on their own; so does a deleted account's,
+    whatever worker cached it, since a reused id comes with a new token.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        # Request threads and the refresh scheduler's workers share the counters
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(user: User, kind: str) -> str:
+        return f"harvey:{user.id}:{user.cache_token}:{user.data_version}:{kind}"
+
+    def get_or_compute(self, user: User, kind: str, compute: Callable[[], Any]) -> Any:
+        """The user's cached `kind` result for their current data, computed on a miss."""
+        if self.backend is None:
+            return compute()
+        key = self._key(user, kind)
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Harvey cache read failed: {e}")
+            value = None
+        if value is not None:
+            with self.lock:
+                self.hits += 1
+            return value
+
+        with self.lock:
+            self.misses += 1
+        value = compute()
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            print(f"Harvey cache write failed: {e}")
+        return value
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Free a deleted account's entries early (only this worker's, for the memory backend)."""
+        if self.backend is not None:
+            self.backend.delete_prefix(f"harvey:{user_id}:")
+
+    def stats(self) -> Dict:
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        stats = {
+            'backend': type(self.backend).__name__ if self.backend else None,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+        }
+        if self.backend is not None:
+            stats.update(self.backend.stats())
+        return stats
+
+
+def create_harvey_cache() -> HarveyCache:
+    if settings.HARVEY_CACHE_BACKEND == "redis":
+        return HarveyCache(RedisCacheBackend(settings.HARVEY_CACHE_REDIS_URL, settings.HARVEY_CACHE_TTL_SECONDS))
+    if settings.HARVEY_CACHE_BACKEND == "memory":
+        return HarveyCache(MemoryCacheBackend(settings.HARVEY_CACHE_SIZE, settings.HARVEY_CACHE_TTL_SECONDS))
+    return HarveyCache()
+
+
+harvey_cache = create_harvey_cache()
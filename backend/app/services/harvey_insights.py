@@ -0,0 +1,264 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import func, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from app.database import SessionLocal
+from app.models import HarveyInsight, User
+from app.services.harvey import HarveySnapshot
+from app.services.recommendations import get_user_recommendations
+try:
+    from config import settings
+except ImportError:
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+    from config import settings
+
+
+def refresh_user_insights(db: Session, user_id: int) -> Optional[datetime]:
+    """
+    Recompute a user's harvey_insights row and stored recommendations from
+    one snapshot. Commits; returns when the data first changed since the
+    previous refresh (None if it hadn't), for the refresh-lag metric.
+    """
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is None:
+        return None
+    version = user.data_version
+    stale_since = user.insights_stale_since
+
+    started = time.perf_counter()
+    snapshot = HarveySnapshot(db, user_id)
+    get_user_recommendations(db, user, snapshot)
+    savings = snapshot.savings()
+    values = {
+        'data_version': version,
+        'total_monthly_cost': savings['total_monthly_cost'],
+        'avoidable_spend': savings['avoidable_spend'],
+        'potential_savings': savings['potential_savings'],
+        'subscription_scores': json.dumps(snapshot.subscription_scores()),
+        'anomalies': json.dumps(snapshot.anomalies()),
+        'computed_at': datetime.now(),
+        'compute_seconds': time.perf_counter() - started
+    }
+
+    insight = db.query(HarveyInsight).filter(HarveyInsight.user_id == user_id).first()
+    if insight is None:
+        db.add(HarveyInsight(user_id=user_id, **values))
+    else:
+        for field, value in values.items():
+            setattr(insight, field, value)
+    # Only if nothing changed meanwhile: a bump after `version` was read keeps the user stale
+    db.query(User).filter(User.id == user_id, User.data_version == version).update(
+        {User.insights_stale_since: None}, synchronize_session=False
+    )
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker inserted the row first; its copy is just as current
+        db.rollback()
+    return stale_since
+
+
+def claim_refresh(db: Session, user_id: int, limit: int, timeout: timedelta) -> bool:
+    """
+    Take a user's refresh for this process, so the schedulers of other API
+    workers skip them, as long as fewer than `limit` claims are live across
+    all processes. Claims older than `timeout` (a crashed worker) can be
+    taken over. Commits; returns whether the claim was taken.
+    """
+    now = datetime.now()
+    expired = now - timeout
+    claims = aliased(User)
+    live_claims = select(func.count(claims.id)).where(claims.insights_claimed_at >= expired).scalar_subquery()
+    claimed = db.query(User).filter(
+        User.id == user_id,
+        or_(User.insights_claimed_at.is_(None), User.insights_claimed_at < expired),
+        live_claims < limit
+    ).update({User.insights_claimed_at: now}, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+
+def release_refresh(db: Session, user_id: int):
+    db.query(User).filter(User.id == user_id).update({User.insights_claimed_at: None}, synchronize_session=False)
+    db.commit()
+
+
+def read_insights(db: Session, user: User) -> Optional[Dict]:
+    """
+    The user's precomputed savings, anomalies and subscription scores, or
+    None when there is no row for their current data yet; a refresh is
+    queued then, and callers compute on demand meanwhile.
+    """
+    insight = db.query(HarveyInsight).filter(HarveyInsight.user_id == user.id).first()
+    if insight is None or insight.data_version != user.data_version:
+        harvey_refresh_scheduler.request_refresh(user.id)
+        return None
+    return {
+        'savings': {
+            'total_monthly_cost': insight.total_monthly_cost,
+            'avoidable_spend': insight.avoidable_spend,
+            'potential_savings': insight.potential_savings
+        },
+        'anomalies': json.loads(insight.anomalies),
+        'scores': json.loads(insight.subscription_scores),
+        'computed_at': insight.computed_at
+    }
+
+
+class HarveyRefreshScheduler:
+    """
+    In-process refresher for harvey_insights, no broker needed: uploads
+    queue their user directly, and a sweep thread queues the users whose
+    data changed (oldest change first) and rows past their maximum age.
+    Every API worker process runs one; they coordinate through claims on
+    the users table (claim_refresh), so a user is refreshed by one process
+    at a time and at most max_workers refreshes run across all of them.
+    A user whose claim can't be taken stays stale for the next sweep.
+    Locally each user is queued at most once and the sweep never holds
+    more than batch_size users.
+    """
+
+    def __init__(self, max_workers: int, interval_seconds: float, batch_size: int, max_age_hours: float,
+                 claim_timeout_seconds: float):
+        self.max_workers = max_workers
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.max_age = timedelta(hours=max_age_hours)
+        self.claim_timeout = timedelta(seconds=claim_timeout_seconds)
+        self.executor = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.refreshed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.last_lag_seconds = None
+        self.max_lag_seconds = 0.0
+
+    def start(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="harvey-refresh")
+        self.thread = threading.Thread(target=self._run, name="harvey-refresh-sweep", daemon=True)
+        self.thread.start()
+
+    def request_refresh(self, user_id: int) -> bool:
+        """Queue a refresh unless one is already pending; a no-op until start() (scripts, benchmarks)."""
+        if self.executor is None:
+            return False
+        with self.lock:
+            if user_id in self.pending:
+                return False
+            self.pending.add(user_id)
+        self.executor.submit(self._refresh, user_id)
+        return True
+
+    def _refresh(self, user_id: int):
+        db = SessionLocal()
+        claimed = False
+        try:
+            claimed = claim_refresh(db, user_id, self.max_workers, self.claim_timeout)
+            if not claimed:
+                # Another process has it, or the global limit is reached
+                with self.lock:
+                    self.skipped += 1
+                return
+            stale_since = refresh_user_insights(db, user_id)
+            with self.lock:
+                self.refreshed += 1
+                if stale_since is not None:
+                    self.last_lag_seconds = (datetime.now() - stale_since).total_seconds()
+                    self.max_lag_seconds = max(self.max_lag_seconds, self.last_lag_seconds)
+        except Exception as e:
+            db.rollback()
+            print(f"Harvey refresh for user {user_id} failed: {e}")
+            with self.lock:
+                self.failed += 1
+        finally:
+            try:
+                if claimed:
+                    release_refresh(db, user_id)
+            except Exception as e:
+                # Expires after claim_timeout
+                print(f"Releasing Harvey refresh claim for user {user_id} failed: {e}")
+            finally:
+                db.close()
+                with self.lock:
+                    self.pending.discard(user_id)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval_seconds):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Harvey refresh sweep failed: {e}")
+
+    def _due_users(self, db: Session, limit: int) -> List[int]:
+        with self.lock:
+            pending = list(self.pending)
+        unclaimed = or_(User.insights_claimed_at.is_(None), User.insights_claimed_at < datetime.now() - self.claim_timeout)
+        due = [user_id for user_id, in db.query(User.id).filter(
+            User.insights_stale_since.isnot(None), User.id.not_in(pending), unclaimed
+        ).order_by(User.insights_stale_since).limit(limit)]
+        if len(due) < limit:
+            # Usage scores and days since last charge drift even without new data
+            cutoff = datetime.now() - self.max_age
+            due += [user_id for user_id, in db.query(HarveyInsight.user_id).filter(
+                HarveyInsight.computed_at < cutoff, HarveyInsight.user_id.not_in(pending + due)
+            ).order_by(HarveyInsight.computed_at).limit(limit - len(due))]
+        return due
+
+    def sweep(self) -> int:
+        """Queue due users while fewer than batch_size are pending; returns how many were queued."""
+        room = self.batch_size - len(self.pending)
+        if room <= 0:
+            return 0
+        db = SessionLocal()
+        try:
+            due = self._due_users(db, room)
+        finally:
+            db.close()
+        return sum(self.request_refresh(user_id) for user_id in due)
+
+    def stats(self, db: Session) -> Dict:
+        stale_users, oldest = db.query(
+            func.count(User.id), func.min(User.insights_stale_since)
+        ).filter(User.insights_stale_since.isnot(None)).one()
+        refreshing = db.query(func.count(User.id)).filter(
+            User.insights_claimed_at >= datetime.now() - self.claim_timeout
+        ).scalar()
+        return {
+            'running': self.executor is not None,
+            'workers': self.max_workers,
+            # Across all processes; the counters below are this process's
+            'refreshing': refreshing,
+            'pending': len(self.pending),
+            'refreshed': self.refreshed,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'stale_users': stale_users,
+            # Age of the oldest change not yet precomputed
+            'refresh_lag_seconds': (datetime.now() - oldest).total_seconds() if oldest else 0.0,
+            'last_lag_seconds': self.last_lag_seconds,
+            'max_lag_seconds': self.max_lag_seconds
+        }
+
+    def shutdown(self):
+        self.stop_event.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+harvey_refresh_scheduler = HarveyRefreshScheduler(
+    max_workers=settings.HARVEY_REFRESH_WORKERS,
+    interval_seconds=settings.HARVEY_REFRESH_INTERVAL_SECONDS,
+    batch_size=settings.HARVEY_REFRESH_BATCH_SIZE,
+    max_age_hours=settings.HARVEY_REFRESH_MAX_AGE_HOURS,
+    claim_timeout_seconds=settings.HARVEY_REFRESH_CLAIM_TIMEOUT_SECONDS
+)
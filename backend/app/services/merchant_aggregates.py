@@ -0,0 +1,193 @@
+from typing import Dict, Iterable, List
+import pandas as pd
+from sqlalchemy.orm import Session
+from app.models import MerchantAggregate, Transaction
+from app.ml.preprocess import normalize_transactions
+from app.services.bulk_insert import insert_missing
+from app.services.merchant_clusters import assign_merchant_keys
+
+# Merchants per IN (...) lookup
+LOOKUP_BATCH_SIZE = 500
+
+AGGREGATE_FIELDS = [
+    "txn_count", "amount_sum", "amount_sum_sq", "first_date", "last_date",
+    "last_amount", "last_bank_account", "interval_count", "interval_sum", "interval_sum_sq",
+]
+
+
+def summarize_transactions(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-merchant totals for a normalized, date-sorted frame, indexed by merchant."""
+    df = df.copy()
+    if 'bank_account' not in df.columns:
+        df['bank_account'] = 'Unknown'
+    df['amount_abs'] = df['amount'].abs()
+    df['amount_sq'] = df['amount_abs'] ** 2
+
+    # Whole-day gaps to the merchant's previous transaction; same-day repeats don't count
+    gaps = df.groupby('merchant')['date'].diff().dt.days
+    df['gap'] = gaps.where(gaps > 0)
+    df['gap_sq'] = df['gap'] ** 2
+
+    return df.groupby('merchant').agg(
+        txn_count=('amount_abs', 'size'),
+        amount_sum=('amount_abs', 'sum'),
+        amount_sum_sq=('amount_sq', 'sum'),
+        first_date=('date', 'min'),
+        last_date=('date', 'max'),
+        last_amount=('amount_abs', 'last'),
+        last_bank_account=('bank_account', 'last'),
+        interval_count=('gap', 'count'),
+        interval_sum=('gap', 'sum'),
+        interval_sum_sq=('gap_sq', 'sum'),
+    )
+
+
+def _row_values(row) -> Dict:
+    values = {field: row[field] for field in AGGREGATE_FIELDS}
+    values['first_date'] = values['first_date'].to_pydatetime()
+    values['last_date'] = values['last_date'].to_pydatetime()
+    for field in ('txn_count', 'interval_count'):
+        values[field] = int(values[field])
+    for field in ('amount_sum', 'amount_sum_sq', 'last_amount', 'interval_sum', 'interval_sum_sq'):
+        values[field] = float(values[field])
+    return values
+
+
+def get_merchant_aggregates(db: Session, user_id: int, merchants: Iterable[str], lock: bool = False) -> Dict[str, MerchantAggregate]:
+    """
+    Load the user's aggregates for the given merchants, batching the IN
+    lookups. With `lock`, rows are locked until commit (SELECT ... FOR UPDATE,
+    in merchant order so concurrent lockers can't deadlock; SQLite ignores it).
+    """
+    merchants = sorted(merchants) if lock else list(merchants)
+    aggregates = {}
+    for start in range(0, len(merchants), LOOKUP_BATCH_SIZE):
+        query = db.query(MerchantAggregate).filter(
+            MerchantAggregate.user_id == user_id,
+            MerchantAggregate.merchant.in_(merchants[start:start + LOOKUP_BATCH_SIZE])
+        )
+        if lock:
+            query = query.order_by(MerchantAggregate.merchant).with_for_update()
+        aggregates.update((agg.merchant, agg) for agg in query.all())
+    return aggregates
+
+
+def get_merchant_transactions(db: Session, user_id: int, merchant_keys: Iterable[str]) -> List[Dict]:
+    """
+    The user's transactions for the given merchant keys, as dicts for the ML
+    functions (index scans on user_id, merchant_key; batched IN lookups).
+    """
+    merchant_keys = sorted(set(merchant_keys))
+    transactions = []
+    for start in range(0, len(merchant_keys), LOOKUP_BATCH_SIZE):
+        rows = db.query(
+            Transaction.id, Transaction.date, Transaction.amount, Transaction.description,
+            Transaction.bank_account, Transaction.merchant_key
+        ).filter(
+            Transaction.user_id == user_id,
+            Transaction.merchant_key.in_(merchant_keys[start:start + LOOKUP_BATCH_SIZE])
+        ).order_by(Transaction.date, Transaction.id).all()
+        transactions.extend(row._asdict() for row in rows)
+    return transactions
+
+
+def _recompute(db: Session, user_id: int, merchants: set, aggregates: Dict[str, MerchantAggregate]) -> None:
+    """Rebuild aggregates from the stored transactions of the given merchants."""
+    history = get_merchant_transactions(db, user_id, merchants)
+    summary = summarize_transactions(normalize_transactions(history)) if history else pd.DataFrame()
+    for merchant in merchants:
+        if merchant not in summary.index:
+            continue
+        for field, value in _row_values(summary.loc[merchant]).items():
+            setattr(aggregates[merchant], field, value)
+
+
+def update_merchant_aggregates(db: Session, user_id: int, transactions: List[Dict]) -> List[str]:
+    """
+    Fold newly inserted transactions into the user's per-merchant aggregates.
+    Only the merchants in `transactions` are read or written. Rows newer than
+    a merchant's last_date are merged in place; rows dated before it (an
+    older statement uploaded late) trigger a rebuild of that merchant from
+    its stored transactions, since the gap statistics depend on order.
+    Transactions must already be stored with their merchant_key (see
+    assign_merchant_keys). Concurrent jobs for the same user merge into the
+    same rows one after another: existing rows are locked, and a row another
+    job created since the lookup is merged into rather than inserted again.
+    Does not commit; returns the touched merchant names.
+    """
+    if not transactions:
+        return []
+
+    summary = summarize_transactions(normalize_transactions(transactions))
+    # Plain dicts: building a Series per merchant row dominated the merge loop
+    chunk_values = {merchant: _row_values(row) for merchant, row in summary.to_dict('index').items()}
+    aggregates = get_merchant_aggregates(db, user_id, chunk_values, lock=True)
+    missing = [merchant for merchant in chunk_values if merchant not in aggregates]
+    inserted = {merchant for _, merchant in insert_missing(
+        db,
+        MerchantAggregate.__table__,
+        [dict(user_id=user_id, merchant=merchant, **chunk_values[merchant]) for merchant in missing],
+        ["user_id", "merchant"]
+    )}
+    if len(inserted) < len(missing):
+        aggregates.update(get_merchant_aggregates(
+            db, user_id, [merchant for merchant in missing if merchant not in inserted], lock=True
+        ))
+    out_of_order = set()
+
+    for merchant, values in chunk_values.items():
+        if merchant in inserted:
+            continue
+        aggregate = aggregates[merchant]
+        if values['first_date'] < aggregate.last_date:
+            out_of_order.add(merchant)
+            continue
+
+        gap = (values['first_date'] - aggregate.last_date).days
+        if gap > 0:
+            aggregate.interval_count += 1
+            aggregate.interval_sum += gap
+            aggregate.interval_sum_sq += gap ** 2
+        aggregate.txn_count += values['txn_count']
+        aggregate.amount_sum += values['amount_sum']
+        aggregate.amount_sum_sq += values['amount_sum_sq']
+        aggregate.interval_count += values['interval_count']
+        aggregate.interval_sum += values['interval_sum']
+        aggregate.interval_sum_sq += values['interval_sum_sq']
+        aggregate.last_date = values['last_date']
+        aggregate.last_amount = values['last_amount']
+        aggregate.last_bank_account = values['last_bank_account']
+
+    if out_of_order:
+        db.flush()
+        _recompute(db, user_id, out_of_order, aggregates)
+        print(f"Rebuilt aggregates for {len(out_of_order)} merchants with back-dated transactions")
+
+    return summary.index.tolist()
+
+
+def rebuild_merchant_aggregates(db: Session, user_id: int) -> int:
+    """Recompute all of a user's aggregates from their transactions. Does not commit."""
+    db.query(MerchantAggregate).filter(MerchantAggregate.user_id == user_id).delete()
+    rows = db.query(
+        Transaction.date, Transaction.amount, Transaction.description,
+        Transaction.bank_account, Transaction.merchant_key
+    ).filter(Transaction.user_id == user_id).all()
+    if not rows:
+        return 0
+
+    # Rows not backfilled yet are keyed on the fly (see scripts/backfill_merchant_keys.py)
+    history = [row._asdict() for row in rows]
+    assign_merchant_keys(db, user_id, history)
+    summary = summarize_transactions(normalize_transactions(history))
+    db.add_all(
+        MerchantAggregate(user_id=user_id, merchant=merchant, **_row_values(row))
+        for merchant, row in summary.iterrows()
+    )
+    return len(summary)
+
+
+def aggregate_to_dict(aggregate: MerchantAggregate) -> Dict:
+    values = {field: getattr(aggregate, field) for field in AGGREGATE_FIELDS}
+    values['merchant'] = aggregate.merchant
+    return values
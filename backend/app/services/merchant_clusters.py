@@ -0,0 +1,103 @@
+from typing import Dict, List
+import pandas as pd
+from sqlalchemy.orm import Session
+from app.models import MerchantCluster
+from app.services.bulk_insert import insert_missing
+from app.ml.cluster import blocking_key, cluster_merchants
+from app.ml.preprocess import clean_merchant_names
+try:
+    from config import settings
+except ImportError:
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+    from config import settings
+
+# Names/blocks per IN (...) lookup
+LOOKUP_BATCH_SIZE = 500
+
+
+def _in_batches(db: Session, user_id: int, column, values: list):
+    # Plain rows rather than entities: every chunk of an upload reloads whole blocks
+    for start in range(0, len(values), LOOKUP_BATCH_SIZE):
+        yield from db.query(
+            MerchantCluster.merchant, MerchantCluster.cluster, MerchantCluster.typical_amount
+        ).filter(
+            MerchantCluster.user_id == user_id,
+            column.in_(values[start:start + LOOKUP_BATCH_SIZE])
+        )
+
+
+def assign_merchant_clusters(db: Session, user_id: int, merchant_amounts: Dict[str, float]) -> Dict[str, str]:
+    """
+    Map cleaned merchant names to their cluster label. Names seen before keep
+    their cached cluster; new names are placed against the user's cached names
+    in the same blocks only, and the result is cached. A name another job
+    cached meanwhile keeps that job's cluster. Does not commit.
+    """
+    if not settings.MERCHANT_CLUSTERING:
+        return {name: name for name in merchant_amounts}
+
+    names = list(merchant_amounts)
+    clusters = {row.merchant: row.cluster for row in _in_batches(db, user_id, MerchantCluster.merchant, names)}
+    new_names = [name for name in names if name not in clusters]
+    if not new_names:
+        return clusters
+
+    blocks = sorted({blocking_key(name) for name in new_names})
+    known = {
+        row.merchant: (row.cluster, row.typical_amount)
+        for row in _in_batches(db, user_id, MerchantCluster.block, blocks)
+    }
+    placed = cluster_merchants(new_names, [merchant_amounts[name] for name in new_names], known)
+
+    inserted = {name for _, name in insert_missing(
+        db,
+        MerchantCluster.__table__,
+        [
+            {
+                'user_id': user_id,
+                'merchant': name,
+                'cluster': cluster,
+                'block': blocking_key(name),
+                'typical_amount': float(merchant_amounts[name])
+            }
+            for name, cluster in placed.items()
+        ],
+        ['user_id', 'merchant']
+    )}
+    clusters.update(placed)
+    if len(inserted) < len(placed):
+        # Another job for this user cached these names meanwhile; its clusters stand
+        taken = [name for name in placed if name not in inserted]
+        clusters.update((row.merchant, row.cluster) for row in _in_batches(db, user_id, MerchantCluster.merchant, taken))
+    return clusters
+
+
+def get_merchant_clusters(db: Session, user_id: int) -> Dict[str, str]:
+    """All of a user's cached {cleaned merchant name: cluster label}."""
+    if not settings.MERCHANT_CLUSTERING:
+        return {}
+    rows = db.query(MerchantCluster.merchant, MerchantCluster.cluster).filter(
+        MerchantCluster.user_id == user_id
+    ).all()
+    return dict(rows)
+
+
+def assign_merchant_keys(db: Session, user_id: int, transactions: List[Dict]) -> None:
+    """
+    Set 'merchant_key' (cleaned name mapped to its cluster label) on every
+    transaction dict that doesn't have one yet. Does not commit.
+    """
+    unkeyed = [txn for txn in transactions if not txn.get('merchant_key')]
+    if not unkeyed:
+        return
+
+    frame = pd.DataFrame({
+        'merchant': clean_merchant_names(pd.Series([txn['description'] for txn in unkeyed], dtype=object)),
+        'amount': pd.to_numeric(pd.Series([txn['amount'] for txn in unkeyed]), errors='coerce').abs(),
+    })
+    typical_amounts = frame.groupby('merchant')['amount'].median()
+    clusters = assign_merchant_clusters(db, user_id, typical_amounts.to_dict())
+    for txn, merchant in zip(unkeyed, frame['merchant']):
+        txn['merchant_key'] = clusters.get(merchant, merchant)
@@ -0,0 +1,64 @@
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import AIRecommendation, User
+from app.services.harvey import HarveySnapshot
+
+
+def _stored_recommendations(db: Session, user_id: int) -> List[AIRecommendation]:
+    return db.query(AIRecommendation).filter(
+        AIRecommendation.user_id == user_id
+    ).order_by(AIRecommendation.id).all()
+
+
+def materialize_recommendations(db: Session, user: User, snapshot: Optional[HarveySnapshot] = None) -> List[AIRecommendation]:
+    """
+    Regenerate a user's recommendations (from `snapshot` when the caller
+    already has one) and upsert them: one row per (subscription, kind) is
+    updated in place or inserted, and rows Harvey no longer suggests are
+    deleted. created_at only moves when the text or risk changes. Commits;
+    returns the stored rows.
+    """
+    version = user.data_version
+    recommendations = (snapshot or HarveySnapshot(db, user.id)).recommendations()
+    existing = {(row.subscription_id, row.kind): row for row in _stored_recommendations(db, user.id)}
+
+    now = datetime.now()
+    for rec in recommendations:
+        row = existing.pop((rec['subscription_id'], rec['kind']), None)
+        if row is None:
+            db.add(AIRecommendation(
+                user_id=user.id,
+                subscription_id=rec['subscription_id'],
+                kind=rec['kind'],
+                recommendation_text=rec['recommendation_text'],
+                risk_score=rec['risk_score'],
+                created_at=now
+            ))
+        elif row.recommendation_text != rec['recommendation_text'] or row.risk_score != rec['risk_score']:
+            row.recommendation_text = rec['recommendation_text']
+            row.risk_score = rec['risk_score']
+            row.created_at = now
+    # Also clears rows stored before recommendations had a kind
+    for row in existing.values():
+        db.delete(row)
+
+    # The version read before generating: a bump meanwhile makes the next read regenerate again
+    user.recommendations_version = version
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another request materialized the same version first
+        db.rollback()
+    return _stored_recommendations(db, user.id)
+
+
+def get_user_recommendations(db: Session, user: User, snapshot: Optional[HarveySnapshot] = None) -> List[AIRecommendation]:
+    """
+    The user's stored recommendations, regenerated only when their
+    subscriptions or transactions changed since (see User.data_version).
+    """
+    if user.recommendations_version == user.data_version:
+        return _stored_recommendations(db, user.id)
+    return materialize_recommendations(db, user, snapshot)
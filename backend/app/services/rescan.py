@@ -0,0 +1,250 @@
+import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.models import Subscription, SubscriptionStatus, Transaction, User
+from app.ml.detect import detect_from_frame
+from app.ml.preprocess import normalize_transactions
+from app.services.harvey_cache import bump_data_version
+try:
+    from config import settings
+except ImportError:
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+    from config import settings
+
+# Columns loaded per transaction; raw_text and the other wide columns are never read
+TRANSACTION_COLUMNS = ["date", "amount", "description", "bank_account", "merchant_key"]
+
+# An active subscription with no charge for this many of its cycles is marked cancelled
+LAPSE_CYCLES = 2
+
+# Fields compared against the stored subscription; others are left as they are
+UPDATED_FIELDS = [
+    "amount", "frequency", "period_days", "period_confidence", "first_seen", "last_seen",
+    "next_renewal", "bank_account", "merchant_key",
+]
+
+
+def detect_user_subscriptions(args: Tuple[int, Dict[str, list]]) -> Tuple[int, List[Dict]]:
+    """
+    Process-pool task: full detection for one user from column lists
+    ({column: [values]}, cheaper to pickle than one dict per row).
+    """
+    user_id, columns = args
+    if not columns['date']:
+        return user_id, []
+    df = normalize_transactions(columns)
+    return user_id, detect_from_frame(df, user_id)
+
+
+def _load_chunk(db: Session, user_ids: List[int]) -> List[Tuple[int, Dict[str, list]]]:
+    """Transactions of a chunk of users, in one lean column-only query."""
+    columns = {user_id: {column: [] for column in TRANSACTION_COLUMNS} for user_id in user_ids}
+    rows = db.query(
+        Transaction.user_id, *(getattr(Transaction, column) for column in TRANSACTION_COLUMNS)
+    ).filter(Transaction.user_id.in_(user_ids)).yield_per(settings.RESCAN_FETCH_SIZE)
+    for user_id, *values in rows:
+        user_columns = columns[user_id]
+        for column, value in zip(TRANSACTION_COLUMNS, values):
+            user_columns[column].append(value)
+    return [(user_id, columns[user_id]) for user_id in user_ids]
+
+
+def _roll_forward(subscription: Dict, now: datetime) -> Optional[Dict]:
+    """
+    Status or renewal-date changes for an active subscription as of `now`:
+    cancelled after LAPSE_CYCLES missed charges, otherwise next_renewal is
+    moved past any single missed cycle. Returns the changed fields, if any.
+    """
+    period = subscription['next_renewal'] - subscription['last_seen']
+    if period <= timedelta(0):
+        period = timedelta(days=30)
+    if subscription['last_seen'] + LAPSE_CYCLES * period < now:
+        return {'status': SubscriptionStatus.CANCELLED}
+    if subscription['next_renewal'] < now:
+        # A cycle was missed but not enough to call it lapsed: project the next one
+        missed = (now - subscription['next_renewal']) // period + 1
+        return {'next_renewal': subscription['next_renewal'] + missed * period}
+    return None
+
+
+def _subscription_values(sub_data: Dict) -> Dict:
+    """A detected subscription's stored fields, as plain Python values."""
+    values = {
+        field: value.to_pydatetime() if hasattr(value, 'to_pydatetime') else value
+        for field, value in sub_data.items()
+    }
+    values['amount'] = round(values['amount'], 2)
+    return values
+
+
+def plan_changes(existing: List[Dict], detected: List[Dict], now: datetime) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Compare one user's stored subscriptions with a fresh detection.
+    Returns (update mappings with 'id', insert mappings).
+    """
+    active = {}
+    cancelled = defaultdict(list)
+    for subscription in existing:
+        if subscription['status'] == SubscriptionStatus.ACTIVE:
+            active.setdefault(subscription['name'], subscription)
+        else:
+            cancelled[subscription['name']].append(subscription)
+
+    updates = []
+    inserts = []
+    for sub_data in map(_subscription_values, detected):
+        stored = active.pop(sub_data['name'], None)
+        if stored is None:
+            # Don't bring back a subscription the user cancelled unless it was charged again since
+            if not any(sub['last_seen'] >= sub_data['last_seen'] for sub in cancelled[sub_data['name']]):
+                # Aged like stored ones: a merchant that stopped charging long ago goes in
+                # cancelled, and next_renewal is moved past missed cycles
+                sub_data.update(_roll_forward(sub_data, now) or {})
+                inserts.append(sub_data)
+            continue
+
+        values = {field: sub_data[field] for field in UPDATED_FIELDS}
+        values['first_seen'] = min(stored['first_seen'], values['first_seen'])
+        values.update(_roll_forward({**stored, **values}, now) or {})
+        changed = {
+            field: value for field, value in values.items()
+            if (abs(stored['amount'] - value) >= 0.005 if field == 'amount' else stored.get(field) != value)
+        }
+        if changed:
+            updates.append({'id': stored['id'], **changed})
+
+    # Subscriptions no longer detected (e.g. the price became irregular) only age
+    for stored in active.values():
+        changed = _roll_forward(stored, now)
+        if changed:
+            updates.append({'id': stored['id'], **changed})
+
+    return updates, inserts
+
+
+def _stored_subscriptions(db: Session, user_ids: List[int]) -> Dict[int, List[Dict]]:
+    stored = defaultdict(list)
+    for row in db.query(
+        Subscription.id, Subscription.user_id, Subscription.name, Subscription.status,
+        *(getattr(Subscription, field) for field in UPDATED_FIELDS)
+    ).filter(Subscription.user_id.in_(user_ids)):
+        stored[row.user_id].append(row._asdict())
+    return stored
+
+
+def write_changes(db: Session, user_ids: List[int], detected: Dict[int, List[Dict]], now: datetime) -> Dict[str, int]:
+    """Bulk-apply a chunk's detections. Does not commit; returns change counts."""
+    stored = _stored_subscriptions(db, user_ids)
+    updates = []
+    inserts = []
+    changed_users = []
+    for user_id in user_ids:
+        user_updates, user_inserts = plan_changes(stored[user_id], detected.get(user_id, []), now)
+        updates.extend(user_updates)
+        inserts.extend(user_inserts)
+        if user_updates or user_inserts:
+            changed_users.append(user_id)
+
+    if updates:
+        db.bulk_update_mappings(Subscription, updates)
+    if inserts:
+        db.bulk_insert_mappings(Subscription, inserts)
+    if changed_users:
+        bump_data_version(db, *changed_users)
+    return {
+        'updated': len(updates),
+        'inserted': len(inserts),
+        'lapsed': sum(1 for mapping in updates + inserts if mapping.get('status') == SubscriptionStatus.CANCELLED),
+    }
+
+
+class RescanCheckpoint:
+    """Progress of a rescan, written after every committed chunk so a run can resume."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state = {'started_at': datetime.now().isoformat(), 'last_user_id': 0, 'users_done': 0,
+                      'updated': 0, 'inserted': 0, 'lapsed': 0}
+
+    def load(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            self.state.update(json.load(f))
+        return True
+
+    def save(self):
+        # Write-then-rename, so an interrupted save never leaves a truncated checkpoint
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def rescan_subscriptions(
+    db: Session,
+    checkpoint: RescanCheckpoint,
+    chunk_size: int = None,
+    workers: int = None,
+    now: datetime = None,
+) -> Dict:
+    """
+    Re-run detection for every user after checkpoint['last_user_id'], one
+    chunk of users at a time: a lean transaction query per chunk, detection
+    across a process pool, then one bulk write-back and commit per chunk.
+    """
+    chunk_size = chunk_size or settings.RESCAN_USER_CHUNK
+    workers = workers or settings.RESCAN_WORKERS
+    now = now or datetime.now()
+    state = checkpoint.state
+
+    remaining = db.query(User.id).filter(User.id > state['last_user_id']).count()
+    total = state['users_done'] + remaining
+    started = time.perf_counter()
+    scanned = 0
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        while True:
+            user_ids = [
+                user_id for (user_id,) in db.query(User.id)
+                .filter(User.id > state['last_user_id'])
+                .order_by(User.id)
+                .limit(chunk_size)
+            ]
+            if not user_ids:
+                break
+
+            tasks = _load_chunk(db, user_ids)
+            detected = dict(pool.map(detect_user_subscriptions, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+            counts = write_changes(db, user_ids, detected, now)
+            db.commit()
+
+            state['last_user_id'] = user_ids[-1]
+            state['users_done'] += len(user_ids)
+            for key, value in counts.items():
+                state[key] += value
+            checkpoint.save()
+
+            scanned += len(user_ids)
+            elapsed = time.perf_counter() - started
+            rate = scanned / elapsed if elapsed else 0.0
+            eta = (total - state['users_done']) / rate if rate else 0.0
+            print(
+                f"[{state['users_done']}/{total}] users up to {state['last_user_id']}: "
+                f"{counts['updated']} updated, {counts['inserted']} new, {counts['lapsed']} lapsed "
+                f"({rate:.1f} users/s, ETA {eta:.0f}s)"
+            )
+
+    return state
@@ -0,0 +1,530 @@
+import hashlib
+import multiprocessing
+import os
+import shutil
+import traceback
+import uuid
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import MerchantAggregate, User, Subscription, StatementUpload, UploadJob
+from app.services.csv_parser import encode_raw_row, iter_csv_chunks, iter_excel_chunks, parse_statement_file
+from app.services.bulk_insert import bulk_insert_transactions
+from app.services.fingerprint import LOOKUP_BATCH_SIZE, assign_fingerprints, filter_new_transactions
+from app.services.notifications import notification_service
+from app.services.merchant_aggregates import aggregate_to_dict, get_merchant_aggregates, get_merchant_transactions, update_merchant_aggregates
+from app.services.merchant_clusters import assign_merchant_keys
+from app.services.harvey_cache import bump_data_version
+from app.services.harvey_insights import harvey_refresh_scheduler
+from app.ml.detect import detect_recurring_subscriptions, detect_subscriptions_from_aggregates
+try:
+    from config import settings
+except ImportError:
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+    from config import settings
+
+STATEMENT_EXTENSIONS = ("csv", "xlsx", "xls")
+
+
+def create_upload_job(db: Session, user: User, filename: str, file_ext: str, stream: BinaryIO, content_hash: str) -> UploadJob:
+    """Copy the uploaded file to UPLOAD_DIR and record a queued job for it."""
+    job_id = uuid.uuid4().hex
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    file_path = os.path.join(settings.UPLOAD_DIR, f"{job_id}.{file_ext}")
+
+    stream.seek(0)
+    with open(file_path, "wb") as out:
+        for block in iter(lambda: stream.read(1024 * 1024), b""):
+            out.write(block)
+
+    job = UploadJob(
+        id=job_id,
+        user_id=user.id,
+        filename=filename,
+        file_path=file_path,
+        content_hash=content_hash,
+        status="queued",
+        stage="queued"
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def _store_file(stream: BinaryIO, directory: str, filename: str, max_bytes: int) -> Tuple[str, str]:
+    """Copy a stream into `directory`, hashing it on the way. Returns (path, content_hash)."""
+    digest = hashlib.sha256()
+    temp_path = os.path.join(directory, f".{uuid.uuid4().hex}")
+    written = 0
+    with open(temp_path, "wb") as out:
+        for block in iter(lambda: stream.read(1024 * 1024), b""):
+            written += len(block)
+            # Also bounds zip members whose header understates their size
+            if written > max_bytes:
+                raise ValueError(f"{filename}: statements can be at most {settings.BATCH_MAX_FILE_MB}MB")
+            digest.update(block)
+            out.write(block)
+    content_hash = digest.hexdigest()
+    # Stored as <hash>_<original name> so the worker can record both
+    path = os.path.join(directory, f"{content_hash}_{filename}")
+    os.replace(temp_path, path)
+    return path, content_hash
+
+
+def _statement_members(archive: zipfile.ZipFile) -> Iterator[Tuple[str, zipfile.ZipInfo]]:
+    """(base name, member) for each statement in a zip archive."""
+    for member in archive.infolist():
+        # Only the base name is used, so member paths can't escape the job dir
+        name = os.path.basename(member.filename)
+        member_ext = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+        if not member.is_dir() and member_ext in STATEMENT_EXTENSIONS:
+            yield name, member
+
+
+def _check_batch_limits(files: List[Tuple[str, BinaryIO]]):
+    """
+    Reject a batch with too many statements or too much (uncompressed) data
+    before anything is extracted or stored, using the sizes in zip headers.
+    """
+    max_file_bytes = settings.BATCH_MAX_FILE_MB * 1024 * 1024
+    count = 0
+    total_bytes = 0
+    for filename, stream in files:
+        file_ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        if file_ext == 'zip':
+            stream.seek(0)
+            with zipfile.ZipFile(stream) as archive:
+                sizes = [(name, member.file_size) for name, member in _statement_members(archive)]
+        elif file_ext in STATEMENT_EXTENSIONS:
+            sizes = [(filename, stream.seek(0, os.SEEK_END))]
+        else:
+            continue
+        for name, size in sizes:
+            count += 1
+            total_bytes += size
+            if count > settings.BATCH_MAX_FILES:
+                raise ValueError(f"A batch can contain at most {settings.BATCH_MAX_FILES} statements")
+            if size > max_file_bytes:
+                raise ValueError(f"{name}: statements can be at most {settings.BATCH_MAX_FILE_MB}MB")
+            if total_bytes > settings.BATCH_MAX_TOTAL_MB * 1024 * 1024:
+                raise ValueError(f"A batch can contain at most {settings.BATCH_MAX_TOTAL_MB}MB of statements")
+
+
+def _iter_statement_files(files: List[Tuple[str, BinaryIO]]) -> Iterator[Tuple[str, BinaryIO]]:
+    """Yield (filename, stream) for each statement, expanding zip archives."""
+    for filename, stream in files:
+        file_ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        if file_ext == 'zip':
+            stream.seek(0)
+            with zipfile.ZipFile(stream) as archive:
+                for name, member in _statement_members(archive):
+                    with archive.open(member) as member_stream:
+                        yield name, member_stream
+        elif file_ext in STATEMENT_EXTENSIONS:
+            stream.seek(0)
+            yield os.path.basename(filename), stream
+        else:
+            raise ValueError(f"{filename}: file must be a CSV, Excel or zip file (.csv, .xlsx, .xls, .zip)")
+
+
+def create_batch_upload_job(db: Session, user: User, files: List[Tuple[str, BinaryIO]]) -> UploadJob:
+    """
+    Store several statements (zip archives are expanded) in one job directory
+    and record a queued batch job. Statements uploaded before, or repeated
+    within the batch, are dropped up front.
+    """
+    _check_batch_limits(files)
+    job_id = uuid.uuid4().hex
+    job_dir = os.path.join(settings.UPLOAD_DIR, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+
+    stored = {}
+    try:
+        for filename, stream in _iter_statement_files(files):
+            path, content_hash = _store_file(stream, job_dir, filename, settings.BATCH_MAX_FILE_MB * 1024 * 1024)
+            if content_hash in stored:
+                os.remove(path)
+                continue
+            stored[content_hash] = path
+        if not stored:
+            raise ValueError("No CSV or Excel statements found in the upload")
+    except Exception:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+
+    # Skip whole-file re-uploads before doing any parsing
+    previous_uploads = db.query(StatementUpload).filter(
+        StatementUpload.user_id == user.id,
+        StatementUpload.content_hash.in_(list(stored))
+    ).all()
+    for previous_upload in previous_uploads:
+        os.remove(stored.pop(previous_upload.content_hash))
+
+    job = UploadJob(
+        id=job_id,
+        user_id=user.id,
+        kind="batch",
+        filename=", ".join(sorted(os.path.basename(path).split("_", 1)[1] for path in stored.values())),
+        file_path=job_dir,
+        content_hash=hashlib.sha256("".join(sorted(stored)).encode("utf-8")).hexdigest(),
+        status="queued",
+        stage="queued",
+        duplicates_skipped=sum(
+            previous_upload.transactions_added + previous_upload.duplicates_skipped
+            for previous_upload in previous_uploads
+        )
+    )
+    if not stored:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        job.filename = ", ".join(previous_upload.filename for previous_upload in previous_uploads)
+        job.status = "completed"
+        job.stage = "done"
+        job.progress = 1.0
+        job.message = "Statements already uploaded"
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def _set_stage(db: Session, job: UploadJob, stage: str, progress: float = 0.0):
+    job.stage = stage
+    job.progress = progress
+    job.updated_at = datetime.now()
+    db.commit()
+
+
+def _import_statement(db: Session, job: UploadJob, user: User, touched_merchants: set):
+    """
+    Parse and persist the stored file chunk by chunk, committing each chunk
+    together with its merchant aggregates and the job's progress. Adds the
+    merchants the new rows touched to `touched_merchants` as it goes, so
+    they are known even if a later chunk fails.
+    """
+    file_ext = job.file_path.rsplit('.', 1)[-1]
+    file_size = os.path.getsize(job.file_path) or 1
+    occurrences = Counter()
+
+    # Created up front so inserted rows can reference its header
+    upload = StatementUpload(user_id=user.id, filename=job.filename)
+    db.add(upload)
+    db.flush()
+
+    def record_header(names):
+        upload.header = encode_raw_row(names)
+
+    with open(job.file_path, "rb") as stream:
+        if file_ext == 'csv':
+            chunks = iter_csv_chunks(stream, chunksize=settings.UPLOAD_CHUNK_SIZE, on_header=record_header)
+        else:
+            chunks = iter_excel_chunks(
+                stream, file_ext, chunksize=settings.UPLOAD_CHUNK_SIZE, on_header=record_header
+            )
+
+        for chunk in chunks:
+            # Skip rows already imported from overlapping statements
+            assign_fingerprints(user.id, chunk, occurrences)
+            new_rows, skipped = filter_new_transactions(db, chunk)
+            for txn_data in new_rows:
+                txn_data['upload_id'] = upload.id
+            assign_merchant_keys(db, user.id, new_rows)
+
+            report = bulk_insert_transactions(
+                db, user.id, new_rows, batch_size=settings.BULK_INSERT_BATCH_SIZE
+            )
+            # Rows an overlapping upload stored since the lookup are duplicates too
+            new_rows = report['inserted']
+            job.insert_batches += len(report['batches'])
+            job.transactions_added += len(new_rows)
+            job.duplicates_skipped += skipped + report['skipped']
+            job.rows_processed += len(chunk)
+            touched_merchants.update(update_merchant_aggregates(db, user.id, new_rows))
+            # Commit the chunk with the job's progress; a retried upload
+            # skips already-committed rows by fingerprint
+            _set_stage(db, job, "importing", min(1.0, stream.tell() / file_size))
+
+    upload.content_hash = job.content_hash
+    upload.transactions_added = job.transactions_added
+    upload.duplicates_skipped = job.duplicates_skipped
+    # A resumed job goes straight to detection once the whole file is committed
+    _set_stage(db, job, "detecting")
+    print(f"Job {job.id}: added {job.transactions_added} transactions, skipped {job.duplicates_skipped} duplicates")
+
+
+def _import_batch(db: Session, job: UploadJob, user: User, touched_merchants: set):
+    """
+    Parse every statement of a batch job in parallel worker processes, then
+    persist the merged, de-duplicated rows in one bulk insert. Adds the
+    merchants the new rows touched to `touched_merchants`.
+    """
+    paths = sorted(os.path.join(job.file_path, name) for name in os.listdir(job.file_path))
+    parsed = {}
+
+    # Parsing is CPU-bound pandas work, so use processes rather than threads
+    workers = max(1, min(len(paths), settings.BATCH_PARSE_WORKERS))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {
+            pool.submit(parse_statement_file, path, settings.UPLOAD_CHUNK_SIZE): path
+            for path in paths
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            try:
+                parsed[path] = future.result()
+            except Exception as e:
+                raise ValueError(f"{os.path.basename(path).split('_', 1)[1]}: {e}")
+            # Parsing is the first half of the import stage
+            _set_stage(db, job, "importing", 0.5 * done / len(paths))
+
+    # Merge in a stable order; rows repeated across overlapping statements are kept once
+    seen = set()
+    statements = []
+    transactions = []
+    for path in paths:
+        content_hash, filename = os.path.basename(path).split("_", 1)
+        header, rows = parsed[path]
+        upload = StatementUpload(
+            user_id=user.id,
+            filename=filename,
+            content_hash=content_hash,
+            header=encode_raw_row(header)
+        )
+        db.add(upload)
+        db.flush()
+        assign_fingerprints(user.id, rows, Counter())
+        unique_rows = [txn for txn in rows if txn['fingerprint'] not in seen]
+        seen.update(txn['fingerprint'] for txn in unique_rows)
+        for txn_data in unique_rows:
+            txn_data['upload_id'] = upload.id
+        statements.append((upload, rows))
+        transactions.extend(unique_rows)
+
+    new_rows, _ = filter_new_transactions(db, transactions)
+    assign_merchant_keys(db, user.id, new_rows)
+    report = bulk_insert_transactions(
+        db, user.id, new_rows, batch_size=settings.BULK_INSERT_BATCH_SIZE
+    )
+    # Rows an overlapping upload stored since the lookup are duplicates too
+    new_rows = report['inserted']
+
+    new_fingerprints = {txn['fingerprint'] for txn in new_rows}
+    for upload, rows in statements:
+        added = sum(1 for txn in rows if txn['fingerprint'] in new_fingerprints)
+        new_fingerprints.difference_update(txn['fingerprint'] for txn in rows)
+        upload.transactions_added = added
+        upload.duplicates_skipped = len(rows) - added
+
+    touched_merchants.update(update_merchant_aggregates(db, user.id, new_rows))
+
+    job.insert_batches = len(report['batches'])
+    job.transactions_added = len(new_rows)
+    job.rows_processed = sum(len(rows) for _, rows in statements)
+    job.duplicates_skipped += job.rows_processed - len(new_rows)
+    # Committed together with the rows: a resumed job goes straight to detection
+    # rather than importing the statements (and counting their duplicates) again
+    _set_stage(db, job, "detecting")
+    print(f"Job {job.id}: added {job.transactions_added} transactions from {len(paths)} statements")
+
+
+def _save_subscriptions(db: Session, user: User, subscriptions: list) -> list:
+    """Insert new subscriptions and refresh existing ones. Returns the new ones."""
+    names = [sub_data['name'] for sub_data in subscriptions]
+    active = {}
+    for start in range(0, len(names), LOOKUP_BATCH_SIZE):
+        for subscription in db.query(Subscription).filter(
+            Subscription.user_id == user.id,
+            Subscription.name.in_(names[start:start + LOOKUP_BATCH_SIZE]),
+            Subscription.status == "active"
+        ):
+            active.setdefault(subscription.name, subscription)
+
+    new_subscriptions = []
+    for sub_data in subscriptions:
+        existing = active.get(sub_data['name'])
+
+        if not existing:
+            subscription = Subscription(**sub_data)
+            db.add(subscription)
+            active[sub_data['name']] = subscription
+            new_subscriptions.append(subscription)
+        else:
+            # Update existing subscription; aggregates cover the full history
+            existing.first_seen = min(existing.first_seen, sub_data['first_seen'])
+            existing.frequency = sub_data['frequency']
+            existing.period_days = sub_data['period_days']
+            existing.period_confidence = sub_data['period_confidence']
+            existing.last_seen = sub_data['last_seen']
+            existing.next_renewal = sub_data['next_renewal']
+            existing.amount = sub_data['amount']
+            existing.merchant_key = sub_data['merchant_key']
+    db.commit()
+    return new_subscriptions
+
+
+def _import_error(e: Exception) -> str:
+    """Parse errors (ValueError from the parsers) get the column hint; anything else is reported as it is."""
+    error_detail = str(e)
+    if not isinstance(e, ValueError):
+        return f"Import failed: {error_detail}"
+    # Provide more helpful error message
+    if "columns" not in error_detail.lower():
+        error_detail = f"Error parsing file: {error_detail}. Please check that your file has columns: date, amount, and description (or raw_descr)"
+    return error_detail
+
+
+def _detect(db: Session, job: UploadJob, user: User, merchants: Optional[Iterable[str]]) -> list:
+    """
+    Re-check the given merchants for subscriptions, or all of the user's when
+    None (a resumed job no longer knows which ones its rows touched).
+    Returns the new subscriptions.
+    """
+    _set_stage(db, job, "detecting")
+    if merchants is None:
+        merchants = [merchant for merchant, in db.query(MerchantAggregate.merchant).filter(
+            MerchantAggregate.user_id == user.id
+        )]
+    aggregates = get_merchant_aggregates(db, user.id, sorted(merchants))
+    candidates = detect_subscriptions_from_aggregates(
+        [aggregate_to_dict(aggregate) for aggregate in aggregates.values()], user.id
+    )
+    # Running totals can't tell a missed cycle from a longer one: the
+    # candidates' periods are estimated again from their charge history
+    history = get_merchant_transactions(db, user.id, [sub['merchant_key'] for sub in candidates])
+    subscriptions = detect_recurring_subscriptions(history, user.id)
+    new_subscriptions = _save_subscriptions(db, user, subscriptions)
+    job.subscriptions_detected = len(subscriptions)
+    job.new_subscriptions = len(new_subscriptions)
+    return new_subscriptions
+
+
+def _notify(db: Session, job: UploadJob, user: User, new_subscriptions: list) -> int:
+    """Send new-subscription alerts. Returns how many failed; they don't fail the job."""
+    _set_stage(db, job, "notifying")
+    failed = 0
+    for subscription in new_subscriptions:
+        try:
+            notification_service.send_new_subscription_alert(user, subscription)
+        except Exception as e:
+            failed += 1
+            print(f"Upload job {job.id}: alert for {subscription.name} failed: {e}")
+    return failed
+
+
+def _finish(db: Session, job: UploadJob, status: str, stage: str, message: str = None, error: str = None):
+    job.status = status
+    job.message = message
+    job.error = error
+    _set_stage(db, job, stage, 1.0 if status == "completed" else job.progress)
+    if job.transactions_added:
+        # Rows committed before a failure stay imported, so this holds either way
+        bump_data_version(db, job.user_id)
+        db.commit()
+        # Precompute Harvey's insights now rather than on the next dashboard load
+        harvey_refresh_scheduler.request_refresh(job.user_id)
+
+
+def run_upload_job(job_id: str):
+    """
+    Run import -> detect -> notify for one job in its own session. A job
+    whose rows are already committed (interrupted during detection, or
+    retried after detection failed) resumes at detection.
+    """
+    db = SessionLocal()
+    job = None
+    try:
+        job = db.query(UploadJob).filter(UploadJob.id == job_id).first()
+        if not job or job.status in ("completed", "failed"):
+            return
+        user = db.query(User).filter(User.id == job.user_id).first()
+        resume_detection = job.stage in ("detecting", "notifying")
+        job.status = "running"
+        job.error = None
+        touched_merchants = set()
+        import_error = None
+
+        if not resume_detection:
+            # Counters restart if a job interrupted by a restart is resumed
+            job.rows_processed = job.transactions_added = job.insert_batches = 0
+            if job.kind != "batch":
+                job.duplicates_skipped = 0
+            _set_stage(db, job, "importing")
+            try:
+                if job.kind == "batch":
+                    _import_batch(db, job, user, touched_merchants)
+                else:
+                    _import_statement(db, job, user, touched_merchants)
+            except Exception as e:
+                db.rollback()
+                print(f"Upload job {job_id} failed while importing: {e}")
+                traceback.print_exc()
+                import_error = _import_error(e)
+                if not job.transactions_added:
+                    _finish(db, job, "failed", "importing", error=import_error)
+                    return
+                # Chunks committed before the failure stay imported and still get detection
+
+        try:
+            # Only merchants with new rows can change, so only they are re-checked
+            new_subscriptions = _detect(db, job, user, None if resume_detection else touched_merchants)
+        except Exception as e:
+            db.rollback()
+            print(f"Upload job {job_id} failed while detecting subscriptions: {e}")
+            traceback.print_exc()
+            # The rows are committed: the job stays retryable from detection
+            # (POST /upload/jobs/{id}/retry) rather than asking for a re-upload
+            error = f"Subscription detection failed: {e}"
+            if import_error:
+                error = f"{import_error}. {error}"
+            _finish(db, job, "failed", "detecting", error=error)
+            return
+
+        failed_alerts = _notify(db, job, user, new_subscriptions)
+        if import_error:
+            _finish(db, job, "failed", "importing", error=import_error)
+        elif failed_alerts:
+            _finish(db, job, "completed", "done",
+                    message=f"Statement processed, but {failed_alerts} new-subscription alert(s) could not be sent")
+        else:
+            _finish(db, job, "completed", "done", message="Statement processed successfully")
+    finally:
+        if job and job.file_path:
+            if os.path.isdir(job.file_path):
+                shutil.rmtree(job.file_path, ignore_errors=True)
+            elif os.path.exists(job.file_path):
+                os.remove(job.file_path)
+        db.close()
+
+
+class UploadJobRunner:
+    """In-process worker pool for upload jobs; job state lives in the upload_jobs table."""
+
+    def __init__(self, max_workers: int):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload-job")
+
+    def submit(self, job_id: str):
+        self.executor.submit(run_upload_job, job_id)
+
+    def resume_pending(self):
+        """Re-enqueue jobs left queued or running by a previous process."""
+        db = SessionLocal()
+        try:
+            pending = db.query(UploadJob.id).filter(
+                UploadJob.status.in_(["queued", "running"])
+            ).all()
+        finally:
+            db.close()
+        for (job_id,) in pending:
+            self.submit(job_id)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+upload_job_runner = UploadJobRunner(max_workers=settings.UPLOAD_WORKERS)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Benchmark for persisting parsed transactions: per-row ORM objects vs bulk insert.
+Run this from the backend directory: python benchmarks/bench_bulk_insert.py [DATABASE_URL]
+Without an argument a throwaway SQLite file is used.
+"""
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import User, Transaction
+from app.services.bulk_insert import bulk_insert_transactions
+
+ROW_COUNTS = [1_000, 10_000, 100_000]
+
+
+def build_transactions(rows: int):
+    start = datetime(2023, 1, 1)
+    return [
+        {
+            "date": start + timedelta(hours=i),
+            "amount": -float(100 + i % 900),
+            "description": f"UPI PAYMENT MERCHANT {i % 500}",
+            "bank_account": "HDFC Savings",
+            "raw_text": f"{start + timedelta(hours=i):%Y-%m-%d},-{100 + i % 900},UPI PAYMENT MERCHANT {i % 500}",
+        }
+        for i in range(rows)
+    ]
+
+
+def orm_insert(db, user_id, transactions):
+    for txn_data in transactions:
+        db.add(Transaction(user_id=user_id, **txn_data))
+
+
+def bulk_insert(db, user_id, transactions):
+    bulk_insert_transactions(db, user_id, transactions)
+
+
+def run(session_factory, method, user_id, transactions):
+    db = session_factory()
+    try:
+        start = time.perf_counter()
+        method(db, user_id, transactions)
+        db.commit()
+        return time.perf_counter() - start
+    finally:
+        db.query(Transaction).filter(Transaction.user_id == user_id).delete()
+        db.commit()
+        db.close()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        url = sys.argv[1] if len(sys.argv) > 1 else f"sqlite:///{tmp}/bench.db"
+        engine = create_engine(url)
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+
+        db = session_factory()
+        user = User(name="Bench", email=f"bench-{time.time()}@example.com", phone="0", password_hash="x")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        db.close()
+
+        print(f"{'rows':>8} {'orm (s)':>9} {'bulk (s)':>9} {'speedup':>8}")
+        for rows in ROW_COUNTS:
+            transactions = build_transactions(rows)
+            orm_seconds = run(session_factory, orm_insert, user_id, transactions)
+            bulk_seconds = run(session_factory, bulk_insert, user_id, transactions)
+            print(f"{rows:>8} {orm_seconds:>9.3f} {bulk_seconds:>9.3f} {orm_seconds / bulk_seconds:>7.1f}x")
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Inference latency of the cancellation model for batches of 1-1000
+subscriptions: predict_proba alone, and score_subscriptions end to end
+(normalize, usage scores, features, predict) with the model and with the
+heuristic. Uses the artifact at CANCELLATION_MODEL_PATH if there is one,
+otherwise trains one on synthetic data first.
+Run this from the backend directory: python benchmarks/bench_cancellation_model.py [repeats]
+"""
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from config import settings
+from app.ml import cancellation
+from app.ml.cancellation import (
+    build_features, load_cancellation_model, synthetic_training_data, train_cancellation_model
+)
+from app.ml.detect import score_subscriptions
+from app.ml.preprocess import normalize_transactions
+
+BATCH_SIZES = [1, 10, 100, 1000]
+NOW = datetime(2025, 1, 1)
+
+
+def percentiles(method, repeats: int):
+    """p50/p99 wall time of `method` in milliseconds."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        method()
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    if not (os.path.exists(settings.CANCELLATION_MODEL_PATH) and load_cancellation_model(settings.CANCELLATION_MODEL_PATH)):
+        transactions, subscriptions, labels = synthetic_training_data(5000, seed=7, now=NOW)
+        scores = score_subscriptions(transactions, subscriptions, now=NOW)
+        features = build_features(
+            normalize_transactions(transactions), subscriptions, [sub["merchant_key"] for sub in subscriptions],
+            scores["usage_score"], scores["days_since_last"], NOW
+        )
+        cancellation._model = train_cancellation_model(features, labels)
+        print("Trained a model on 5000 synthetic subscriptions")
+    model = cancellation.get_cancellation_model()
+
+    print(f"{'batch':>6} {'predict p50/p99 (ms)':>22} {'scored p50/p99 (ms)':>21} {'heuristic p50/p99 (ms)':>24}")
+    for batch in BATCH_SIZES:
+        transactions, subscriptions, _ = synthetic_training_data(batch, seed=batch, now=NOW)
+        features = np.random.default_rng(batch).normal(size=(batch, len(cancellation.FEATURE_COLUMNS)))
+
+        predict = percentiles(lambda: model.predict_proba(features), repeats)
+        scored = percentiles(lambda: score_subscriptions(transactions, subscriptions, now=NOW), max(10, repeats // 10))
+
+        cancellation._model = None
+        heuristic = percentiles(lambda: score_subscriptions(transactions, subscriptions, now=NOW), max(10, repeats // 10))
+        cancellation._model = model
+
+        print(
+            f"{batch:>6} {predict[0]:>10.3f} / {predict[1]:<9.3f} {scored[0]:>9.2f} / {scored[1]:<9.2f} "
+            f"{heuristic[0]:>11.2f} / {heuristic[1]:<9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+Benchmark for the statement parser.
+Run this from the backend directory: python benchmarks/bench_csv_parser.py
+"""
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.csv_parser import parse_csv
+
+ROW_COUNTS = [1_000, 10_000, 80_000]
+MERCHANTS = ["NETFLIX.COM MUMBAI", "SPOTIFY INDIA", "SWIGGY ORDER", "AMAZON PAY", "UBER TRIP", "SALARY CREDIT"]
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%y"]
+
+
+def build_statement(rows: int, date_format: str = "%Y-%m-%d", seed: int = 42) -> str:
+    """Build a CSV statement mixing signed amounts, currency text and debit/credit types."""
+    rng = random.Random(seed)
+    start = date(2023, 1, 1)
+    lines = ["Date,Amount,Narration,Account,Txn Type"]
+    for i in range(rows):
+        day = start + timedelta(days=i * 730 // rows)
+        amount = rng.uniform(50, 5000)
+        txn_type = "credit" if rng.random() < 0.1 else "debit"
+        amount_text = f'"₹{amount:,.2f}"' if i % 3 else f"{amount:.2f}"
+        lines.append(f"{day.strftime(date_format)},{amount_text},{rng.choice(MERCHANTS)} {i % 97},Current,{txn_type}")
+    return "\n".join(lines)
+
+
+def main():
+    print(f"{'date format':>12} {'rows':>8} {'seconds':>9} {'rows/sec':>12}")
+    for date_format in DATE_FORMATS:
+        for rows in ROW_COUNTS:
+            content = build_statement(rows, date_format)
+            start = time.perf_counter()
+            transactions = parse_csv(content)
+            elapsed = time.perf_counter() - start
+            assert len(transactions) == rows
+            print(f"{date_format:>12} {rows:>8} {elapsed:>9.3f} {rows / elapsed:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Benchmark for Excel statements: pd.read_excel + parse_excel vs the streaming reader.
+Run this from the backend directory: python benchmarks/bench_excel_reader.py
+"""
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+from openpyxl import Workbook
+from app.services.csv_parser import CalamineWorkbook, iter_excel_chunks, parse_excel
+
+ROW_COUNTS = [1_000, 5_000, 20_000]
+MERCHANTS = ["NETFLIX.COM MUMBAI", "SPOTIFY INDIA", "SWIGGY ORDER", "AMAZON PAY", "UBER TRIP"]
+
+
+def build_workbook(rows: int, seed: int = 42) -> bytes:
+    rng = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["Date", "Narration", "Amount", "Account"])
+    start = datetime(2023, 1, 1)
+    for i in range(rows):
+        sheet.append([
+            start + timedelta(hours=i * 6),
+            f"{rng.choice(MERCHANTS)} {i % 97}",
+            -round(rng.uniform(50, 5000), 2),
+            "Current",
+        ])
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def read_excel_path(content: bytes) -> int:
+    return len(parse_excel(pd.read_excel(BytesIO(content))))
+
+
+def streaming_path(content: bytes) -> int:
+    return sum(len(chunk) for chunk in iter_excel_chunks(BytesIO(content), "xlsx"))
+
+
+def measure(method, content: bytes):
+    """Time one untraced run, then take peak memory from a second, traced run."""
+    start = time.perf_counter()
+    rows = method(content)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    method(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rows, elapsed, peak / 1024 / 1024
+
+
+def main():
+    engine = "calamine" if CalamineWorkbook is not None else "openpyxl read-only"
+    print(f"streaming engine: {engine}")
+    print(f"{'rows':>8} {'read_excel (s)':>15} {'peak MB':>8} {'streaming (s)':>14} {'peak MB':>8}")
+    for rows in ROW_COUNTS:
+        content = build_workbook(rows)
+        old_rows, old_seconds, old_peak = measure(read_excel_path, content)
+        new_rows, new_seconds, new_peak = measure(streaming_path, content)
+        assert old_rows == new_rows == rows
+        print(f"{rows:>8} {old_seconds:>15.3f} {old_peak:>8.1f} {new_seconds:>14.3f} {new_peak:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Benchmark for merchant clustering: a user's first statement (every name is
+new) and a later one that only adds a few names, placed against the cached
+assignments. Also reports the largest block, which bounds the pairwise work.
+Run this from the backend directory: python benchmarks/bench_merchant_clusters.py
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.ml.cluster import BLOCK_KEY_LENGTH, _split_blocks, cluster_merchants
+
+# (distinct names in the first statement, names added by the next one)
+SIZES = [(1_000, 50), (10_000, 200), (50_000, 1_000)]
+SUFFIXES = ["", " com", " mumbai", " bill", " india", " online"]
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def build_names(count: int, rng: random.Random):
+    """Cleaned merchant names with a few description variants each."""
+    names, amounts = [], []
+    while len(names) < count:
+        base = "".join(rng.choice(LETTERS) for _ in range(rng.randint(5, 10)))
+        amount = float(rng.randint(50, 5000))
+        for suffix in rng.sample(SUFFIXES, rng.randint(1, 3)):
+            names.append(base + suffix)
+            amounts.append(amount * rng.uniform(0.95, 1.05))
+    return names[:count], amounts[:count]
+
+
+def timed(method, *args):
+    start = time.perf_counter()
+    result = method(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    print(
+        f"{'names':>7} {'clusters':>9} {'max block':>10} {'first (s)':>10} "
+        f"{'added':>6} {'incremental (s)':>16}"
+    )
+    for count, added in SIZES:
+        rng = random.Random(42)
+        names, amounts = build_names(count + added, rng)
+        first_names, first_amounts = names[:count], amounts[:count]
+
+        labels, first_seconds = timed(cluster_merchants, first_names, first_amounts)
+        known = {name: (labels[name], amount) for name, amount in zip(first_names, first_amounts)}
+        _, incremental_seconds = timed(cluster_merchants, names[count:], amounts[count:], known)
+
+        blocks = _split_blocks(first_names, list(range(count)), BLOCK_KEY_LENGTH)
+        print(
+            f"{count:>7} {len(set(labels.values())):>9} {max(map(len, blocks)):>10} "
+            f"{first_seconds:>10.3f} {added:>6} {incremental_seconds:>16.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Benchmark for merchant-name normalization on statement-like descriptions,
+which repeat every month: the previous uncompiled re.sub chain, the compiled
+function with and without its LRU cache, and the column-wise variant.
+Run this from the backend directory: python benchmarks/bench_merchant_names.py
+"""
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+from app.ml.preprocess import clean_merchant_name, clean_merchant_names
+
+# (rows, distinct descriptions)
+SIZES = [(10_000, 500), (100_000, 2_000), (1_000_000, 20_000)]
+MERCHANTS = ["NETFLIX.COM", "Spotify Premium", "SWIGGY", "Amazon Prime", "UBER TRIP", "Zomato Order"]
+PREFIXES = ["", "payment ", "debit ", "transfer ", "UPI/"]
+
+
+def legacy_clean_merchant_name(description: str) -> str:
+    """The previous implementation, kept for comparison."""
+    description = description.lower()
+    for pattern in [r'^payment\s+', r'^transfer\s+', r'^debit\s+', r'^credit\s+',
+                    r'\s+payment$', r'\s+subscription$', r'\d{4}.*$']:
+        description = re.sub(pattern, '', description, flags=re.IGNORECASE)
+    description = re.sub(r'[^\w\s]', '', description)
+    return ' '.join(description.split()).strip()
+
+
+def build_descriptions(rows: int, distinct: int, seed: int = 42) -> pd.Series:
+    rng = random.Random(seed)
+    pool = [
+        f"{rng.choice(PREFIXES)}{rng.choice(MERCHANTS)} {i} {rng.randrange(10**6):06d}"
+        for i in range(distinct)
+    ]
+    return pd.Series([rng.choice(pool) for _ in range(rows)])
+
+
+def timed(method, *args):
+    start = time.perf_counter()
+    result = method(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    print(
+        f"{'rows':>9} {'distinct':>9} {'legacy (s)':>11} {'compiled (s)':>13} "
+        f"{'cached (s)':>11} {'hit rate':>9} {'column (s)':>11}"
+    )
+    for rows, distinct in SIZES:
+        descriptions = build_descriptions(rows, distinct)
+
+        legacy, legacy_seconds = timed(descriptions.apply, legacy_clean_merchant_name)
+        compiled, compiled_seconds = timed(descriptions.apply, clean_merchant_name.__wrapped__)
+
+        clean_merchant_name.cache_clear()
+        cached, cached_seconds = timed(descriptions.apply, clean_merchant_name)
+        info = clean_merchant_name.cache_info()
+        hit_rate = info.hits / (info.hits + info.misses)
+
+        column, column_seconds = timed(clean_merchant_names, descriptions)
+
+        assert legacy.equals(compiled) and legacy.equals(cached) and legacy.equals(column)
+        print(
+            f"{rows:>9} {distinct:>9} {legacy_seconds:>11.3f} {compiled_seconds:>13.3f} "
+            f"{cached_seconds:>11.3f} {hit_rate:>9.1%} {column_seconds:>11.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
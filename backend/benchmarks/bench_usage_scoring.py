@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Benchmark for Harvey's usage scoring: one calculate_usage_frequency +
+predict_cancellation_probability call per subscription (each re-normalizing
+every transaction) vs score_subscriptions for all of them at once.
+Run this from the backend directory: python benchmarks/bench_usage_scoring.py
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from app.ml.detect import calculate_usage_frequency, predict_cancellation_probability, score_subscriptions
+from bench_detection import merchant_name
+
+# (subscriptions, transactions)
+SIZES = [(10, 2_000), (40, 20_000), (100, 100_000)]
+NOW = datetime(2025, 1, 1)
+
+
+def build_data(subscription_count: int, rows: int, seed: int = 42):
+    rng = random.Random(seed)
+    merchants = max(subscription_count * 5, rows // 100)
+    start = NOW - timedelta(days=3 * 365)
+    transactions = [
+        {
+            "date": start + timedelta(days=rng.randrange(3 * 365)),
+            "amount": -round(rng.uniform(50, 2000), 2),
+            "description": merchant_name(rng.randrange(merchants)),
+            "bank_account": "HDFC",
+        }
+        for _ in range(rows)
+    ]
+    subscriptions = [
+        {
+            "id": i,
+            "name": merchant_name(i * 3).title(),
+            "amount": float(rng.randint(5, 1500)),
+            "frequency": "monthly",
+            "last_seen": NOW - timedelta(days=rng.randrange(120)),
+        }
+        for i in range(subscription_count)
+    ]
+    return transactions, subscriptions
+
+
+def loop_scores(transactions, subscriptions):
+    usage_scores, probabilities = [], []
+    for sub in subscriptions:
+        usage_score = calculate_usage_frequency(transactions, sub)
+        usage_scores.append(usage_score)
+        probabilities.append(predict_cancellation_probability(sub, usage_score, (NOW - sub["last_seen"]).days))
+    return np.array(usage_scores), np.array(probabilities)
+
+
+def timed(method, *args, **kwargs):
+    start = time.perf_counter()
+    result = method(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    print(f"{'subs':>5} {'rows':>8} {'per-sub (s)':>12} {'batch (s)':>10} {'speedup':>8}")
+    for subscription_count, rows in SIZES:
+        transactions, subscriptions = build_data(subscription_count, rows)
+        (usage, probabilities), loop_seconds = timed(loop_scores, transactions, subscriptions)
+        scores, batch_seconds = timed(score_subscriptions, transactions, subscriptions, now=NOW)
+
+        assert np.allclose(usage, scores["usage_score"])
+        assert np.allclose(probabilities, scores["cancellation_probability"])
+        print(
+            f"{subscription_count:>5} {rows:>8} {loop_seconds:>12.3f} {batch_seconds:>10.3f} "
+            f"{loop_seconds / batch_seconds:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
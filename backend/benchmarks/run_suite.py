@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+"""
+Benchmark suite: parsing, normalization, detection, the upload pipeline and
+Harvey on synthetic statements (benchmarks/synthetic.py) at several scales.
+Records median wall time, peak traced memory and a result count per case,
+and compares them with benchmarks/baseline.json: a case that got slower or
+bigger than the tolerance, or whose result changed, fails the run.
+Run this from the backend directory:
+    python benchmarks/run_suite.py [--scales 1000 10000] [--update-baseline]
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from io import BytesIO, StringIO
+from pathlib import Path
+from typing import Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Everything runs against a throwaway SQLite database and upload directory;
+# settings are read at import time, so this has to happen first
+WORK_DIR = tempfile.mkdtemp(prefix="arko-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORK_DIR}/bench.db"
+os.environ["UPLOAD_DIR"] = f"{WORK_DIR}/uploads"
+
+from app.database import Base, SessionLocal, engine
+from app.models import UploadJob, User
+from app.ml.detect import detect_recurring_subscriptions
+from app.ml.preprocess import normalize_transactions
+from app.services.csv_parser import iter_excel_chunks, parse_csv
+from app.services.harvey import HarveyService, HarveySnapshot
+from app.services.upload_jobs import create_upload_job, run_upload_job
+from synthetic import StatementSpec, generate_statement, to_csv, to_xlsx
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+SCALES = [1_000, 10_000, 50_000]
+# Differences below these are noise, whatever the relative change
+MIN_SECONDS_DELTA = 0.02
+MIN_PEAK_MB_DELTA = 1.0
+
+
+def measure(method, repeat: int):
+    """Median wall time over `repeat` runs, then peak memory from one traced run."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = method()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    method()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": statistics.median(timings), "peak_mb": peak / 1024 / 1024, "result": result}
+
+
+def _new_user(db) -> User:
+    user = User(name="bench", email=f"bench-{time.perf_counter_ns()}@example.com", phone="0", password_hash="-")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def _upload(content: bytes, file_ext: str) -> Tuple[int, int]:
+    """Full upload job for a fresh user; returns (user id, subscriptions detected)."""
+    db = SessionLocal()
+    try:
+        user = _new_user(db)
+        job = create_upload_job(
+            db, user, f"statement.{file_ext}", file_ext, BytesIO(content), hashlib.sha256(content).hexdigest()
+        )
+        job_id, user_id = job.id, user.id
+        # The job logs every notification it would send
+        with redirect_stdout(StringIO()):
+            run_upload_job(job_id)
+        db.expire_all()
+        job = db.query(UploadJob).filter(UploadJob.id == job_id).one()
+        if job.status != "completed":
+            raise RuntimeError(f"upload job failed: {job.error}")
+        return user_id, job.subscriptions_detected
+    finally:
+        db.close()
+
+
+def _harvey(method, user_id: int):
+    db = SessionLocal()
+    try:
+        return method(db, user_id)
+    finally:
+        db.close()
+
+
+def _summary_items(user_id: int) -> int:
+    summary = _harvey(lambda db, user_id: HarveySnapshot(db, user_id).summary(), user_id)
+    return len(summary["recommendations"]) + len(summary["anomalies"])
+
+
+def run_scale(rows: int, repeat: int) -> dict:
+    spec = StatementSpec(rows=rows, merchants=max(50, rows // 50))
+    statement = generate_statement(spec)
+    csv_content = to_csv(statement, spec)
+    dmy_spec = StatementSpec(rows=rows, merchants=spec.merchants, date_format="%d/%m/%Y")
+    dmy_content = to_csv(statement, dmy_spec)
+    xlsx_content = to_xlsx(statement)
+
+    transactions = parse_csv(csv_content)
+    user_id, _ = _upload(csv_content.encode(), "csv")
+
+    cases = {
+        "parse_csv": lambda: len(parse_csv(csv_content)),
+        "parse_csv_dmy": lambda: len(parse_csv(dmy_content)),
+        "parse_xlsx": lambda: sum(len(chunk) for chunk in iter_excel_chunks(BytesIO(xlsx_content), "xlsx")),
+        "normalize_transactions": lambda: len(normalize_transactions(transactions)),
+        "detect_recurring_subscriptions": lambda: len(detect_recurring_subscriptions(transactions, 1)),
+        "upload_job_csv": lambda: _upload(csv_content.encode(), "csv")[1],
+        "harvey_recommendations": lambda: len(_harvey(HarveyService.generate_recommendations, user_id)),
+        "harvey_savings": lambda: round(_harvey(HarveyService.calculate_savings, user_id)["total_monthly_cost"], 2),
+        "harvey_anomalies": lambda: len(_harvey(HarveyService.get_anomalies, user_id)),
+        "harvey_summary": lambda: _summary_items(user_id),
+    }
+
+    results = {}
+    for name, method in cases.items():
+        results[f"{name}@{rows}"] = measure(method, repeat)
+        case = results[f"{name}@{rows}"]
+        print(f"{name + '@' + str(rows):>36} {case['seconds']:>10.4f} {case['peak_mb']:>10.1f} {case['result']:>12}")
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float, memory_tolerance: float) -> list:
+    """Human-readable failures of `results` against `baseline`."""
+    failures = []
+    for key, case in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if case["result"] != base["result"]:
+            failures.append(f"{key}: result {case['result']} != baseline {base['result']}")
+        if (case["seconds"] > base["seconds"] * (1 + tolerance)
+                and case["seconds"] - base["seconds"] > MIN_SECONDS_DELTA):
+            failures.append(f"{key}: {case['seconds']:.4f}s vs baseline {base['seconds']:.4f}s "
+                            f"(+{case['seconds'] / base['seconds'] - 1:.0%})")
+        if (case["peak_mb"] > base["peak_mb"] * (1 + memory_tolerance)
+                and case["peak_mb"] - base["peak_mb"] > MIN_PEAK_MB_DELTA):
+            failures.append(f"{key}: peak {case['peak_mb']:.1f}MB vs baseline {base['peak_mb']:.1f}MB")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES, help="statement rows per scale")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case (median is kept)")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed slowdown, 0.3 = 30%%")
+    parser.add_argument("--memory-tolerance", type=float, default=0.2, help="allowed peak memory growth")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--update-baseline", action="store_true", help="write these results as the baseline")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    print(f"{'case':>36} {'seconds':>10} {'peak MB':>10} {'result':>12}")
+    results = {}
+    for rows in args.scales:
+        results.update(run_scale(rows, args.repeat))
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f).get("cases", {})
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(),
+                       "cases": baseline}, f, indent=2, sort_keys=True)
+        print(f"Wrote {len(results)} cases to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        sys.exit(f"No baseline at {args.baseline}; run with --update-baseline first")
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("machine") != platform.platform():
+        print(f"Note: baseline was recorded on {baseline.get('machine')}; timings may not be comparable")
+    failures = compare(results, baseline["cases"], args.tolerance, args.memory_tolerance)
+    if failures:
+        print(f"\n{len(failures)} regression(s):")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""
+Deterministic synthetic bank statements for benchmarks: the same spec and
+seed always give the same rows. A share of the merchants are subscriptions
+charged on a fixed day every month or year; the rest are irregular spending.
+Write one out from the backend directory:
+    python benchmarks/synthetic.py --rows 10000 --output statement.csv
+"""
+import argparse
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from io import BytesIO
+from typing import Dict, List
+
+from openpyxl import Workbook
+
+HEADER = ["Date", "Narration", "Amount", "Account"]
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%b-%y", "%m/%d/%Y"]
+# Bank-style decorations around a merchant name, applied as noise
+PREFIXES = ["", "POS ", "UPI/", "payment ", "ACH DEBIT "]
+SUFFIXES = ["", " MUMBAI", " BILL", " INDIA", ".COM"]
+WORDS = ["prime", "play", "cloud", "fit", "news", "music", "food", "cab", "mart", "pay", "box", "hub"]
+
+
+@dataclass
+class StatementSpec:
+    rows: int = 10_000
+    merchants: int = 200
+    # Share of merchants that are monthly/yearly subscriptions
+    recurring_share: float = 0.2
+    # Share of subscriptions charged yearly rather than monthly
+    yearly_share: float = 0.1
+    # 0-1: chance of decorated descriptions, skipped cycles and price jitter
+    noise: float = 0.1
+    date_format: str = "%Y-%m-%d"
+    start: datetime = datetime(2022, 1, 1)
+    days: int = 3 * 365
+    seed: int = 42
+
+
+def _merchant_names(count: int, rng: random.Random) -> List[str]:
+    names = []
+    for index in range(count):
+        # Letters only: clean_merchant_name drops digit runs
+        tag = ""
+        while True:
+            index, rest = divmod(index, 26)
+            tag = chr(ord("A") + rest) + tag
+            if not index:
+                break
+        names.append(f"{rng.choice(WORDS).upper()} {tag}")
+    return names
+
+
+def _describe(name: str, noise: float, rng: random.Random) -> str:
+    if rng.random() >= noise:
+        return name
+    return f"{rng.choice(PREFIXES)}{name}{rng.choice(SUFFIXES)}"
+
+
+def generate_statement(spec: StatementSpec) -> List[Dict]:
+    """Statement rows ({date, description, amount, account}), sorted by date."""
+    rng = random.Random(spec.seed)
+    names = _merchant_names(spec.merchants, rng)
+    recurring = int(spec.merchants * spec.recurring_share)
+    end = spec.start + timedelta(days=spec.days)
+
+    rows = []
+    for index in range(recurring):
+        yearly = rng.random() < spec.yearly_share
+        price = round(rng.uniform(99, 1999) * (10 if yearly else 1), 2)
+        date = spec.start + timedelta(days=rng.randrange(28 if not yearly else 365))
+        while date < end and len(rows) < spec.rows:
+            if rng.random() >= spec.noise * 0.2:  # an occasional skipped cycle
+                jitter = 1 + rng.uniform(-0.02, 0.02) * spec.noise
+                rows.append({"date": date, "description": _describe(names[index], spec.noise, rng),
+                             "amount": -round(price * jitter, 2), "account": "Savings"})
+            date = date.replace(year=date.year + 1) if yearly else date + timedelta(days=30)
+
+    irregular = names[recurring:] or names
+    while len(rows) < spec.rows:
+        rows.append({
+            "date": spec.start + timedelta(days=rng.randrange(spec.days), minutes=rng.randrange(1440)),
+            "description": _describe(rng.choice(irregular), spec.noise, rng),
+            "amount": -round(rng.uniform(20, 5000), 2) if rng.random() > 0.05 else round(rng.uniform(1000, 90000), 2),
+            "account": "Savings",
+        })
+
+    rows.sort(key=lambda row: row["date"])
+    return rows
+
+
+def to_csv(rows: List[Dict], spec: StatementSpec) -> str:
+    lines = [",".join(HEADER)]
+    for row in rows:
+        lines.append(f"{row['date'].strftime(spec.date_format)},{row['description']},{row['amount']:.2f},{row['account']}")
+    return "\n".join(lines)
+
+
+def to_xlsx(rows: List[Dict]) -> bytes:
+    """Dates are written as Excel dates, so no date format applies."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(HEADER)
+    for row in rows:
+        sheet.append([row["date"], row["description"], row["amount"], row["account"]])
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=StatementSpec.rows)
+    parser.add_argument("--merchants", type=int, default=StatementSpec.merchants)
+    parser.add_argument("--recurring-share", type=float, default=StatementSpec.recurring_share)
+    parser.add_argument("--noise", type=float, default=StatementSpec.noise)
+    parser.add_argument("--date-format", default=StatementSpec.date_format, help=f"CSV only; e.g. {', '.join(DATE_FORMATS)}")
+    parser.add_argument("--seed", type=int, default=StatementSpec.seed)
+    parser.add_argument("--output", required=True, help=".csv or .xlsx")
+    args = parser.parse_args()
+
+    spec = StatementSpec(
+        rows=args.rows, merchants=args.merchants, recurring_share=args.recurring_share,
+        noise=args.noise, date_format=args.date_format, seed=args.seed,
+    )
+    rows = generate_statement(spec)
+    if args.output.endswith(".xlsx"):
+        with open(args.output, "wb") as f:
+            f.write(to_xlsx(rows))
+    else:
+        with open(args.output, "w") as f:
+            f.write(to_csv(rows, spec))
+    print(f"Wrote {len(rows)} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,12 +9,59 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your-secret-key-change-in-production-min-32-characters-long-for-security"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Comma-separated emails allowed to read operational stats (cache, background refresh)
+    ADMIN_EMAILS: str = ""
     
     # Twilio
     TWILIO_ACCOUNT_SID: Optional[str] = None
     TWILIO_AUTH_TOKEN: Optional[str] = None
     TWILIO_WHATSAPP_FROM: str = "whatsapp:+14155238886"
     
+    # Uploads - rows parsed and persisted per chunk for CSV statements
+    UPLOAD_CHUNK_SIZE: int = 5000
+    BULK_INSERT_BATCH_SIZE: int = 1000
+    UPLOAD_DIR: str = "./uploads"
+    UPLOAD_WORKERS: int = 2
+    BATCH_PARSE_WORKERS: int = 4
+    BATCH_MAX_FILES: int = 20
+    # Uncompressed size limits, checked against zip headers before extracting
+    BATCH_MAX_FILE_MB: int = 50
+    BATCH_MAX_TOTAL_MB: int = 200
+    # Optional JSON file with extra bank export profiles (see app/services/bank_profiles.py)
+    BANK_PROFILES_FILE: Optional[str] = None
+    # Profiles inferred for unknown headers, kept per worker (least recently used go first)
+    BANK_PROFILES_INFERRED_MAX: int = 1000
+    
+    # Group description variants ("NETFLIX.COM MUMBAI", "NETFLIX COM BILL") into one merchant
+    MERCHANT_CLUSTERING: bool = True
+    
+    # Trained cancellation model (scripts/train_cancellation_model.py); the
+    # heuristic is used when the file doesn't exist
+    CANCELLATION_MODEL_PATH: str = "./models/cancellation_model.joblib"
+    
+    # Nightly subscription rescan (scripts/rescan_subscriptions.py)
+    RESCAN_USER_CHUNK: int = 200
+    RESCAN_WORKERS: int = 4
+    RESCAN_FETCH_SIZE: int = 10000
+    RESCAN_CHECKPOINT_FILE: str = "./rescan_checkpoint.json"
+    
+    # Harvey result cache (app/services/harvey_cache.py): "memory" (per worker),
+    # "redis" (shared, needs HARVEY_CACHE_REDIS_URL) or "none"
+    HARVEY_CACHE_BACKEND: str = "memory"
+    HARVEY_CACHE_SIZE: int = 1000
+    HARVEY_CACHE_TTL_SECONDS: int = 600
+    HARVEY_CACHE_REDIS_URL: Optional[str] = None
+    
+    # Background Harvey precompute (app/services/harvey_insights.py): after each
+    # upload, for users whose data changed, and for rows older than the max age
+    HARVEY_REFRESH_ENABLED: bool = True
+    HARVEY_REFRESH_WORKERS: int = 2
+    HARVEY_REFRESH_INTERVAL_SECONDS: int = 30
+    HARVEY_REFRESH_BATCH_SIZE: int = 50
+    HARVEY_REFRESH_MAX_AGE_HOURS: int = 24
+    # A claim not released within this long (crashed worker) can be taken over
+    HARVEY_REFRESH_CLAIM_TIMEOUT_SECONDS: int = 600
+    
     class Config:
         env_file = ".env"
 
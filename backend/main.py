@@ -2,6 +2,9 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.database import engine, Base
 from app.routes import auth, upload, subscriptions, harvey, profile, notifications
+from app.services.upload_jobs import upload_job_runner
+from app.services.harvey_insights import harvey_refresh_scheduler
+from app.ml.cancellation import load_cancellation_model
 from config import settings
 
 # Create database tables (checkfirst=True prevents error if tables already exist)
@@ -27,6 +30,30 @@ app.include_router(harvey.router)
 app.include_router(profile.router)
 app.include_router(notifications.router)
 
+@app.on_event("startup")
+def load_models():
+    # Kept in memory for every request; see app/ml/cancellation.py
+    load_cancellation_model(settings.CANCELLATION_MODEL_PATH)
+
+@app.on_event("startup")
+def resume_upload_jobs():
+    # Pick up uploads that were queued or running when the server stopped
+    upload_job_runner.resume_pending()
+
+@app.on_event("startup")
+def start_harvey_refresh():
+    # Precomputes Harvey insights so the dashboard reads them instead of computing
+    if settings.HARVEY_REFRESH_ENABLED:
+        harvey_refresh_scheduler.start()
+
+@app.on_event("shutdown")
+def stop_upload_jobs():
+    upload_job_runner.shutdown()
+
+@app.on_event("shutdown")
+def stop_harvey_refresh():
+    harvey_refresh_scheduler.shutdown()
+
 @app.get("/")
 def root():
     return {"message": "Arko API - Welcome!"}
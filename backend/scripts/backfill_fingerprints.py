@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Fill transactions.fingerprint for rows stored before the column existed, so
+re-uploading an older statement skips them like any other duplicate. Safe to
+re-run; only NULL fingerprints are touched.
+Run this from the backend directory:
+    python scripts/backfill_fingerprints.py [--user-id 42] [--batch-size 5000]
+"""
+import argparse
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.database import SessionLocal
+from app.models import Transaction, User
+from app.services.fingerprint import assign_fingerprints, filter_new_transactions
+
+
+def backfill_user(db, user_id: int, batch_size: int):
+    """
+    Fingerprint one user's rows as their uploads would have: identical rows
+    are numbered per statement, in stored order. Rows whose fingerprint is
+    already taken were imported twice (e.g. the statement was uploaded again
+    after the upgrade); they keep NULL and are counted as duplicates.
+    """
+    rows = db.query(
+        Transaction.id, Transaction.upload_id, Transaction.date, Transaction.amount,
+        Transaction.description, Transaction.bank_account
+    ).filter(
+        Transaction.user_id == user_id,
+        Transaction.fingerprint.is_(None)
+    ).order_by(Transaction.id).all()
+    transactions = [row._asdict() for row in rows]
+
+    # Rows stored before upload_id existed count as one statement
+    statements = defaultdict(list)
+    for txn in transactions:
+        statements[txn['upload_id']].append(txn)
+    for statement in statements.values():
+        assign_fingerprints(user_id, statement, Counter())
+
+    new_transactions, _ = filter_new_transactions(db, transactions)
+    # Statements uploaded twice before the upgrade: the first copy keeps the fingerprint
+    fingerprinted, seen = [], set()
+    for txn in new_transactions:
+        if txn['fingerprint'] not in seen:
+            seen.add(txn['fingerprint'])
+            fingerprinted.append(txn)
+    for start in range(0, len(fingerprinted), batch_size):
+        db.bulk_update_mappings(Transaction, [
+            {'id': txn['id'], 'fingerprint': txn['fingerprint']}
+            for txn in fingerprinted[start:start + batch_size]
+        ])
+    return len(fingerprinted), len(transactions) - len(fingerprinted)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--user-id", type=int, help="only backfill this user's rows")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per UPDATE batch")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        query = db.query(User.id).order_by(User.id)
+        if args.user_id:
+            query = query.filter(User.id == args.user_id)
+        user_ids = [user_id for (user_id,) in query.all()]
+
+        started = time.perf_counter()
+        for done, user_id in enumerate(user_ids, start=1):
+            fingerprinted, duplicates = backfill_user(db, user_id, args.batch_size)
+            db.commit()
+            print(f"[{done}/{len(user_ids)}] user {user_id}: {fingerprinted} fingerprinted, {duplicates} duplicates left unset")
+    finally:
+        db.close()
+
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
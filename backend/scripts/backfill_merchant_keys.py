@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Fill transactions.merchant_key and subscriptions.merchant_key for rows stored
+before the columns existed. Safe to re-run; only NULL keys are touched.
+Run this from the backend directory:
+    python scripts/backfill_merchant_keys.py [--user-id 42] [--batch-size 5000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.database import SessionLocal
+from app.models import Subscription, Transaction, User
+from app.ml.preprocess import clean_merchant_name
+from app.services.merchant_clusters import assign_merchant_keys, get_merchant_clusters
+
+
+def backfill_user(db, user_id: int, batch_size: int):
+    """Key one user's transactions, then point their subscriptions at the same keys."""
+    rows = db.query(Transaction.id, Transaction.description, Transaction.amount).filter(
+        Transaction.user_id == user_id,
+        Transaction.merchant_key.is_(None)
+    ).all()
+    transactions = [row._asdict() for row in rows]
+    assign_merchant_keys(db, user_id, transactions)
+    for start in range(0, len(transactions), batch_size):
+        db.bulk_update_mappings(Transaction, [
+            {'id': txn['id'], 'merchant_key': txn['merchant_key']}
+            for txn in transactions[start:start + batch_size]
+        ])
+
+    # Subscription names are the title-cased merchant name they were detected
+    # from; transactions are keyed by that name's cluster, so map it the same way
+    clusters = get_merchant_clusters(db, user_id)
+    subscriptions = db.query(Subscription.id, Subscription.name).filter(
+        Subscription.user_id == user_id,
+        Subscription.merchant_key.is_(None)
+    ).all()
+    updates = []
+    for sub in subscriptions:
+        merchant = clean_merchant_name(sub.name)
+        updates.append({'id': sub.id, 'merchant_key': clusters.get(merchant, merchant)})
+    db.bulk_update_mappings(Subscription, updates)
+    return len(transactions), len(subscriptions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--user-id", type=int, help="only backfill this user's rows")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per UPDATE batch")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        query = db.query(User.id).order_by(User.id)
+        if args.user_id:
+            query = query.filter(User.id == args.user_id)
+        user_ids = [user_id for (user_id,) in query.all()]
+
+        started = time.perf_counter()
+        for done, user_id in enumerate(user_ids, start=1):
+            transactions, subscriptions = backfill_user(db, user_id, args.batch_size)
+            db.commit()
+            print(f"[{done}/{len(user_ids)}] user {user_id}: {transactions} transactions, {subscriptions} subscriptions")
+    finally:
+        db.close()
+
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
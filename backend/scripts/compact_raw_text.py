@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Rewrite transactions stored with the old raw_text format (a Python repr of the
+row dict) into compact CSV lines. Rows that share a user and a set of columns
+get one "legacy import" StatementUpload holding the header.
+Run this from the backend directory after applying database/migrations.sql:
+    python scripts/compact_raw_text.py [--batch-size 1000]
+"""
+import argparse
+import ast
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import update
+from app.database import SessionLocal
+from app.models import Transaction, StatementUpload
+from app.services.csv_parser import encode_raw_row
+
+# pandas values that show up in the old repr but are not Python literals
+NAN_PATTERN = re.compile(r"(?<=[:\s])nan(?=[,}])")
+TIMESTAMP_PATTERN = re.compile(r"Timestamp\('([^']*)'\)")
+
+
+def parse_legacy_row(raw_text: str):
+    """Return the old row dict, or None if it cannot be read back safely."""
+    text = TIMESTAMP_PATTERN.sub(r"'\1'", NAN_PATTERN.sub("None", raw_text))
+    try:
+        row = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return None
+    return row if isinstance(row, dict) else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    uploads = {}
+    last_id = 0
+    converted = unreadable = 0
+    try:
+        while True:
+            rows = db.query(Transaction.id, Transaction.user_id, Transaction.raw_text).filter(
+                Transaction.id > last_id,
+                Transaction.upload_id.is_(None),
+                Transaction.raw_text.like("{%")
+            ).order_by(Transaction.id).limit(args.batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            updates = []
+            for txn_id, user_id, raw_text in rows:
+                row = parse_legacy_row(raw_text)
+                if row is None:
+                    # Leave it as it is rather than lose the original text
+                    unreadable += 1
+                    continue
+
+                key = (user_id, tuple(str(name) for name in row))
+                if key not in uploads:
+                    upload = StatementUpload(
+                        user_id=user_id,
+                        filename="legacy import",
+                        header=encode_raw_row(key[1])
+                    )
+                    db.add(upload)
+                    db.flush()
+                    uploads[key] = upload.id
+
+                updates.append({
+                    "id": txn_id,
+                    "raw_text": encode_raw_row(row.values()),
+                    "upload_id": uploads[key],
+                })
+
+            if updates:
+                db.execute(update(Transaction), updates)
+            db.commit()
+            converted += len(updates)
+            print(f"Compacted {converted} rows (up to id {last_id}), {unreadable} left unchanged")
+    finally:
+        db.close()
+
+    print(f"Done: {converted} rows compacted, {len(uploads)} legacy headers, {unreadable} rows left unchanged")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Delete the duplicate ai_recommendations rows written when every
+GET /harvey/recommendations inserted a fresh copy: only the newest row per
+user, subscription, kind and text is kept. Users are processed in batches,
+one commit per batch.
+Run this from the backend directory after applying database/migrations.sql:
+    python scripts/compact_recommendations.py [--batch-size 500]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import delete, func, select
+from app.database import SessionLocal
+from app.models import AIRecommendation, User
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500, help="users per batch")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    last_id = 0
+    deleted = 0
+    try:
+        while True:
+            user_ids = [user_id for user_id, in db.query(User.id).filter(
+                User.id > last_id
+            ).order_by(User.id).limit(args.batch_size)]
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+
+            newest = select(func.max(AIRecommendation.id)).where(
+                AIRecommendation.user_id.in_(user_ids)
+            ).group_by(
+                AIRecommendation.user_id, AIRecommendation.subscription_id,
+                AIRecommendation.kind, AIRecommendation.recommendation_text
+            )
+            result = db.execute(delete(AIRecommendation).where(
+                AIRecommendation.user_id.in_(user_ids),
+                AIRecommendation.id.not_in(newest)
+            ))
+            db.commit()
+            deleted += result.rowcount
+            print(f"Deleted {deleted} duplicate rows (users up to id {last_id})")
+    finally:
+        db.close()
+
+    print(f"Done: {deleted} duplicate recommendations deleted")
+
+
+if __name__ == "__main__":
+    main()
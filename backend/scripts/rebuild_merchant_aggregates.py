@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+"""
+Rebuild the per-merchant aggregates (merchant_aggregates table) from stored
+transactions. Run once after creating the table, or to repair drift.
+Run this from the backend directory:
+    python scripts/rebuild_merchant_aggregates.py [--user-id 42]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.database import SessionLocal
+from app.models import User
+from app.services.merchant_aggregates import rebuild_merchant_aggregates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--user-id", type=int, help="only rebuild this user's aggregates")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        query = db.query(User.id).order_by(User.id)
+        if args.user_id:
+            query = query.filter(User.id == args.user_id)
+        user_ids = [user_id for (user_id,) in query.all()]
+
+        started = time.perf_counter()
+        for done, user_id in enumerate(user_ids, start=1):
+            merchants = rebuild_merchant_aggregates(db, user_id)
+            db.commit()
+            print(f"[{done}/{len(user_ids)}] user {user_id}: {merchants} merchants")
+    finally:
+        db.close()
+
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Re-run subscription detection for every user, so price and frequency
+changes, missed renewals and lapsed subscriptions show up without a new
+upload. Meant to run nightly; progress is checkpointed after every chunk of
+users and an interrupted run continues where it stopped.
+Run this from the backend directory:
+    python scripts/rescan_subscriptions.py [--chunk-size 200] [--workers 4] [--restart]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import settings
+from app.database import SessionLocal
+from app.services.rescan import RescanCheckpoint, rescan_subscriptions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunk-size", type=int, default=settings.RESCAN_USER_CHUNK, help="users per chunk")
+    parser.add_argument("--workers", type=int, default=settings.RESCAN_WORKERS, help="detection processes")
+    parser.add_argument("--checkpoint", default=settings.RESCAN_CHECKPOINT_FILE, help="checkpoint file")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    checkpoint = RescanCheckpoint(args.checkpoint)
+    if args.restart:
+        checkpoint.clear()
+    elif checkpoint.load():
+        print(f"Resuming rescan started {checkpoint.state['started_at']} after user {checkpoint.state['last_user_id']}")
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        state = rescan_subscriptions(db, checkpoint, chunk_size=args.chunk_size, workers=args.workers)
+    finally:
+        db.close()
+
+    # A finished run starts from the first user next time
+    checkpoint.clear()
+    print(
+        f"Done in {time.perf_counter() - started:.1f}s: {state['users_done']} users, "
+        f"{state['updated']} subscriptions updated, {state['inserted']} new, {state['lapsed']} lapsed"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+Train the cancellation model and write the artifact the API loads at startup.
+Trains on synthetic subscriptions by default, or on stored subscriptions
+labelled by their status (cancelled or active) with --from-db; those are
+labelled by the rescan's lapse rule, so the time-since features it is based
+on are left out (see TIME_SINCE_FEATURES).
+Run this from the backend directory:
+    python scripts/train_cancellation_model.py [--from-db] [--samples 20000] [--output PATH]
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+from config import settings
+from app.ml.cancellation import (
+    FEATURE_COLUMNS, TIME_SINCE_FEATURES, build_features, synthetic_training_data, train_cancellation_model
+)
+from app.ml.detect import score_subscriptions, subscription_merchant
+from app.ml.preprocess import normalize_transactions
+
+
+def features_for(transactions, subscriptions, now):
+    """The same features score_subscriptions builds at inference time."""
+    scores = score_subscriptions(transactions, subscriptions, now=now)
+    df = normalize_transactions(transactions)
+    merchants = [subscription_merchant(sub) for sub in subscriptions]
+    return build_features(df, subscriptions, merchants, scores['usage_score'], scores['days_since_last'], now)
+
+
+def synthetic_set(samples: int, seed: int):
+    now = datetime(2025, 1, 1)
+    transactions, subscriptions, labels = synthetic_training_data(samples, seed=seed, now=now)
+    return features_for(transactions, subscriptions, now), labels
+
+
+def database_set():
+    from app.database import SessionLocal
+    from app.models import Subscription, SubscriptionStatus, User
+    from app.services.harvey import HarveyService
+
+    now = datetime.now()
+    features, labels = [], []
+    db = SessionLocal()
+    try:
+        for (user_id,) in db.query(User.id).order_by(User.id):
+            subscriptions = db.query(Subscription).filter(Subscription.user_id == user_id).all()
+            if not subscriptions:
+                continue
+            subscriptions_data = HarveyService._subscription_data(subscriptions)
+            transactions = HarveyService._merchant_transactions(db, user_id, subscriptions_data)
+            if not transactions:
+                continue
+            features.append(features_for(transactions, subscriptions_data, now))
+            labels.extend(int(sub.status == SubscriptionStatus.CANCELLED) for sub in subscriptions)
+    finally:
+        db.close()
+    if not features:
+        return np.empty((0, 0)), np.array(labels)
+    return np.vstack(features), np.array(labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--from-db", action="store_true", help="train on stored subscriptions")
+    parser.add_argument("--samples", type=int, default=20000, help="synthetic subscriptions")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=settings.CANCELLATION_MODEL_PATH, help="artifact path")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    features, labels = database_set() if args.from_db else synthetic_set(args.samples, args.seed)
+    if len(set(labels)) < 2 or np.bincount(labels).min() < 5:
+        sys.exit("Need at least 5 cancelled and 5 active subscriptions to train")
+    feature_columns = FEATURE_COLUMNS
+    if args.from_db:
+        feature_columns = [column for column in FEATURE_COLUMNS if column not in TIME_SINCE_FEATURES]
+    print(f"Built {len(feature_columns)} features for {len(labels)} subscriptions "
+          f"({labels.mean():.1%} cancelled) in {time.perf_counter() - started:.1f}s")
+
+    train_x, test_x, train_y, test_y = train_test_split(
+        features, labels, test_size=0.2, random_state=args.seed, stratify=labels
+    )
+    model = train_cancellation_model(train_x, train_y, feature_columns)
+    print(f"Held-out ROC AUC: {roc_auc_score(test_y, model.predict_proba(test_x)):.3f}")
+
+    # Refit on everything for the shipped artifact
+    model = train_cancellation_model(features, labels, feature_columns)
+    model.save(args.output)
+    print(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
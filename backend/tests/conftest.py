@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# A throwaway SQLite database and upload directory; settings are read at
+# import time, so this has to happen before the app is imported
+WORK_DIR = tempfile.mkdtemp(prefix="arko-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORK_DIR}/tests.db"
+os.environ["UPLOAD_DIR"] = f"{WORK_DIR}/uploads"
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import User  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def user(db):
+    user = User(name="Test", email="test@example.com", phone="0000000000", password_hash="-")
+    db.add(user)
+    db.commit()
+    return user
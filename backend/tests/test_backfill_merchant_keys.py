@@ -0,0 +1,36 @@
+import importlib.util
+from datetime import datetime
+from pathlib import Path
+
+from app.ml.cluster import blocking_key
+from app.models import MerchantCluster, Subscription, Transaction
+
+SCRIPT = Path(__file__).parent.parent / "scripts" / "backfill_merchant_keys.py"
+spec = importlib.util.spec_from_file_location("backfill_merchant_keys", SCRIPT)
+backfill_merchant_keys = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(backfill_merchant_keys)
+
+
+def test_subscription_named_after_merged_variant_gets_the_cluster_key(db, user):
+    # Clustering merged both variants under the shorter name
+    for merchant in ("netflix", "netflixcom bill"):
+        db.add(MerchantCluster(
+            user_id=user.id, merchant=merchant, cluster="netflix", block=blocking_key(merchant), typical_amount=9.99
+        ))
+    for month, description in enumerate(["NETFLIX", "NETFLIX.COM BILL", "NETFLIX.COM BILL"], start=1):
+        db.add(Transaction(
+            user_id=user.id, date=datetime(2024, month, 15), amount=-9.99,
+            description=description, bank_account="Checking"
+        ))
+    db.add(Subscription(
+        user_id=user.id, name="Netflixcom Bill", amount=9.99, frequency="monthly",
+        first_seen=datetime(2024, 1, 15), last_seen=datetime(2024, 3, 15),
+        next_renewal=datetime(2024, 4, 15), bank_account="Checking"
+    ))
+    db.commit()
+
+    backfill_merchant_keys.backfill_user(db, user.id, batch_size=100)
+    db.commit()
+
+    assert {key for (key,) in db.query(Transaction.merchant_key)} == {"netflix"}
+    assert db.query(Subscription.merchant_key).scalar() == "netflix"
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from app.services.csv_parser import parse_csv
+
+HDFC_HEADER = "Date,Narration,Chq./Ref.No.,Value Dt,Withdrawal Amt.,Deposit Amt.,Closing Balance\n"
+
+
+def test_hdfc_export_with_four_digit_years_is_day_first():
+    # The HDFC profile declares %d/%m/%y; this export spells out the year
+    content = HDFC_HEADER + (
+        "05/01/2024,NETFLIX,1,05/01/2024,499.00,,1000.00\n"
+        "05/02/2024,NETFLIX,2,05/02/2024,499.00,,501.00\n"
+        "13/03/2024,NETFLIX,3,13/03/2024,499.00,,2.00\n"
+    )
+    dates = [txn["date"] for txn in parse_csv(content)]
+    assert dates == [datetime(2024, 1, 5), datetime(2024, 2, 5), datetime(2024, 3, 13)]
+
+
+def test_hdfc_export_with_declared_format():
+    content = HDFC_HEADER + (
+        "05/01/24,NETFLIX,1,05/01/24,499.00,,1000.00\n"
+        "05/02/24,SALARY,2,05/02/24,,5000.00,6000.00\n"
+    )
+    transactions = parse_csv(content)
+    assert [txn["date"] for txn in transactions] == [datetime(2024, 1, 5), datetime(2024, 2, 5)]
+    assert [txn["amount"] for txn in transactions] == [-499.0, 5000.0]
@@ -0,0 +1,42 @@
+from datetime import datetime
+from io import BytesIO
+
+import app.services.upload_jobs as upload_jobs
+from app.models import (
+    AIRecommendation, HarveyInsight, MerchantAggregate, MerchantCluster, StatementUpload,
+    Subscription, Transaction, UploadJob, User
+)
+from app.routes.profile import delete_account
+
+STATEMENT = (
+    "date,amount,description,bank_account\n"
+    "2024-01-15,-9.99,Netflix Subscription,Checking\n"
+    "2024-02-15,-9.99,Netflix Subscription,Checking\n"
+    "2024-03-15,-9.99,Netflix Subscription,Checking\n"
+    "2024-04-15,-9.99,Netflix Subscription,Checking\n"
+)
+
+
+def test_delete_account_removes_the_users_rows(db, user):
+    job = upload_jobs.create_upload_job(db, user, "statement.csv", "csv", BytesIO(STATEMENT.encode()), "hash")
+    upload_jobs.run_upload_job(job.id)
+    db.expire_all()
+    subscription = db.query(Subscription).filter(Subscription.user_id == user.id).first()
+    assert subscription is not None
+    db.add(AIRecommendation(
+        user_id=user.id, subscription_id=subscription.id, kind="low_usage", recommendation_text="-"
+    ))
+    db.add(HarveyInsight(
+        user_id=user.id, data_version=user.data_version, subscription_scores="[]", anomalies="[]",
+        computed_at=datetime.utcnow()
+    ))
+    db.commit()
+
+    delete_account(current_user=user, db=db)
+
+    assert db.query(User).count() == 0
+    for model in (
+        Transaction, Subscription, AIRecommendation, StatementUpload, UploadJob,
+        MerchantAggregate, MerchantCluster, HarveyInsight
+    ):
+        assert db.query(model).count() == 0, model.__tablename__
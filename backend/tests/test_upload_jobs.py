@@ -0,0 +1,33 @@
+from io import BytesIO
+
+import app.services.upload_jobs as upload_jobs
+from app.models import Transaction, UploadJob
+
+STATEMENT = (
+    "date,amount,description,bank_account\n"
+    "2024-01-15,-9.99,Netflix Subscription,Checking\n"
+    "2024-02-15,-9.99,Netflix Subscription,Checking\n"
+    "2024-03-15,-9.99,Netflix Subscription,Checking\n"
+)
+
+
+def _upload(db, user, content: str, content_hash: str) -> UploadJob:
+    job = upload_jobs.create_upload_job(db, user, "statement.csv", "csv", BytesIO(content.encode()), content_hash)
+    job_id = job.id
+    upload_jobs.run_upload_job(job_id)
+    db.expire_all()
+    return db.get(UploadJob, job_id)
+
+
+def test_overlapping_upload_in_flight_skips_rows_stored_meanwhile(db, user, monkeypatch):
+    first = _upload(db, user, STATEMENT, "first")
+    assert (first.status, first.transactions_added) == ("completed", 3)
+
+    # The second upload looked its rows up before the first one committed them
+    monkeypatch.setattr(upload_jobs, "filter_new_transactions", lambda db, transactions: (transactions, 0))
+    content = STATEMENT + "2024-04-15,-9.99,Netflix Subscription,Checking\n"
+    second = _upload(db, user, content, "second")
+
+    assert second.status == "completed"
+    assert (second.transactions_added, second.duplicates_skipped) == (1, 3)
+    assert db.query(Transaction).filter(Transaction.user_id == user.id).count() == 4
@@ -14,7 +14,8 @@ CREATE TABLE IF NOT EXISTS transactions (
     amount FLOAT NOT NULL,
     description VARCHAR NOT NULL,
     bank_account VARCHAR NOT NULL,
-    raw_text TEXT
+    raw_text TEXT,
+    fingerprint VARCHAR(64)
 );
 CREATE TABLE IF NOT EXISTS subscriptions (
     id SERIAL PRIMARY KEY,
@@ -37,10 +38,133 @@ CREATE TABLE IF NOT EXISTS ai_recommendations (
         risk_score FLOAT DEFAULT 0.0,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+CREATE TABLE IF NOT EXISTS statement_uploads (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    filename VARCHAR NOT NULL,
+    content_hash VARCHAR(64),
+    header TEXT,
+    transactions_added INTEGER DEFAULT 0,
+    duplicates_skipped INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, content_hash)
+);
+CREATE TABLE IF NOT EXISTS upload_jobs (
+    id VARCHAR(32) PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    kind VARCHAR NOT NULL DEFAULT 'single',
+    filename VARCHAR NOT NULL,
+    file_path VARCHAR NOT NULL,
+    content_hash VARCHAR(64) NOT NULL,
+    status VARCHAR NOT NULL DEFAULT 'queued',
+    stage VARCHAR NOT NULL DEFAULT 'queued',
+    progress FLOAT DEFAULT 0.0,
+    rows_processed INTEGER DEFAULT 0,
+    transactions_added INTEGER DEFAULT 0,
+    duplicates_skipped INTEGER DEFAULT 0,
+    insert_batches INTEGER DEFAULT 0,
+    subscriptions_detected INTEGER DEFAULT 0,
+    new_subscriptions INTEGER DEFAULT 0,
+    message VARCHAR,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS merchant_aggregates (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    merchant VARCHAR NOT NULL,
+    txn_count INTEGER DEFAULT 0,
+    amount_sum FLOAT DEFAULT 0.0,
+    amount_sum_sq FLOAT DEFAULT 0.0,
+    first_date TIMESTAMP NOT NULL,
+    last_date TIMESTAMP NOT NULL,
+    last_amount FLOAT,
+    last_bank_account VARCHAR,
+    interval_count INTEGER DEFAULT 0,
+    interval_sum FLOAT DEFAULT 0.0,
+    interval_sum_sq FLOAT DEFAULT 0.0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, merchant)
+);
+CREATE TABLE IF NOT EXISTS merchant_clusters (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    merchant VARCHAR NOT NULL,
+    cluster VARCHAR NOT NULL,
+    block VARCHAR NOT NULL,
+    typical_amount FLOAT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, merchant)
+);
+CREATE TABLE IF NOT EXISTS harvey_insights (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    data_version INTEGER NOT NULL,
+    total_monthly_cost FLOAT DEFAULT 0.0,
+    avoidable_spend FLOAT DEFAULT 0.0,
+    potential_savings FLOAT DEFAULT 0.0,
+    subscription_scores TEXT NOT NULL,
+    anomalies TEXT NOT NULL,
+    computed_at TIMESTAMP NOT NULL,
+    compute_seconds FLOAT,
+    UNIQUE (user_id)
+);
+-- Existing databases: run `python scripts/rebuild_merchant_aggregates.py` from backend/
+-- once, so aggregates include transactions uploaded before this table existed
+-- (and again after adding merchant_clusters, so they are keyed by cluster).
+-- Upgrade existing databases: then run `python scripts/backfill_fingerprints.py` from
+-- backend/ to fingerprint rows stored before this, or re-uploading their statements
+-- imports every row again.
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS fingerprint VARCHAR(64);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_fingerprint ON transactions(fingerprint);
+-- Installs created while the column was declared UNIQUE also have this duplicate index
+ALTER TABLE transactions DROP CONSTRAINT IF EXISTS transactions_fingerprint_key;
+-- Compact raw rows: raw_text holds one CSV line, column names live on the upload.
+-- Then run `python scripts/compact_raw_text.py` from backend/ to rewrite old rows.
+ALTER TABLE statement_uploads ADD COLUMN IF NOT EXISTS header TEXT;
+ALTER TABLE statement_uploads ALTER COLUMN content_hash DROP NOT NULL;
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS upload_id INTEGER REFERENCES statement_uploads(id) ON DELETE SET NULL;
+-- Batch upload jobs
+ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS kind VARCHAR NOT NULL DEFAULT 'single';
+-- Stored merchant keys: then run `python scripts/backfill_merchant_keys.py` from backend/
+-- to fill them for rows imported before this column existed.
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS merchant_key VARCHAR;
+ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS merchant_key VARCHAR;
+-- Billing period estimates; filled for existing rows by the next nightly rescan
+ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS period_days INTEGER;
+ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS period_confidence FLOAT;
+-- Harvey cache key, bumped on upload, cancel and rescan changes
+ALTER TABLE users ADD COLUMN IF NOT EXISTS data_version INTEGER NOT NULL DEFAULT 0;
+-- Random per-account part of the cache key, so a reused user id never matches old entries
+ALTER TABLE users ADD COLUMN IF NOT EXISTS cache_token VARCHAR(32);
+UPDATE users SET cache_token = md5(random()::text || id::text) WHERE cache_token IS NULL;
+ALTER TABLE users ALTER COLUMN cache_token SET NOT NULL;
+-- Recommendations are stored once per data version instead of on every request.
+-- Then run `python scripts/compact_recommendations.py` from backend/ to delete
+-- the duplicate rows the old behaviour left behind.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS recommendations_version INTEGER;
+ALTER TABLE ai_recommendations ADD COLUMN IF NOT EXISTS kind VARCHAR;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ai_recommendations_user_subscription_kind ON ai_recommendations(user_id, subscription_id, kind);
+-- Precomputed Harvey insights: users without a row yet are marked stale, so the
+-- API's background refresh fills harvey_insights for them batch by batch
+ALTER TABLE users ADD COLUMN IF NOT EXISTS insights_stale_since TIMESTAMP;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS insights_claimed_at TIMESTAMP;
+UPDATE users SET insights_stale_since = CURRENT_TIMESTAMP
+WHERE insights_stale_since IS NULL
+  AND NOT EXISTS (SELECT 1 FROM harvey_insights WHERE harvey_insights.user_id = users.id);
 -- Indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_transactions_user_id ON transactions(user_id);
 CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date);
+CREATE INDEX IF NOT EXISTS idx_transactions_upload_id ON transactions(upload_id);
 CREATE INDEX IF NOT EXISTS idx_subscriptions_user_id ON subscriptions(user_id);
 CREATE INDEX IF NOT EXISTS idx_subscriptions_status ON subscriptions(status);
-CREATE INDEX IF NOT EXISTS idx_ai_recommendations_user_id ON ai_recommendations(user_id);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_ai_recommendations_user_id ON ai_recommendations(user_id);
+CREATE INDEX IF NOT EXISTS idx_upload_jobs_user_id ON upload_jobs(user_id);
+CREATE INDEX IF NOT EXISTS idx_merchant_aggregates_user_id ON merchant_aggregates(user_id);
+CREATE INDEX IF NOT EXISTS idx_merchant_clusters_user_block ON merchant_clusters(user_id, block);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_merchant_key ON transactions(user_id, merchant_key);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_user_merchant_key ON subscriptions(user_id, merchant_key);
+CREATE INDEX IF NOT EXISTS idx_users_insights_stale_since ON users(insights_stale_since);
+CREATE INDEX IF NOT EXISTS idx_harvey_insights_computed_at ON harvey_insights(computed_at);
@@ -39,24 +39,37 @@ export default function Dashboard() {
   }
 
   const handleFileUpload = async (e) => {
-    const file = e.target.files[0]
-    if (!file) return
+    const files = Array.from(e.target.files)
+    if (files.length === 0) return
+    const file = files[0]
 
     // Validate file type
-    const fileExt = file.name.split('.').pop().toLowerCase()
-    if (!['csv', 'xlsx', 'xls'].includes(fileExt)) {
-      setUploadMessage('Please upload a CSV or Excel file (.csv, .xlsx, .xls)')
+    const fileExts = files.map((f) => f.name.split('.').pop().toLowerCase())
+    if (!fileExts.every((ext) => ['csv', 'xlsx', 'xls', 'zip'].includes(ext))) {
+      setUploadMessage('Please upload CSV or Excel files (.csv, .xlsx, .xls) or a zip of them')
       return
     }
+    // Several statements or a zip archive are processed together as one batch
+    const isBatch = files.length > 1 || fileExts[0] === 'zip'
 
     setUploading(true)
     setUploadMessage('')
 
     try {
-      console.log('Uploading file:', file.name, 'Size:', file.size, 'Type:', file.type)
-      const response = await uploadAPI.uploadCSV(file)
+      console.log('Uploading files:', files.map((f) => f.name), 'Size:', files.reduce((total, f) => total + f.size, 0))
+      const response = isBatch ? await uploadAPI.uploadBatch(files) : await uploadAPI.uploadCSV(file)
       console.log('Upload response:', response.data)
-      setUploadMessage(`Success! ${response.data.transactions_added} transactions added, ${response.data.subscriptions_detected} subscriptions detected.`)
+      // Processing runs in the background; poll the job until it finishes
+      let job = response.data
+      while (job.status === 'queued' || job.status === 'running') {
+        setUploadMessage(`Processing (${job.stage}, ${Math.round(job.progress * 100)}%)...`)
+        await new Promise((resolve) => setTimeout(resolve, 1000))
+        job = (await uploadAPI.getJob(job.job_id)).data
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Processing failed')
+      }
+      setUploadMessage(`Success! ${job.transactions_added} transactions added, ${job.duplicates_skipped} duplicates skipped, ${job.subscriptions_detected} subscriptions detected.`)
       // Reload data after successful upload with error handling
       setTimeout(async () => {
         try {
@@ -148,7 +161,8 @@ export default function Dashboard() {
           <label className="flex items-center px-4 py-2 bg-blue-600 text-white rounded-md hover:bg-blue-700 cursor-pointer">
             <input
               type="file"
-              accept=".csv,.xlsx,.xls"
+              accept=".csv,.xlsx,.xls,.zip"
+              multiple
               onChange={handleFileUpload}
               disabled={uploading}
               className="hidden"
@@ -162,7 +176,7 @@ export default function Dashboard() {
           )}
         </div>
         <p className="mt-2 text-xs text-gray-500">
-          Upload your bank statement (CSV or Excel). Expected columns: date, amount, description
+          Upload your bank statements (CSV or Excel, several at once or as a zip). Expected columns: date, amount, description
         </p>
       </div>
 
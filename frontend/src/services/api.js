@@ -61,6 +61,16 @@ export const uploadAPI = {
       maxBodyLength: Infinity,
     })
   },
+  uploadBatch: (files) => {
+    const formData = new FormData()
+    files.forEach((file) => formData.append('files', file))
+    return api.post('/upload/batch', formData, {
+      timeout: 120000,
+      maxContentLength: Infinity,
+      maxBodyLength: Infinity,
+    })
+  },
+  getJob: (jobId) => api.get(`/upload/jobs/${jobId}`),
 }
 
 // Subscriptions API